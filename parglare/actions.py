@@ -9,14 +9,26 @@ else:
     text = str
 
 
+def no_context(action):
+    """
+    Marks the given action as not using the context it is called with. Parser
+    doesn't need to create context objects for such actions.
+    """
+    action.no_context = True
+    return action
+
+
+@no_context
 def pass_none(_, value):
     return None
 
 
+@no_context
 def pass_nochange(_, value):
     return value
 
 
+@no_context
 def pass_empty(_, value):
     """
     Used for EMPTY production alternative in collect.
@@ -24,6 +36,7 @@ def pass_empty(_, value):
     return []
 
 
+@no_context
 def pass_single(_, nodes):
     """
     Unpack single value and pass up.
@@ -31,6 +44,19 @@ def pass_single(_, nodes):
     return nodes[0]
 
 
+@no_context
+def pass_single_or_empty(_, nodes):
+    """
+    Unpack single value or return an empty list if there is no value.
+    Used for zero or more elements: `Elements_0: Elements_1 | EMPTY;`
+    """
+    if nodes:
+        return nodes[0]
+    else:
+        return []
+
+
+@no_context
 def pass_inner(_, nodes):
     """
     Pass inner value up, e.g. for parentheses '(' token ')'.
@@ -38,6 +64,7 @@ def pass_inner(_, nodes):
     return nodes[1]
 
 
+@no_context
 def collect_first(_, nodes):
     """
     Used for:
@@ -50,6 +77,7 @@ def collect_first(_, nodes):
     return e1
 
 
+@no_context
 def collect_first_sep(_, nodes):
     """
     Used for:
@@ -62,6 +90,7 @@ def collect_first_sep(_, nodes):
     return e1
 
 
+@no_context
 def collect_right_first(_, nodes):
     """
     Used for:
@@ -72,6 +101,7 @@ def collect_right_first(_, nodes):
     return e1
 
 
+@no_context
 def collect_right_first_sep(_, nodes):
     """
     Used for:
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Parsing of input read from asyncio streams without blocking the event loop.
+"""
+import asyncio
+from parglare.stream import DEFAULT_CHUNK_SIZE
+
+DEFAULT_STEPS = 1000
+
+
+async def parse_async(session, source, chunk_size=None, steps=None,
+                      time_slice=None):
+    """
+    Feeds the push parsing session with chunks read from the source and
+    returns the result. The source is an object with `read` coroutine (e.g.
+    `asyncio.StreamReader`) or an async iterable of chunks. The parser is
+    paused and the control is given back to the event loop after each
+    `steps` tokens and after `time_slice` seconds, if given.
+    """
+    read = getattr(source, 'read', None)
+    if read is not None:
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        while True:
+            chunk = await read(chunk_size)
+            if not chunk:
+                break
+            session.window.feed(chunk)
+            await _parse(session, steps, time_slice)
+    else:
+        async for chunk in source:
+            session.window.feed(chunk)
+            await _parse(session, steps, time_slice)
+
+    session.window.close()
+    await _parse(session, steps, time_slice)
+    return session.result
+
+
+async def _parse(session, steps, time_slice):
+    """
+    Parses the input fed so far in slices.
+    """
+    steps = steps or DEFAULT_STEPS
+    while session.resume(steps, time_slice):
+        await asyncio.sleep(0)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Parsing of many files in parallel by a pool of worker processes.
+"""
+from __future__ import unicode_literals
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from parglare.grammar import Grammar
+from parglare.exceptions import ParseError, ParserInitError, \
+    DisambiguationError
+from parglare.parser import Token
+from parglare.tables.persist import table_to_serializable, \
+    table_from_serializable
+
+DEFAULT_CHUNK_SIZE = 16
+DEFAULT_CHUNK_BYTES = 2 ** 18
+
+# Parameters which affect only the table construction. The table is given to
+# the workers.
+TABLE_PARAMS = ('tables', 'prefer_shifts', 'prefer_shifts_over_empty',
+                'force_load_table')
+
+# The parser of the worker process.
+_worker_parser = None
+
+
+def parse_files(parser, file_names, workers=None, ordered=False,
+                chunk_size=None, chunk_bytes=None):
+    """
+    Parses the given files by a pool of worker processes. Every worker creates
+    the parser from the same blob holding the grammar description, parser
+    parameters and the LR table so the table is built once. Files are sent to
+    the workers in chunks of at most `chunk_size` files and `chunk_bytes`
+    bytes, so small files are grouped and large files are parsed alone.
+
+    Returns an iterator of `(file_name, result, error)` tuples. Results are
+    yielded as soon as the chunks are parsed, or in the order of the files if
+    `ordered` is set. `error` is the exception raised while parsing the file
+    and `result` is None in that case.
+    """
+    blob = parser_blob(parser)
+    chunks = _chunks(file_names,
+                     chunk_size or DEFAULT_CHUNK_SIZE,
+                     chunk_bytes or DEFAULT_CHUNK_BYTES)
+    return _parse_chunks(parser, blob, chunks, workers, ordered)
+
+
+def parser_blob(parser):
+    """
+    Serializes what is needed to create the same parser in another process.
+    Actions and recognizers given to the grammar or the parser are pickled by
+    reference so they must be defined at the module level of an importable
+    module.
+    """
+    grammar = parser.grammar
+    if grammar.source is None:
+        raise ParserInitError(
+            'Parallel parsing requires the grammar created by `from_file` '
+            'or `from_string`.')
+    init_args = {name: value for name, value in parser._init_args.items()
+                 if name not in TABLE_PARAMS}
+    try:
+        return pickle.dumps((type(parser), grammar.source, init_args,
+                             table_to_serializable(parser.table)),
+                            pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        raise ParserInitError(
+            'Parser can\'t be sent to worker processes. Actions and '
+            'recognizers must be module level functions. {}'.format(e))
+
+
+def parser_from_blob(blob):
+    """
+    Creates the parser serialized by `parser_blob`.
+    """
+    parser_class, source, init_args, table = pickle.loads(blob)
+    grammar = Grammar._parse(source[0], source[1], **source[2])
+    table = table_from_serializable(table, grammar)
+    return parser_class(grammar, table=table, **init_args)
+
+
+def _parse_chunks(parser, blob, chunks, workers, ordered):
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(blob,)) as executor:
+        futures = {}
+        for chunk in chunks:
+            futures[executor.submit(_parse_chunk, chunk)] = chunk
+        try:
+            for future in futures if ordered else as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # E.g. results which can't be pickled.
+                    results = [(file_name, None, e)
+                               for file_name in futures[future]]
+                for file_name, result, error in results:
+                    if type(error) is tuple:
+                        error = _load_error(parser.grammar, error)
+                    yield file_name, result, error
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _chunks(file_names, chunk_size, chunk_bytes):
+    chunk = []
+    size = 0
+    for file_name in file_names:
+        try:
+            file_size = os.path.getsize(file_name)
+        except OSError:
+            # Reported by the worker.
+            file_size = 0
+        if chunk and (len(chunk) == chunk_size
+                      or size + file_size > chunk_bytes):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(file_name)
+        size += file_size
+    if chunk:
+        yield chunk
+
+
+def _init_worker(blob):
+    global _worker_parser
+    _worker_parser = parser_from_blob(blob)
+
+
+def _parse_chunk(file_names):
+    results = []
+    for file_name in file_names:
+        try:
+            results.append(
+                (file_name, _worker_parser.parse_file(file_name), None))
+        except Exception as e:
+            results.append((file_name, None, _dump_error(e)))
+    return results
+
+
+def _dump_error(error):
+    """
+    Parse errors refer to grammar symbols which are not picklable so they are
+    sent by symbol names and created again in the main process.
+    """
+    if isinstance(error, ParseError):
+        return (ParseError, error.location,
+                [s.fqn for s in error.symbols_expected],
+                [(t.symbol.fqn, t.value) for t in error.tokens_ahead],
+                [s.fqn for s in error.symbols_before])
+    if isinstance(error, DisambiguationError):
+        return (DisambiguationError, error.location,
+                [(t.symbol.fqn, t.value) for t in error.tokens])
+    return error
+
+
+def _load_error(grammar, error):
+    get_symbol = grammar.get_symbol
+    if error[0] is ParseError:
+        _, location, symbols_expected, tokens_ahead, symbols_before = error
+        return ParseError(location,
+                          [get_symbol(name) for name in symbols_expected],
+                          [Token(get_symbol(name), value)
+                           for name, value in tokens_ahead],
+                          [get_symbol(name) for name in symbols_before])
+    _, location, tokens = error
+    return DisambiguationError(location, [Token(get_symbol(name), value)
+                                          for name, value in tokens])
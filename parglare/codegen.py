@@ -0,0 +1,641 @@
+# -*- coding: utf-8 -*-
+"""
+Generation of standalone Python parser modules from LR tables.
+"""
+from __future__ import unicode_literals
+import codecs
+import re
+import sys
+from itertools import chain
+from parglare.grammar import StringRecognizer, RegExRecognizer, EMPTY, EOF, \
+    STOP, Terminal
+from parglare.tables import SHIFT, REDUCE, ACCEPT
+from parglare.exceptions import ParserInitError
+import parglare.actions
+
+# Codes of LR actions in the generated tables. The rest of the code is the
+# target state (SHIFT) or the production id (REDUCE).
+ACTION_SHIFT = 1
+ACTION_REDUCE = 2
+ACTION_ACCEPT = 3
+ACTION_BITS = 2
+
+
+def generate_parser(parser):
+    """
+    Returns the source code of a Python module implementing the given LR
+    parser. The module contains the LR table of the parser as integer tables,
+    compiled regexes of terminals and a parse loop specialized for these
+    tables. Importing the module doesn't load the grammar or construct the
+    table.
+
+    Actions and recognizers of the grammar are imported by the generated
+    module from the modules they are defined in. Actions which can't be
+    imported must be given to the `parse` function of the generated module.
+
+    Args:
+    parser(Parser): An LR parser for textual input. Layout must be given by
+        `ws` or by a LAYOUT rule which can be matched by a regex.
+    """
+    _check_parser(parser)
+    grammar = parser.grammar
+    table = parser.table
+    imports = _Imports()
+
+    terminals = sorted(grammar.terminals.values(), key=lambda t: t.term_id)
+    nonterminals = sorted(grammar.nonterminals.values(),
+                          key=lambda n: n.nonterm_id)
+    productions = grammar.productions
+    assert [t.term_id for t in terminals] == list(range(len(terminals)))
+    assert [n.nonterm_id for n in nonterminals] == \
+        list(range(len(nonterminals)))
+
+    regexes = []
+    values = []
+    recognizers = []
+    for terminal in terminals:
+        recognizer = terminal.recognizer
+        regex = value = custom = None
+        if terminal in (STOP, EMPTY, EOF):
+            pass
+        elif type(recognizer) is RegExRecognizer:
+            regex = (recognizer._regex, recognizer.re_flags)
+        elif type(recognizer) is StringRecognizer:
+            regex = (re.escape(recognizer.value),
+                     re.IGNORECASE if recognizer.ignore_case else 0)
+            if recognizer.ignore_case:
+                value = recognizer.value
+        else:
+            custom = imports.reference(recognizer)
+            if custom is None:
+                raise ParserInitError(
+                    'Recognizer of terminal "{}" can\'t be imported by the '
+                    'generated parser.'.format(terminal.fqn))
+        regexes.append(regex)
+        values.append(value)
+        recognizers.append(custom)
+
+    actions = []
+    gotos = []
+    scan = []
+    for state in table.states:
+        actions.append(tuple(_encode_actions(state.actions_by_id[t.term_id])
+                             if t.term_id < len(state.actions_by_id)
+                             else 0
+                             for t in terminals))
+        gotos.append(tuple(
+            state.gotos_by_id[n.nonterm_id].state_id
+            if n.nonterm_id < len(state.gotos_by_id)
+            and state.gotos_by_id[n.nonterm_id] is not None else 0
+            for n in nonterminals))
+        scan.append(_state_scan(state))
+
+    action_refs = []
+    for action in chain(parser._shift_actions,
+                        (n.action for n in nonterminals)):
+        if type(action) is list:
+            action_refs.append([imports.action_reference(a) for a in action])
+        else:
+            action_refs.append(imports.action_reference(action))
+
+    skip_regex = None
+    if parser.layout_regex is not None:
+        skip_regex = parser.layout_regex
+    elif parser.ws_regex is not None:
+        skip_regex = parser.ws_regex
+
+    module = _HEADER.format(file_name=grammar.file_path or '<string>')
+    module += imports.source()
+    module += '\n# Marks grammar actions which must be given when parsing.\n'
+    module += 'REQUIRED = object()\n'
+    for name, value in [
+            ('LEXICAL_DISAMBIGUATION', bool(parser.lexical_disambiguation)),
+            ('RETURN_POSITION', bool(parser.return_position)),
+            ('PREFER', frozenset(t.term_id for t in terminals
+                                 if t.prefer)),
+            ('PRIORS', tuple(t.prior for t in terminals))]:
+        module += '{} = {!r}\n'.format(name, value)
+    module += 'SKIP_REGEX = {}\n'.format(
+        'None' if skip_regex is None
+        else 're.compile({!r}, {})'.format(skip_regex.pattern,
+                                           int(skip_regex.flags)))
+    module += _rows('TERMINALS', [(t.name, _action_keys(t))
+                                  for t in terminals])
+    module += _rows('NONTERMINALS', [(n.name, _action_keys(n))
+                                     for n in nonterminals])
+    module += _rows('REGEXES', [
+        'None' if regex is None
+        else 're.compile({!r}, {})'.format(regex[0], int(regex[1]))
+        for regex in regexes],
+        source=True)
+    module += _rows('VALUES', values)
+    module += _rows('RECOGNIZERS', [r or 'None' for r in recognizers],
+                    source=True)
+    module += _rows('GRAMMAR_ACTIONS', [
+        '[{}]'.format(', '.join(ref)) if type(ref) is list else ref
+        for ref in action_refs], source=True)
+    module += _rows('PRODUCTIONS', [_production(p) for p in productions])
+    module += _rows('STATE_SYMBOLS', [
+        (s.symbol.name, isinstance(s.symbol, Terminal))
+        for s in table.states])
+    module += _rows('ACTIONS', actions)
+    module += _rows('GOTOS', gotos)
+    module += _rows('SCAN', scan)
+    module += _RUNTIME
+    return module
+
+
+def write_parser(parser, file_name):
+    """
+    Generates the parser module for the given parser (see `generate_parser`)
+    and writes it to the given file.
+    """
+    with codecs.open(file_name, 'w', 'utf-8') as f:
+        f.write(generate_parser(parser))
+
+
+def _check_parser(parser):
+    from parglare.glr import GLRParser
+    if isinstance(parser, GLRParser):
+        unsupported = 'GLR parsing'
+    elif parser.in_layout:
+        unsupported = 'layout parsers'
+    elif parser.build_tree:
+        unsupported = 'build_tree'
+    elif parser.error_recovery:
+        unsupported = 'error_recovery'
+    elif parser.dynamic_filter:
+        unsupported = 'dynamic_filter'
+    elif parser.custom_token_recognition:
+        unsupported = 'custom_token_recognition'
+    elif parser.layout_parser is not None and parser.layout_regex is None:
+        unsupported = 'LAYOUT which can\'t be matched by a regex'
+    elif parser.ws and parser.ws_regex is None:
+        unsupported = 'non-textual input'
+    else:
+        return
+    raise ParserInitError(
+        'Parser module can\'t be generated. Unsupported: {}.'
+        .format(unsupported))
+
+
+def _encode_actions(actions):
+    """
+    Encodes the action which the LR parser takes for the given list of state
+    actions as an int.
+    """
+    if not actions:
+        return 0
+    act = actions[0]
+    # EMPTY reduction is taken only if there is no other action.
+    if act.action is REDUCE and len(act.prod.rhs) == 0 and len(actions) > 1:
+        act = actions[1]
+    if act.action is SHIFT:
+        return act.state.state_id << ACTION_BITS | ACTION_SHIFT
+    elif act.action is REDUCE:
+        return act.prod.prod_id << ACTION_BITS | ACTION_REDUCE
+    elif act.action is ACCEPT:
+        return ACTION_ACCEPT
+    return 0
+
+
+def _state_scan(state):
+    """
+    Returns candidate terminals of the given state for the token recognition
+    as (chars, any, non_ascii) where each candidate is (term_id, finish).
+    See `FirstCharIndex`.
+    """
+    entries = [(symbol.term_id, bool(finish))
+               for symbol, finish in zip(state.actions, state.finish_flags)]
+    special = (STOP.term_id, EMPTY.term_id, EOF.term_id)
+
+    def candidates(indexes):
+        return tuple(entries[idx] for idx in indexes
+                     if entries[idx][0] not in special)
+
+    index = state.first_chars
+    if index is None:
+        all_candidates = candidates(range(len(entries)))
+        return ({}, all_candidates, all_candidates)
+    # Sorted for a deterministic module source.
+    chars = dict((char, candidates(indexes))
+                 for char, indexes in sorted(index.chars.items()))
+    return (chars, candidates(index.any), candidates(index.non_ascii))
+
+
+def _production(production):
+    assignments = None
+    if production.assignments:
+        assignments = tuple((a.name, a.index, a.op == '=')
+                            for a in production.assignments.values())
+    return (production.symbol.nonterm_id, len(production.rhs),
+            production.prod_symbol_id, assignments)
+
+
+def _action_keys(symbol):
+    """
+    Keys used to find an action for the symbol in the `actions` dict given to
+    the generated parser in the order used by the grammar.
+    """
+    keys = []
+    for key in (symbol.fqn, symbol.action_fqn, symbol.name,
+                symbol.action_name):
+        if key is not None and key not in keys:
+            keys.append(key)
+    return tuple(keys)
+
+
+class _Imports(object):
+    """
+    Collects imports of actions and recognizers used by the generated module.
+    """
+    def __init__(self):
+        self.names = {}
+        self.imports = []
+
+    def reference(self, obj):
+        """
+        Returns the name under which the given callable is available in the
+        generated module or `None` if it can't be imported.
+        """
+        if id(obj) in self.names:
+            return self.names[id(obj)]
+        module_name = getattr(obj, '__module__', None)
+        name = getattr(obj, '__name__', None)
+        module = sys.modules.get(module_name)
+        if module is None or module_name == '__main__' \
+                or getattr(module, name, None) is not obj:
+            return None
+        local_name = '_{}_{}'.format(name, len(self.imports))
+        self.imports.append((module_name, name, local_name))
+        self.names[id(obj)] = local_name
+        return local_name
+
+    def action_reference(self, action):
+        """
+        Returns the source for the given action. Actions which can't be
+        imported (and `obj` action which needs the grammar) must be given
+        when parsing.
+        """
+        if action is None:
+            return 'None'
+        reference = None
+        if action is not parglare.actions.obj:
+            reference = self.reference(action)
+        return reference if reference is not None else 'REQUIRED'
+
+    def source(self):
+        return ''.join('from {} import {} as {}\n'.format(*i)
+                       for i in self.imports)
+
+
+def _rows(name, rows, source=False):
+    """
+    Returns the source of a tuple constant with each row on its own line.
+    Rows are given as values or as source strings.
+    """
+    return '{} = (\n{})\n'.format(
+        name, ''.join('    {},\n'.format(row if source else repr(row))
+                      for row in rows))
+
+
+_HEADER = '''\
+# -*- coding: utf-8 -*-
+"""
+Parser generated by parglare from grammar "{file_name}".
+Do not edit. Regenerate after the grammar changes.
+"""
+from __future__ import unicode_literals
+import codecs
+import re
+from parglare.parser import Context, Token
+from parglare.common import Location
+from parglare.exceptions import ParseError, DisambiguationError, \\
+    ParserInitError
+'''
+
+_RUNTIME = '''
+
+STOP_ID = 0
+EMPTY_ID = 1
+EOF_ID = 2
+SHIFT = 1
+REDUCE = 2
+ACCEPT = 3
+
+
+def parse_file(file_name, **kwargs):
+    """
+    Parses content from the given file.
+    """
+    with codecs.open(file_name, 'r', 'utf-8') as f:
+        content = f.read()
+    return parse(content, file_name=file_name, **kwargs)
+
+
+def parse(input_str, position=0, file_name=None, context=None, actions=None):
+    """
+    Parses the given input string. Actions given in a dict keyed by symbol or
+    action names override actions of the grammar.
+    """
+    if actions or DEFAULT_ACTIONS is None:
+        terminal_actions, production_actions = _resolve_actions(actions)
+    else:
+        terminal_actions, production_actions = DEFAULT_ACTIONS
+
+    context = Context() if context is None else context
+    context.input_str = input_str
+    if not hasattr(context, 'file_name') or context.file_name is None:
+        context.file_name = file_name
+    context.position = context.start_position = \\
+        context.end_position = position
+    context.layout_content = ''
+
+    skip = SKIP_REGEX.match if SKIP_REGEX is not None else None
+    layout_ahead = ''
+    # Stack entry items: state, result, start position, end position, layout.
+    stack = [0, None, position, position, '']
+    token = None
+
+    while True:
+        state = stack[-5]
+
+        if token is None:
+            layout_ahead = ''
+            if skip is not None:
+                match = skip(input_str, position)
+                if match is not None and match.end() > position:
+                    new_position = match.end()
+                    layout_ahead = input_str[position:new_position]
+                    position = new_position
+            context.position = position
+            token = _next_token(context, state, input_str, position)
+            term_id, length, value = token
+
+        code = ACTIONS[state][term_id]
+        kind = code & 3
+
+        if kind == SHIFT:
+            new_state = code >> 2
+            new_position = position + length
+            if value is None:
+                value = input_str[position:new_position]
+            sem_action = terminal_actions[term_id]
+            if sem_action is None:
+                result = value
+            else:
+                action, needs_context = sem_action
+                if needs_context:
+                    result = action(
+                        Context(start_position=position,
+                                end_position=new_position,
+                                token=Token(_terminal(term_id), value),
+                                layout_content=layout_ahead,
+                                position=new_position,
+                                context=context),
+                        value)
+                else:
+                    result = action(context, value)
+            stack.extend((new_state, result, position, new_position,
+                          layout_ahead))
+            position = new_position
+            token = None
+
+        elif kind == REDUCE:
+            prod_id = code >> 2
+            nonterm_id, r_length, _, assignments = PRODUCTIONS[prod_id]
+            end_position = stack[-2]
+            if r_length:
+                entries = -5 * r_length
+                subresults = stack[entries + 1::5]
+                start_position = stack[entries + 2]
+                layout = stack[entries + 4]
+                del stack[entries:]
+            else:
+                subresults = []
+                start_position = end_position
+                layout = ''
+
+            sem_action = production_actions[prod_id]
+            if sem_action is None:
+                result = subresults[0] if r_length == 1 else subresults
+            else:
+                action, needs_context = sem_action
+                if needs_context:
+                    action_context = Context(
+                        start_position=start_position,
+                        end_position=end_position,
+                        position=position,
+                        layout_content=layout,
+                        layout_content_ahead=layout_ahead,
+                        context=context)
+                else:
+                    action_context = context
+                if assignments:
+                    result = action(action_context, subresults,
+                                    **_assignment_results(assignments,
+                                                          subresults))
+                else:
+                    result = action(action_context, subresults)
+
+            stack.extend((GOTOS[stack[-5]][nonterm_id], result,
+                          start_position, end_position, layout))
+
+        elif kind == ACCEPT:
+            if RETURN_POSITION:
+                return stack[6], position
+            return stack[6]
+
+        else:
+            raise _parse_error(context, state, position)
+
+
+def _next_token(context, state, input_str, position):
+    """
+    Returns the token ahead as (term_id, length, value). Value is None if it
+    should be taken from the input.
+    """
+    tokens = []
+    row = ACTIONS[state]
+    if row[EMPTY_ID]:
+        tokens.append((EMPTY_ID, 0, None))
+    if row[STOP_ID]:
+        tokens.append((STOP_ID, 0, None))
+    if position == len(input_str):
+        tokens.append((EOF_ID, 0, None))
+    else:
+        chars, any_candidates, non_ascii = SCAN[state]
+        char = input_str[position]
+        candidates = chars.get(char)
+        if candidates is None:
+            candidates = any_candidates if char < '\\x80' else non_ascii
+        recognized = []
+        last_prior = -1
+        for term_id, finish in candidates:
+            prior = PRIORS[term_id]
+            if prior < last_prior and recognized:
+                break
+            last_prior = prior
+            regex = REGEXES[term_id]
+            if regex is not None:
+                match = regex.match(input_str, position)
+                if match is None:
+                    continue
+                length = match.end() - position
+                value = VALUES[term_id]
+            else:
+                recognizer = RECOGNIZERS[term_id]
+                try:
+                    value = recognizer(input_str, position)
+                except TypeError:
+                    value = recognizer(context, input_str, position)
+                if type(value) is int:
+                    length, value = value, None
+                else:
+                    length = len(value) if value else 0
+            if length:
+                recognized.append((term_id, length, value))
+                if finish:
+                    break
+        tokens.extend(recognized)
+
+    if len(tokens) == 1:
+        return tokens[0]
+    if len(tokens) > 1 and LEXICAL_DISAMBIGUATION:
+        tokens = _lexical_disambiguation(tokens)
+    if not tokens:
+        return (EMPTY_ID, 0, None)
+    elif len(tokens) == 1:
+        return tokens[0]
+    raise DisambiguationError(Location(context),
+                              [_token(input_str, position, t)
+                               for t in tokens])
+
+
+def _lexical_disambiguation(tokens):
+    ids = [t[0] for t in tokens]
+    # prefer STOP over EMPTY and EOF
+    if STOP_ID in ids:
+        tokens = [t for t in tokens if t[0] not in (EMPTY_ID, EOF_ID)]
+    # prefer EMTPY over EOF
+    elif EMPTY_ID in ids:
+        tokens = [t for t in tokens if t[0] != EOF_ID]
+
+    # Longest-match strategy.
+    max_len = max(t[1] for t in tokens)
+    tokens = [t for t in tokens if t[1] == max_len]
+    if len(tokens) == 1:
+        return tokens
+
+    pref_tokens = [t for t in tokens if t[0] in PREFER]
+    if pref_tokens:
+        return pref_tokens
+    return tokens
+
+
+def _assignment_results(assignments, subresults):
+    return {name: subresults[index] if value else bool(subresults[index])
+            for name, index, value in assignments}
+
+
+def _parse_error(context, state, position):
+    from parglare.grammar import NonTerminal
+    context.start_position = context.end_position = \\
+        context.position = position
+    symbols_expected = [_terminal(term_id)
+                        for term_id, code in enumerate(ACTIONS[state])
+                        if code]
+    input_str = context.input_str
+    tokens_ahead = []
+    if position < len(input_str):
+        for term_id in range(EOF_ID + 1, len(TERMINALS)):
+            regex = REGEXES[term_id]
+            if regex is not None:
+                match = regex.match(input_str, position)
+                length = match.end() - position if match else 0
+                value = VALUES[term_id]
+            else:
+                recognizer = RECOGNIZERS[term_id]
+                try:
+                    value = recognizer(input_str, position)
+                except TypeError:
+                    value = recognizer(context, input_str, position)
+                if type(value) is int:
+                    length, value = value, None
+                else:
+                    length = len(value) if value else 0
+            if length:
+                tokens_ahead.append(
+                    _token(input_str, position, (term_id, length, value)))
+    name, is_terminal = STATE_SYMBOLS[state]
+    symbol_before = _terminal_by_name(name) if is_terminal \\
+        else NonTerminal(name)
+    return ParseError(Location(context=context), symbols_expected,
+                      tokens_ahead, symbols_before=[symbol_before])
+
+
+def _terminal(term_id):
+    terminal = _terminals.get(term_id)
+    if terminal is None:
+        terminal = _terminals[term_id] = \\
+            _terminal_by_name(TERMINALS[term_id][0])
+    return terminal
+
+
+_terminals = {}
+
+
+def _terminal_by_name(name):
+    from parglare.grammar import Terminal
+    return Terminal(name)
+
+
+def _token(input_str, position, token):
+    term_id, length, value = token
+    if value is None:
+        value = input_str[position:position + length]
+    return Token(_terminal(term_id), value)
+
+
+def _resolve_actions(actions=None):
+    """
+    Returns actions called by the parser for terminals (by term_id) and
+    productions (by prod_id) as (action, needs_context) or None.
+    """
+    actions = actions or {}
+
+    def resolve(symbol, grammar_action):
+        name, keys = symbol
+        for key in keys:
+            if key in actions:
+                return actions[key]
+        if grammar_action is REQUIRED:
+            raise ParserInitError(
+                'Action for "{}" must be given to the generated parser.'
+                .format(name))
+        return grammar_action
+
+    def dispatch(action):
+        if action is None:
+            return None
+        return (action, not getattr(action, 'no_context', False))
+
+    terminal_actions = [dispatch(resolve(t, a))
+                        for t, a in zip(TERMINALS, GRAMMAR_ACTIONS)]
+    nonterminal_actions = [resolve(n, a) for n, a in
+                           zip(NONTERMINALS,
+                               GRAMMAR_ACTIONS[len(TERMINALS):])]
+    production_actions = []
+    for nonterm_id, _, prod_symbol_id, _ in PRODUCTIONS:
+        action = nonterminal_actions[nonterm_id]
+        if type(action) is list:
+            action = action[prod_symbol_id]
+        production_actions.append(dispatch(action))
+    return terminal_actions, production_actions
+
+
+try:
+    DEFAULT_ACTIONS = _resolve_actions()
+except ParserInitError:
+    DEFAULT_ACTIONS = None
+'''
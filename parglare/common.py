@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
 import sys
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, chain, count
+from operator import add
 from parglare.termui import s_attention as _a
 
 if sys.version < '3':
@@ -16,14 +20,18 @@ class Location(object):
     Args:
     context(Context): Parsing context used to populate this object.
     line, column (int):
+    line_index(LineIndex): Index of lines of the input shared by the
+        locations of a parse.
     """
 
     __slots__ = ['input_str', 'start_position', 'end_position', 'position',
-                 'file_name', '_line', '_column']
+                 'file_name', 'line_index', '_line', '_column']
 
     def __init__(self, context=None, file_name=None):
 
         self.input_str = context.input_str if context else None
+        self.line_index = getattr(context, 'line_index', None) \
+            if context else None
         self.start_position = context.start_position if context else None
         self.end_position = context.end_position if context else None
         self.position = context.position if context else None
@@ -50,9 +58,10 @@ class Location(object):
         return self._column
 
     def evaluate_line_col(self):
-        from parglare.parser import pos_to_line_col
-        self._line, self._column = \
-            pos_to_line_col(self.input_str, self.start_position)
+        line_index = self.line_index
+        if line_index is None or line_index.input_str is not self.input_str:
+            line_index = self.line_index = LineIndex(self.input_str)
+        self._line, self._column = line_index.line_col(self.start_position)
 
     def __str__(self):
         line, column = self.line, self.column
@@ -68,6 +77,60 @@ class Location(object):
             return "<Unknown location>"
 
 
+class LineIndex(object):
+    """
+    Start positions of the lines of the input for converting positions to
+    lines and columns, and back, by binary search. The input is scanned for
+    newlines on the first lookup.
+
+    Non-textual input is a single line.
+    """
+
+    __slots__ = ['input_str', '_line_starts']
+
+    def __init__(self, input_str):
+        self.input_str = input_str
+        self._line_starts = None
+
+    @property
+    def line_starts(self):
+        if self._line_starts is None:
+            input_str = self.input_str
+            if type(input_str) is text:
+                # Lines end at the ends of the parts split by newlines, plus
+                # one for each newline.
+                line_ends = accumulate(map(len, input_str.split('\n')))
+                line_starts = array('l', chain((0,),
+                                               map(add, line_ends, count(1))))
+                del line_starts[-1]
+            else:
+                line_starts = array('l', (0,))
+            self._line_starts = line_starts
+        return self._line_starts
+
+    def line_col(self, position):
+        """
+        Returns position in the (line, column) form. Lines start from 1 and
+        columns from 0.
+        """
+        if position is None:
+            return None, None
+        line_starts = self.line_starts
+        line = bisect_right(line_starts, position)
+        return line, position - line_starts[line - 1]
+
+    def line_start(self, line):
+        """
+        Returns the position where the given line starts.
+        """
+        if line < 1:
+            raise IndexError('Lines start from 1.')
+        return self.line_starts[line - 1]
+
+    def __len__(self):
+        return len(self.line_starts)
+
+
 def position_context(context):
     """
     Returns position context string.
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Compact parse trees kept in arrays.
+"""
+from __future__ import unicode_literals
+from array import array
+from parglare.grammar import STOP, EMPTY, EOF
+from parglare.parser import NodeTerm, NodeNonTerm, Token
+
+# Link to a missing node.
+NO_NODE = -1
+
+
+class CompactTree(object):
+    """
+    Parse tree built by the LR parser with `build_tree='compact'`. Nodes are
+    numbered in the order they are created, so children come before their
+    parent and the root is the last node, and their properties are kept in
+    parallel arrays indexed by the node numbers. Node objects with the API of
+    `NodeTerm` and `NodeNonTerm` are views over the arrays created on access.
+
+    Attributes:
+    ids(array): Production ids of non-terminal nodes and `-1 - term_id` of
+        terminal nodes.
+    start_positions, end_positions(array): Positions of the nodes in the
+        input.
+    layout_starts(array): Start positions of the layout before the nodes.
+    first_child, next_sibling(array): Links between the nodes of the tree.
+        Missing nodes are `NO_NODE`.
+    values(dict): Token values by node numbers for tokens whose value is not
+        the part of the input the token spans, e.g. introduced by error
+        recovery.
+    layouts(dict): Layout contents by node numbers for layouts which don't
+        end at the start of the node.
+    """
+
+    def __init__(self, grammar, input_str):
+        self.input_str = input_str
+        self.productions = grammar.productions
+        special_terminals = (STOP, EMPTY, EOF)
+        self.terminals = list(special_terminals) + [
+            terminal for terminal in grammar.terminals.values()
+            if terminal not in special_terminals]
+        self.ids = array('i')
+        self.start_positions = array('l')
+        self.end_positions = array('l')
+        self.layout_starts = array('l')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.values = {}
+        self.layouts = {}
+        self.root = NO_NODE
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_term(self, context):
+        """
+        Adds a terminal node for the token shifted in the given context and
+        returns its number.
+        """
+        node = len(self.ids)
+        token = context.token
+        start = context.start_position
+        end = context.end_position
+        input_str = self.input_str
+        value = token._value
+        if value is not None and value != input_str[start:end]:
+            self.values[node] = value
+        layout = context.layout_content
+        layout_start = start
+        if layout:
+            layout_start = start - len(layout)
+            if layout_start < 0 or input_str[layout_start:start] != layout:
+                self.layouts[node] = layout
+                layout_start = start
+        self.ids.append(-1 - token.symbol.term_id)
+        self.start_positions.append(start)
+        self.end_positions.append(end)
+        self.layout_starts.append(layout_start)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        return node
+
+    def add_nonterm(self, context, children):
+        """
+        Adds a non-terminal node for the reduction in the given context with
+        the given children node numbers and returns its number.
+        """
+        node = len(self.ids)
+        if children:
+            first = children[0]
+            start = self.start_positions[first]
+            end = self.end_positions[children[-1]]
+            layout_start = self.layout_starts[first]
+            if first in self.layouts:
+                self.layouts[node] = self.layouts[first]
+            next_sibling = self.next_sibling
+            for idx in range(1, len(children)):
+                next_sibling[children[idx - 1]] = children[idx]
+        else:
+            first = NO_NODE
+            start = layout_start = context.start_position
+            end = context.end_position
+        self.ids.append(context.production.prod_id)
+        self.start_positions.append(start)
+        self.end_positions.append(end)
+        self.layout_starts.append(layout_start)
+        self.first_child.append(first)
+        self.next_sibling.append(NO_NODE)
+        return node
+
+    def node(self, index):
+        """
+        Returns the view of the node with the given number.
+        """
+        if self.ids[index] < 0:
+            return CompactNodeTerm(self, index)
+        return CompactNodeNonTerm(self, index)
+
+    def children(self, index):
+        """
+        Returns numbers of the children of the given node.
+        """
+        children = []
+        child = self.first_child[index]
+        next_sibling = self.next_sibling
+        while child != NO_NODE:
+            children.append(child)
+            child = next_sibling[child]
+        return children
+
+
+class CompactNode(object):
+    """
+    Properties of the views over the nodes of a compact tree. Views of the
+    same node are equal.
+    """
+    __slots__ = []
+
+    @property
+    def start_position(self):
+        return self.tree.start_positions[self.index]
+
+    @property
+    def end_position(self):
+        return self.tree.end_positions[self.index]
+
+    @property
+    def layout_content(self):
+        tree = self.tree
+        index = self.index
+        layout_start = tree.layout_starts[index]
+        start = tree.start_positions[index]
+        if layout_start == start:
+            return tree.layouts.get(index, '')
+        return tree.input_str[layout_start:start]
+
+    @property
+    def state(self):
+        return None
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other.tree is self.tree \
+            and other.index == self.index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+
+class CompactNodeTerm(CompactNode, NodeTerm):
+    __slots__ = ['tree', 'index']
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def symbol(self):
+        return self.tree.terminals[-1 - self.tree.ids[self.index]]
+
+    @property
+    def value(self):
+        tree = self.tree
+        index = self.index
+        if index in tree.values:
+            return tree.values[index]
+        return tree.input_str[tree.start_positions[index]:
+                              tree.end_positions[index]]
+
+    @property
+    def token(self):
+        return Token(self.symbol, self.value)
+
+
+class CompactNodeNonTerm(CompactNode, NodeNonTerm):
+    __slots__ = ['tree', 'index']
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def production(self):
+        return self.tree.productions[self.tree.ids[self.index]]
+
+    @property
+    def children(self):
+        tree = self.tree
+        return [tree.node(child) for child in tree.children(self.index)]
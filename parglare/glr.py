@@ -1,37 +1,26 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, unicode_literals
-import codecs
 from itertools import chain, takewhile
 from copy import copy
 from parglare import Parser
-from parglare import termui as t
-from .exceptions import ParseError
-from .parser import SHIFT, REDUCE, ACCEPT, pos_to_line_col, Context, Token
-from .common import Location, position_context
+from .exceptions import ParseError, ParserInitError
+from .parser import SHIFT, REDUCE, ACCEPT, Context, Token, text
+from .common import Location
+from .stream import InputNeeded
 from .common import replace_newlines as _
 from .tables import LALR
-from .export import dot_escape
+from .grammar import RegExRecognizer
 from .termui import prints, h_print, a_print
 
 
-def no_colors(f):
-    """
-    Decorator for trace methods to prevent ANSI COLOR codes apearing in
-    the trace dot output.
-    """
-    def nc_f(*args, **kwargs):
-        self = args[0]
-        t.colors = False
-        r = f(*args, **kwargs)
-        t.colors = self.debug_colors
-        return r
-    return nc_f
-
-
 class GLRParser(Parser):
     """
     A Tomita-style GLR parser.
     """
+    _published_attrs = Parser._published_attrs + (
+        'token_cache_hits', 'token_cache_misses', 'layout_cache_hits',
+        'layout_cache_misses')
+
     def __init__(self, grammar, actions=None,
                  layout_actions=None, debug=False, debug_trace=False,
                  debug_colors=False, debug_layout=False, ws='\n\r\t ',
@@ -40,7 +29,13 @@ class GLRParser(Parser):
                  prefer_shifts=None, prefer_shifts_over_empty=None,
                  error_recovery=False, dynamic_filter=None,
                  custom_token_recognition=None, lexical_disambiguation=None,
-                 force_load_table=False, table=None, **kwargs):
+                 force_load_table=False, table=None, combined_scanner=False,
+                 prescan=False, **kwargs):
+
+        if build_tree == 'compact':
+            raise ParserInitError(
+                'Compact trees are built only by the LR parser as nodes of '
+                'the parse forest are shared.')
 
         if table is None:
             # The default for GLR is not to use any strategy preferring shifts
@@ -69,7 +64,8 @@ class GLRParser(Parser):
             error_recovery=error_recovery, dynamic_filter=dynamic_filter,
             custom_token_recognition=custom_token_recognition,
             lexical_disambiguation=lexical_disambiguation,
-            force_load_table=force_load_table, table=table, **kwargs)
+            force_load_table=force_load_table, table=table,
+            combined_scanner=combined_scanner, prescan=prescan, **kwargs)
 
     def _check_parser(self):
         """
@@ -86,13 +82,22 @@ class GLRParser(Parser):
             file_name(str): File name if applicable. Used in error reporting.
             context(Context): An object used to keep parser context info.
         """
+        session = self._session()
+        try:
+            return session._parse(input_str, position, file_name, context)
+        finally:
+            self._publish(session)
+
+    def _parse(self, input_str, position=0, file_name=None, context=None):
 
-        if self.debug:
-            a_print("*** PARSING STARTED\n")
-            self.debug_step = 0
-            if self.debug_trace:
-                self.dot_trace = ""
+        context = self._init_parse(input_str, position, file_name, context)
+        self._skipws(context)
+
+        # We start with a single parser head in state 0.
+        self.heads_for_reduce = [GSSNode(context, number_of_trees=1)]
+        return self._parse_loop()
 
+    def _init_parse(self, input_str, position, file_name, context):
         self.errors = []
         self.in_error_recovery = None
         self.in_error_reporting = False
@@ -106,6 +111,13 @@ class GLRParser(Parser):
         self.heads_for_shift = []
         self.finish_head = None
 
+        # Token recognition and layout skipping results shared by all heads.
+        self.token_cache = {}
+        self.layout_cache = {}
+        self.token_cache_hits = self.token_cache_misses = 0
+        self.layout_cache_hits = self.layout_cache_misses = 0
+        self.cache_position = position
+
         self.file_name = file_name
 
         self.context = context = self._get_init_context(context, input_str,
@@ -113,43 +125,37 @@ class GLRParser(Parser):
         assert isinstance(context, Context)
 
         self._init_dynamic_disambiguation(context)
-        self._skipws(context)
-
-        # We start with a single parser head in state 0.
-        start_head = GSSNode(context, number_of_trees=1)
-        self.heads_for_reduce = [start_head]
+        return context
 
-        if self.debug and self.debug_trace:
-            self._trace_head(start_head,
-                             str(start_head.context.state.state_id))
+    def _parse_loop(self, window=None):
+        """
+        The main loop. Runs until all heads are finished or killed. Returns
+        the results or raises ParseError.
 
-        # The main loop
+        If push input window is given it is checked before each step that the
+        input fed is enough to continue.
+        """
         while self.heads_for_reduce:
 
+            if window is not None:
+                self._prepare_heads(window)
+
             self.last_heads_for_reduce = list(self.heads_for_reduce)
 
             self._do_reductions()
             if self.heads_for_shift:
                 self._do_shifts()
+                self._prune_caches()
 
             # If after shifting we don't have any heads for reduce and we
             # haven't found any final parse do error reporting.
             if not self.heads_for_reduce and not self.finish_head:
                 self.in_error_reporting = True
                 try:
-                    if self.debug:
-                        a_print("*** ENTERING ERROR REPORTING MODE.",
-                                new_line=True)
-
                     self._setup_error_reporting()
                     self._do_reductions()
                 finally:
                     self.in_error_reporting = False
-                    if self.debug:
-                        a_print("*** LEAVING ERROR REPORTING MODE.",
-                                new_line=True)
-                        h_print("Tokens expected:", self.expected, level=1)
-                        h_print("Tokens found:", self.tokens_ahead, level=1)
 
             # After error reporing do error recovery if enabled.
             if self.error_recovery:
@@ -171,18 +177,10 @@ class GLRParser(Parser):
                     # Get out from error recovery mode.
                     self.in_error_recovery = False
                     # Report dying heads
-                    if self.debug:
-                        for h in self.heads_for_recovery:
-                            a_print("{}. Killing head:"
-                                    .format(self.debug_step), h,
-                                    level=1)
-                            if self.debug_trace:
-                                self._trace_step_kill(h)
-                                self.debug_step += 1
+                    for h in self.heads_for_recovery:
+                        self._on_kill(h)
 
         if not self.finish_head:
-            if self.debug and self.debug_trace:
-                self._export_dot_trace()
             context = self.context
             context.start_position = context.end_position = context.position
             last_heads_for_reduce = self.last_heads_for_reduce
@@ -194,22 +192,125 @@ class GLRParser(Parser):
 
         results = [x[1] for x in self.finish_head.parents]
         self._remove_transient_state()
-        if self.debug:
-            a_print("*** {} sucessful parse(s).".format(len(results)))
-            if self.debug_trace:
-                self._export_dot_trace()
-
         return results
 
+    def _prune_caches(self):
+        """
+        Evicts the cached layout and tokens behind all active heads as no head
+        will look at those positions again.
+        """
+        if not self.heads_for_reduce:
+            return
+        position = min(h.context.position for h in self.heads_for_reduce)
+        if position <= self.cache_position:
+            return
+        self.cache_position = position
+        for cache, stale in (
+                (self.token_cache,
+                 [key for key in self.token_cache if key[0] < position]),
+                (self.layout_cache,
+                 [key for key in self.layout_cache if key < position])):
+            for key in stale:
+                del cache[key]
+
+    def _debug_observers(self):
+        from .observers import DebugObserver, DotTraceObserver
+        observers = [DebugObserver(colors=self.debug_colors)]
+        if self.debug_trace:
+            observers.append(DotTraceObserver())
+        return observers
+
+    def _observe(self):
+        """
+        Makes this parse session call the hooks of the observers. Changes of
+        the graph-structured stack are reported by the notifiers which are
+        replaced by the observed ones.
+        """
+        from .observers import observe, hooks, notifier
+        observe(self, self.observers, loop='_parse_loop')
+        for name in ('on_link', 'on_kill', 'on_accept', 'on_drop'):
+            gss_hooks = hooks(self.observers, name)
+            if gss_hooks:
+                setattr(self, '_' + name, notifier(gss_hooks))
+
+        on_heads = hooks(self.observers, 'on_heads')
+        if on_heads:
+            do_reductions = self._do_reductions
+            do_shifts = self._do_shifts
+
+            def reductions():
+                for hook in on_heads:
+                    hook(REDUCE, self.heads_for_reduce)
+                do_reductions()
+
+            def shifts():
+                for hook in on_heads:
+                    hook(SHIFT, self.heads_for_shift)
+                do_shifts()
+            self._do_reductions = reductions
+            self._do_shifts = shifts
+
+    # Notifiers of the changes of the graph-structured stack. They do nothing
+    # unless replaced in the parse sessions with observers.
+    def _on_link(self, head, old_head, root_head, created):
+        pass
+
+    def _on_kill(self, head):
+        pass
+
+    def _on_accept(self, head):
+        pass
+
+    def _on_drop(self, head, parent):
+        pass
+
+    def _instrument(self):
+        from .stats import ParseStats, instrument, instrument_gss
+        self.stats = ParseStats()
+        instrument(self, self.stats, cached=True)
+        instrument_gss(self, self.stats)
+
+    def parse_stream(self, stream, chunk_size=None, file_name=None,
+                     context=None):
+        raise ParserInitError('Stream parsing is not supported by GLRParser.')
+
+    def _check_stream_parsing(self):
+        if self.debug or self.error_recovery:
+            raise ParserInitError(
+                'Push parsing is not supported with debug and '
+                'error_recovery.')
+
+    def _init_push(self, window, file_name, context):
+        context = self._init_parse(window.buffer, 0, file_name, context)
+        self.heads_for_reduce = [GSSNode(context, number_of_trees=1)]
+
+    def _resume_push(self, state, window):
+        return self._parse_loop(window)
+
+    def _prepare_heads(self, window):
+        """
+        Makes sure that the input fed to the push window is enough for the
+        recognition of the next tokens of all heads.
+        """
+        window.step()
+        try:
+            for head in self.heads_for_reduce:
+                context = head.context
+                if context.token_ahead is None:
+                    context.input_str = window.buffer
+                    window.next_tokens(self, copy(context), context.position,
+                                       layout_actions=False)
+        except InputNeeded:
+            # Layout and tokens recognized on incomplete input are stale.
+            self.token_cache = {}
+            self.layout_cache = {}
+            self.cache_position = 0
+            raise
+
     def _do_reductions(self):
         """
         Reduces active heads until no more heads can be reduced.
         """
-        debug = self.debug
-        if debug:
-            a_print("**REDUCING HEADS", new_line=True)
-            self._debug_active_heads(self.heads_for_reduce)
-
         next_tokens = self._next_tokens
         reduce = self._reduce
 
@@ -226,40 +327,25 @@ class GLRParser(Parser):
         while heads_for_reduce:
             head = heads_for_reduce.pop()
             self.reducing_heads.append(head)
-            if debug:
-                a_print("Reducing head: ", str(head), new_line=True)
 
             self.context = context = head.context
             position = context.position
-            actions = context.state.actions
             token = context.token_ahead
 
             if token is None:
-                if debug:
-                    h_print("Finding lookaheads.", level=1)
-
                 self._skipws(context)
                 if position > self.last_position:
                     self.last_position = position
                     self.expected = set()
 
-                if debug:
-                    self._debug_context(context, token,
-                                        expected_symbols=actions.keys())
-
                 tokens = next_tokens(context)
 
-                if debug:
-                    h_print("Token(s) ahead: ", _(str(tokens)), level=1)
-
                 if not tokens:
                     if self.error_recovery:
                         # collect for possible recovery
                         self.heads_for_recovery.append(head)
-                    elif debug:
-                        a_print("** Killing head: ", head, level=1)
-                        if self.debug_trace:
-                            self._trace_step_kill(head)
+                    else:
+                        self._on_kill(head)
                 else:
                     for idx, token in enumerate(tokens):
                         reduce_head = head.for_token(token)
@@ -267,7 +353,8 @@ class GLRParser(Parser):
                     continue
 
             else:
-                symbol_actions = actions.get(token.symbol, [])
+                symbol_actions = context.state.actions_by_id[
+                    token.symbol.term_id] or []
                 for symbol_action in symbol_actions:
                     action = symbol_action.action
 
@@ -275,11 +362,7 @@ class GLRParser(Parser):
                         if self.in_error_reporting:
                             self.expected.add(token.symbol)
                         else:
-                            if debug:
-                                a_print("*** {}. SUCCESS!!!!", self.debug_step)
-                                self.debug_step += 1
-                                if self.debug_trace:
-                                    self._trace_step_finish(head)
+                            self._on_accept(head)
                             if self.finish_head:
                                 self.finish_head.merge_head(head, self)
                             else:
@@ -300,9 +383,89 @@ class GLRParser(Parser):
                         else:
                             self._add_to_heads_for_shift(head)
 
-                if debug:
-                    h_print("No more reductions for this head and lookahead"
-                            " token:", _(str(token)), level=1, new_line=True)
+    def _skipws(self, context):
+        """
+        Skips layout using results cached by position as all heads at the same
+        position skip the same layout.
+        """
+        position = context.position
+        skipped = self.layout_cache.get(position)
+        if skipped is None:
+            self.layout_cache_misses += 1
+            super(GLRParser, self)._skipws(context)
+            self.layout_cache[position] = (context.position,
+                                           context.layout_content_ahead)
+        else:
+            self.layout_cache_hits += 1
+            context.position, context.layout_content_ahead = skipped
+
+    def _token_recognition(self, context):
+        """
+        Token recognition with recognizer results cached by position and
+        terminal. Heads at the same position share the results so each
+        recognizer is called at most once per position. Recognizers which
+        accept context are always called as their results may depend on it.
+        """
+        if self.scanners is not None:
+            return super(GLRParser, self)._token_recognition(context)
+
+        input_str = context.input_str
+        position = context.position
+        state = context.state
+        cache = self.token_cache
+
+        index = state.first_chars if type(input_str) is text else None
+        if index is None:
+            candidates = enumerate(state.actions)
+        else:
+            symbols = index.symbols
+            candidates = ((idx, symbols[idx])
+                          for idx in index.candidates(input_str, position))
+
+        string_index = state.string_index
+        if string_index is not None and type(input_str) is text \
+                and (position, string_index) not in cache:
+            # Match all string terminals of the state with a single lookup.
+            cache[(position, string_index)] = True
+            matched = string_index.match(input_str, position)
+            others = set(string_index.others)
+            for idx, symbol in enumerate(string_index.symbols):
+                if idx not in others:
+                    cache[(position, symbol)] = matched.get(idx)
+
+        finish_flags = state.finish_flags
+        prescanned = self.prescanned
+        tokens = []
+        last_prior = -1
+        for idx, symbol in candidates:
+            if symbol.prior < last_prior and tokens:
+                break
+            last_prior = symbol.prior
+            key = (position, symbol)
+            if key in cache:
+                self.token_cache_hits += 1
+                tok = cache[key]
+            else:
+                self.token_cache_misses += 1
+                recognizer = symbol.recognizer
+                if type(recognizer) is RegExRecognizer:
+                    if prescanned is not None:
+                        tok = prescanned.match(recognizer, position)
+                    else:
+                        match = recognizer.regex.match(input_str, position)
+                        tok = match.end() - position if match else None
+                    cache[key] = tok
+                else:
+                    try:
+                        tok = cache[key] = recognizer(input_str, position)
+                    except TypeError:
+                        tok = recognizer(context, input_str, position)
+            if tok:
+                tokens.append(Token(symbol, tok, input_str=input_str,
+                                    position=position))
+                if finish_flags[idx]:
+                    break
+        return tokens
 
     def _do_shifts(self):
         """Perform all shifts.
@@ -312,30 +475,16 @@ class GLRParser(Parser):
         collected for error recovery if enabled.
 
         """
-        debug = self.debug
-        if self.debug:
-            a_print("**SHIFTING HEADS", new_line=True)
-
-        heads_for_shift = self.heads_for_shift
         self.last_shifts = {}
 
-        if self.debug:
-            self._debug_active_heads(heads_for_shift)
-
-        for head in heads_for_shift:
-            if debug:
-                a_print("Shifting head: ", head, new_line=True)
-
+        for head in self.heads_for_shift:
             self.context = context = head.context
 
-            if debug:
-                self._debug_context(context, context.token_ahead,
-                                    expected_symbols=None)
-
             # First action should be SHIFT if it is possible to shift by this
             # token.
-            action = context.state.actions.get(context.token_ahead.symbol,
-                                               [None])[0]
+            action = context.state.actions_by_id[
+                context.token_ahead.symbol.term_id]
+            action = action[0] if action else None
             if action and action.action is SHIFT:
                 if self.dynamic_filter and \
                    not self._call_dynamic_filter(context, SHIFT, None):
@@ -351,19 +500,13 @@ class GLRParser(Parser):
     def _reduce(self, head, production):
         """Executes reduce operation for the given head and production.
         """
-        debug = self.debug
         self.context = context = head.context
 
-        if debug:
-            a_print("{}. REDUCING by prod ".format(self.debug_step),
-                    production, level=1, new_line=True)
-            self.debug_step += 1
-
         prod_len = len(production.rhs)
         roots = []
         if not prod_len:
             context = Context(
-                state=context.state.gotos[production.symbol],
+                state=context.state.gotos_by_id[production.symbol.nonterm_id],
                 production=production,
                 start_position=context.start_position,
                 end_position=context.start_position,
@@ -384,35 +527,14 @@ class GLRParser(Parser):
             # following all possible paths.
             # Collect subresults along the way to be used with semantic actions
             to_process = [(head, context, [], prod_len, False, True)]
-            if debug:
-                h_print("Calculate reduction paths of length {}, "
-                        "choose only non-empty if possible:"
-                        .format(prod_len), level=1)
-                h_print("start node=",
-                        "[{}], symbol={}, empty=[{},{}], "
-                        "length={}".format(head, context.state.symbol,
-                                           head.any_empty,
-                                           head.all_empty, prod_len), level=2)
             roots = []
             while to_process:
                 node, first_head_context, subresults, length, path_has_empty,\
                     path_all_empty = to_process.pop()
                 length = length - 1
-                if debug:
-                    h_print("node = {}".format(node), level=2, new_line=True)
-                    h_print("backpath length = {}{}"
-                            .format(prod_len - length,
-                                    " - ROOT" if not length else ""),
-                            level=2)
                 for parent, res, any_empty, all_empty in node.parents:
                     path_has_empty = path_has_empty or any_empty
                     path_all_empty = path_all_empty and all_empty
-                    if debug:
-                        h_print("", "parent=[{}]: path_any_empty={}, "
-                                "path_all_empty={}"
-                                .format(parent,
-                                        path_has_empty, path_all_empty),
-                                level=3)
                     parent_subres = [res] + subresults
                     if length:
                         to_process.append(
@@ -433,22 +555,12 @@ class GLRParser(Parser):
                 if non_empty:
                     roots = non_empty
 
-            if debug:
-                h_print("Reduction paths = ", len(roots),
-                        level=1, new_line=True)
-                h_print("Roots:", level=1)
-                for idx, r in enumerate(roots):
-                    h_print("{}.".format(idx+1), r[0], level=2)
-
             # Create new heads.
-            for idx, (root, first_head_context, subresults,
-                      any_empty, all_empty) in enumerate(roots):
-                if debug:
-                    h_print("Reducing path {}:".format(idx + 1),
-                            level=1, new_line=True)
-
+            for root, first_head_context, subresults, any_empty, all_empty \
+                    in roots:
                 context = Context(
-                    state=root.context.state.gotos[production.symbol],
+                    state=root.context.state.gotos_by_id[
+                        production.symbol.nonterm_id],
                     production=production,
                     start_position=first_head_context.start_position,
                     end_position=context.end_position,
@@ -466,8 +578,6 @@ class GLRParser(Parser):
                     new_head = GSSNode(context)
                     self._merge_create_head(new_head, head, root, subresults,
                                             any_empty, all_empty)
-                if debug:
-                    print()
 
     def _shift(self, head, state, context):
         """Execute shift operation at the given position to the given state.
@@ -478,7 +588,6 @@ class GLRParser(Parser):
         """
 
         last_shifts = self.last_shifts
-        debug = self.debug
         token = context.token_ahead
 
         shifted_head = last_shifts.get((state.state_id,
@@ -488,24 +597,9 @@ class GLRParser(Parser):
             # If this token has already been shifted connect
             # shifted head to this head.
             result = shifted_head.parents[0][1]
-            shifted_head.create_link(head, result, False, False, self)
-            if debug and self.debug_trace:
-                self._trace_step(head, shifted_head, head,
-                                 "S:{}({})".format(
-                                     dot_escape(token.symbol.name),
-                                     dot_escape(token.value)))
+            shifted_head.create_link(head, result, False, False)
+            self._on_link(shifted_head, head, head, False)
         else:
-
-            if self.debug:
-                a_print("{}. SHIFTING".format(self.debug_step),
-                        _("\"{}\" to state {} "
-                          .format(token.value, context.state.state_id) +
-                          "at position " +
-                          str(pos_to_line_col(context.input_str,
-                                              context.start_position))),
-                        level=1, new_line=True)
-                self.debug_step += 1
-
             position = context.position + len(token)
             context = Context(state=state,
                               token=token,
@@ -525,32 +619,16 @@ class GLRParser(Parser):
                          token.symbol)] = new_head
 
             self.heads_for_reduce.append(new_head)
-            if debug:
-                a_print("New shifted head ", new_head, level=1)
-                if self.debug_trace:
-                    self._trace_head(new_head,
-                                     "{}:{}".format(
-                                         state.state_id,
-                                         dot_escape(state.symbol.name)))
-                    self._trace_step(head, new_head, head,
-                                     "S:{}({})".format(
-                                         dot_escape(token.symbol.name),
-                                         dot_escape(token.value)))
-
-            new_head.create_link(head, result, False, False, self)
+            new_head.create_link(head, result, False, False)
+            self._on_link(new_head, head, head, True)
 
     def _add_to_heads_for_shift(self, new_head):
         """Adds new head for shift or merges if already added."""
         for head in self.heads_for_shift:
             if head == new_head:
-                if self.debug:
-                    h_print("Merging head for shifting.", level=1)
                 head.merge_head(new_head, self)
                 break
         else:
-            if self.debug:
-                h_print("New head for shifting: ", new_head,
-                        level=1, new_line=True)
             self.heads_for_shift.append(new_head)
 
     def _merge_create_head(self, new_head, old_head, root_head, subresults,
@@ -559,14 +637,11 @@ class GLRParser(Parser):
         actions. Detects automata looping.
         """
 
-        debug = self.debug
         context = new_head.context
 
         if new_head == old_head:
             # Special case is reduction of empty production. For automata state
             # self-reference create stack node loop.
-            if debug:
-                a_print("Looping automata transition.", level=1)
             result = self._call_reduce_action(context, subresults)
             old_head.parents.append((old_head, result, True, True))
 
@@ -574,12 +649,7 @@ class GLRParser(Parser):
             # Detect automata loop. If we are reducing to the head we already
             # had and the new head is empty we have a loop due to EMPTY
             # reductions.
-            if debug:
-                a_print("Automata loop detected. ",
-                        "Rejecting the new head: {}".format(str(new_head)),
-                        level=1)
-                if self.debug_trace:
-                    self._trace_step_kill(old_head)
+            self._on_kill(old_head)
             return
 
         result = self._call_reduce_action(context, subresults)
@@ -587,27 +657,14 @@ class GLRParser(Parser):
         for head in chain(self.heads_for_reduce,
                           [self.finish_head] if self.finish_head else []):
             if head == new_head:
-                new_head.create_link(root_head, result, any_empty, all_empty,
-                                     self)
+                new_head.create_link(root_head, result, any_empty, all_empty)
                 if head.merge_head(new_head, self):
-                    if self.debug and self.debug_trace:
-                        self._trace_step(
-                            old_head, head, root_head,
-                            "R:{}".format(dot_escape(context.production)))
+                    self._on_link(head, old_head, root_head, False)
                 break
         else:
             self.heads_for_reduce.append(new_head)
-            if self.debug:
-                a_print("New reduced head ", new_head, level=2, new_line=True)
-                if self.debug_trace:
-                    self._trace_head(new_head, "{}:{}".format(
-                        new_head.context.state.state_id,
-                        dot_escape(new_head.context.state.symbol.name)))
-            new_head.create_link(root_head, result, any_empty, all_empty, self)
-
-            if self.debug and self.debug_trace:
-                self._trace_step(old_head, new_head, root_head,
-                                 "R:{}".format(dot_escape(context.production)))
+            new_head.create_link(root_head, result, any_empty, all_empty)
+            self._on_link(new_head, old_head, root_head, True)
 
     def _setup_error_reporting(self):
         """
@@ -644,7 +701,6 @@ class GLRParser(Parser):
         debug = self.debug
         for head in self.heads_for_recovery:
             context = head.context
-            input_str = context.input_str
             symbols = context.state.actions.keys()
             if debug:
                 a_print("**Error found. ",
@@ -669,7 +725,7 @@ class GLRParser(Parser):
                     context.position = position
                     if debug:
                         h_print("Advancing position to ",
-                                pos_to_line_col(input_str, position),
+                                context.line_index.line_col(position),
                                 level=1)
                 context.token_ahead = token
 
@@ -679,10 +735,7 @@ class GLRParser(Parser):
                 self.heads_for_reduce.append(head)
 
             else:
-                if debug:
-                    a_print("Killing head: ", head, level=1)
-                    if self.debug_trace:
-                        self._trace_step_kill(head)
+                self._on_kill(head)
 
         return bool(token or position)
 
@@ -699,72 +752,10 @@ class GLRParser(Parser):
         del self.last_heads_for_reduce
         del self.last_shifts
         del self.reducing_heads
-
-    def _debug_active_heads(self, heads):
-        h_print("Active heads = ", len(heads))
-        for head in heads:
-            prints("\t{}".format(head))
-        h_print("Number of trees = ", sum([h.number_of_trees for h in heads]))
-
-    def _debug_context(self, context, lookahead_tokens,
-                       expected_symbols=None):
-        input_str = context.input_str
-        position = context.position
-        layout_content = context.layout_content
-        h_print("Position:",
-                pos_to_line_col(input_str, position), level=1)
-        h_print("Context:", _(position_context(context)), level=1)
-        if layout_content:
-            h_print("Layout: ", "'{}'".format(_(layout_content)), level=1)
-        if expected_symbols:
-            h_print("Symbols expected: ",
-                    [s.name for s in expected_symbols], level=1)
-        if lookahead_tokens:
-            h_print("Token(s) ahead:", _(str(lookahead_tokens)), level=1)
-
-    @no_colors
-    def _trace_head(self, new_head, label):
-        self.dot_trace += '{} [label="{}"];\n'.format(new_head.key, label)
-
-    @no_colors
-    def _trace_step(self, old_head, new_head, root_head, label=''):
-        new_head_key = new_head.key if isinstance(new_head, GSSNode) \
-                       else new_head
-        self.dot_trace += '{} -> {} [label="{}. {}" {}];\n'.format(
-            old_head.key, new_head_key, self.debug_step, label,
-            TRACE_DOT_STEP_STYLE)
-        self.dot_trace += '{} -> {};\n'.format(new_head_key, root_head.key)
-
-    @no_colors
-    def _trace_step_finish(self, from_head):
-        self._trace_step(from_head, "success", from_head)
-
-    @no_colors
-    def _trace_step_kill(self, from_head):
-        self.dot_trace += \
-            '{}_killed [shape="diamond" fillcolor="red" label="killed"];\n'\
-            .format(from_head.key)
-        self.dot_trace += '{} -> {}_killed [label="{}." {}];\n'\
-            .format(from_head.key, from_head.key, self.debug_step,
-                    TRACE_DOT_STEP_STYLE)
-
-    @no_colors
-    def _trace_step_drop(self, from_head, to_head):
-        self.dot_trace += '{} -> {} [label="drop empty" {}];\n'\
-            .format(from_head.key, to_head.key, TRACE_DOT_DROP_STYLE)
-
-    def _export_dot_trace(self):
-        file_name = "{}_trace.dot".format(self.file_name) \
-                    if self.file_name else "parglare_trace.dot"
-        with codecs.open(file_name, 'w', encoding="utf-8") as f:
-            f.write(DOT_HEADER)
-            f.write(self.dot_trace)
-            f.write("}\n")
-
-        prints("Generated file {}.".format(file_name))
-        prints("You can use dot viewer or generate pdf with the "
-               "following command:")
-        h_print("dot -Tpdf {0} -O {0}.pdf".format(file_name))
+        del self.token_cache
+        del self.layout_cache
+        del self.cache_position
+        self.prescanned = None
 
 
 class GSSNode(object):
@@ -811,17 +802,12 @@ class GSSNode(object):
         """
         # Reject merging if other node is "more empty"
         if other.all_empty or self.less_empty(other):
-            if parser.debug:
-                h_print("Rejected merging of empty head: ", other, level=1)
             return False
         else:
             if self.parents and other.less_empty(self):
-                if parser.debug:
-                    h_print("Merging less empty head to more empty",
-                            " -> less empty head wins.", level=1)
-                    if parser.debug_trace:
-                        for p in self.parents:
-                            parser._trace_step_drop(self, p[0])
+                # Less empty head wins.
+                for p in self.parents:
+                    parser._on_drop(self, p[0])
                 self.any_empty = False
                 self.all_empty = True
                 self.parents = []
@@ -831,20 +817,13 @@ class GSSNode(object):
             self.all_empty &= other.all_empty
             self.number_of_trees += other.number_of_trees
             self.parents.extend(other.parents)
-
-            if parser.debug:
-                h_print("Merging head ", other, level=1)
-                h_print("to head", self, level=2)
             return True
 
-    def create_link(self, parent, result, any_empty, all_empty, parser):
+    def create_link(self, parent, result, any_empty, all_empty):
         self.parents.append((parent, result, any_empty, all_empty))
         self.number_of_trees += parent.number_of_trees
         self.any_empty |= any_empty
         self.all_empty &= all_empty
-        if parser.debug:
-            h_print("Creating link \tfrom head:", self, level=2)
-            h_print("  to head:", parent, level=4)
 
     def for_token(self, token):
         """Create head for the given token either by returning this head if the
@@ -904,21 +883,3 @@ class GSSNode(object):
         return "head_{}_{}_{}".format(self.context.state.state_id,
                                       self.context.start_position,
                                       self.context.end_position)
-
-
-DOT_HEADER = """
-    digraph parglare_trace {
-    rankdir=LR
-    fontname = "Bitstream Vera Sans"
-    fontsize = 8
-    node[
-        style=filled,
-        fillcolor=aliceblue
-    ]
-    nodesep = 0.3
-    edge[dir=black,arrowtail=empty]
-
-"""
-
-TRACE_DOT_STEP_STYLE = 'color="red" style="dashed"'
-TRACE_DOT_DROP_STYLE = 'color="orange" style="dotted"'
@@ -6,7 +6,8 @@ import re
 import itertools
 from copy import copy
 from parglare.exceptions import GrammarError, ParserInitError
-from parglare.actions import pass_single, pass_none, collect, collect_sep
+from parglare.actions import pass_single, pass_none, collect, collect_sep, \
+    pass_single_or_empty
 from parglare.common import Location, load_python_module
 from parglare.termui import prints, s_emph, s_header, a_print, h_print
 from parglare import termui
@@ -111,6 +112,8 @@ class NonTerminal(GrammarSymbol):
     Attributes:
     productions(list of Production): A list of alternative productions for
         this NonTerminal.
+    nonterm_id(int): Ordinal number of this NonTerminal in the grammar. Used
+        as an index in the dense goto tables.
     """
     def __init__(self, name, productions=None, location=None,
                  imported_with=None, user_meta=None):
@@ -133,6 +136,8 @@ class Terminal(GrammarSymbol):
         at the same place and implicit disambiguation doesn't resolve.
     keyword(bool): `True` if this Terminal represents keyword. `False` by
         default.
+    term_id(int): Ordinal number of this Terminal in the grammar. Used as an
+        index in the dense action tables.
 
     recognizer(callable): Called with input list of objects and position in the
         stream. Should return a sublist of recognized objects. The sublist
@@ -285,6 +290,12 @@ EMPTY.grammar_action = pass_none
 EOF = Terminal("EOF", EOF_recognizer)
 EOF.grammar_action = pass_none
 
+# Special symbols have fixed ids in all grammars.
+AUGSYMBOL.nonterm_id = 0
+STOP.term_id = 0
+EMPTY.term_id = 1
+EOF.term_id = 2
+
 
 class Production(object):
     """Represent production from the grammar.
@@ -755,13 +766,7 @@ class PGFile(object):
                                     Production(symbol,
                                                ProductionRHS([EMPTY]))])
 
-                def action(_, nodes):
-                    if nodes:
-                        return nodes[0]
-                    else:
-                        return []
-
-                symbol.grammar_action = action
+                symbol.grammar_action = pass_single_or_empty
 
                 self.register_symbol(symbol)
 
@@ -801,6 +806,8 @@ class Grammar(PGFile):
     nonterminals (set of NonTerminal):
     terminals(set of Terminal):
     imported_files(dict): Global registry of all imported files.
+    source(tuple): The grammar description and arguments given to `from_file`
+        or `from_string`. Used to create the same grammar in other processes.
 
     """
 
@@ -818,6 +825,7 @@ class Grammar(PGFile):
         """
 
         self.imported_files = {}
+        self.source = None
 
         super(Grammar, self).__init__(productions=productions,
                                       terminals=terminals,
@@ -855,6 +863,7 @@ class Grammar(PGFile):
             Production(AUGSYMBOL, ProductionRHS([self.start_symbol, STOP])))
 
         self._add_all_symbols_productions()
+        self._enumerate_symbols()
         self._enumerate_productions()
         self._fix_keyword_terminals()
         self._resolve_actions()
@@ -891,6 +900,25 @@ class Grammar(PGFile):
                             .format(type(rhs_elem))
         add_productions(list(self.productions))
 
+    def _enumerate_symbols(self):
+        """
+        Enumerates terminals (term_id) and nonterminals (nonterm_id). These
+        numbers are used as indexes in the dense LR tables. Special symbols
+        shared between grammars have fixed numbers.
+        """
+        special_terminals = (STOP, EMPTY, EOF)
+        term_id = len(special_terminals)
+        for terminal in self.terminals.values():
+            if terminal not in special_terminals:
+                terminal.term_id = term_id
+                term_id += 1
+
+        nonterm_id = 1
+        for nonterminal in self.nonterminals.values():
+            if nonterminal is not AUGSYMBOL:
+                nonterminal.nonterm_id = nonterm_id
+                nonterm_id += 1
+
     def _enumerate_productions(self):
         """
         Enumerates all productions (prod_id) and production per symbol
@@ -1166,6 +1194,9 @@ class Grammar(PGFile):
             file_path=what_to_parse
             if parse_fun_name == 'parse_file' else None,
         )
+        g.source = (parse_fun_name, what_to_parse,
+                    dict(recognizers=recognizers, ignore_case=ignore_case,
+                         re_flags=re_flags))
         termui.colors = debug_colors
         if debug:
             g.print_debug()
@@ -1564,8 +1595,6 @@ def get_grammar_parser(debug, debug_colors):
                                 actions=pg_actions,
                                 debug=debug,
                                 debug_colors=debug_colors)
-    EMPTY.action = pass_none
-    EOF.action = pass_none
     return grammar_parser
 
 
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental reparsing of edited input reusing subtrees of the previous parse
+tree.
+"""
+from __future__ import unicode_literals
+from bisect import bisect_right
+from parglare.exceptions import ParserInitError
+from parglare.parser import NodeNonTerm, NodeTerm, SHIFT, REDUCE, ACCEPT
+
+
+def reparse(parser, tree, input_str, edits, file_name=None, context=None):
+    """
+    Parses `input_str`, which is the input of the given tree changed by the
+    given edits, reusing subtrees outside of the edited regions.
+
+    Edits are `(start, end, new_text)` tuples where `start` and `end` are
+    positions in the previous input. Edits must not overlap.
+
+    A subtree of the previous tree is reused, i.e. shifted at once, if the
+    parser is at the position where the subtree starts in the state recorded
+    in the subtree, the token ahead is the first token of the subtree and
+    neither the subtree nor the token following it is touched by the edits.
+    In that case the LR parser would build the same subtree again. Nodes of
+    the previous tree are reused as they are, with positions shifted for the
+    length change of the preceding edits, so the previous tree must not be
+    used after reparsing. Positions inside the reused subtrees are shifted
+    lazily, when the children are accessed.
+    """
+    if not parser.build_tree or parser.build_tree == 'compact' \
+            or parser.call_actions_during_tree_build \
+            or parser.error_recovery or parser.dynamic_filter \
+            or parser.in_layout:
+        raise ParserInitError(
+            'Incremental parsing requires build_tree and is not supported '
+            'with compact trees, call_actions_during_tree_build, '
+            'error_recovery, dynamic_filter and for layout parsers.')
+    if tree.state is None:
+        raise ParserInitError(
+            'Tree is not built by the LR parser with build_tree.')
+
+    parser.errors = []
+    parser.file_name = file_name
+    parser.in_error_recovery = False
+    context = parser._get_init_context(context, input_str, 0, file_name)
+
+    edits = Edits(edits)
+    cursor = ReuseCursor(tree)
+    next_token = parser._next_token
+    parser.reused_nodes = 0
+
+    # Entry items: state, node.
+    stack = [context.state, None]
+    position = 0
+    token_ahead = None
+
+    while True:
+        state = stack[-2]
+
+        if token_ahead is None:
+            context.state = state
+            context.position = position
+            parser._skipws(context)
+            position = context.position
+            layout_ahead = context.layout_content_ahead
+            token_ahead = next_token(context)
+
+        actions = state.actions_by_id[token_ahead.symbol.term_id]
+
+        if not actions:
+            context.token_ahead = token_ahead
+            raise parser._create_error(
+                context, list(state.actions),
+                parser._get_all_possible_tokens_ahead(context),
+                symbols_before=[state.symbol])
+
+        act = actions[0]
+
+        if act.action is SHIFT:
+            old_position = edits.old_position(position)
+            node = None
+            if old_position is not None:
+                node = cursor.reusable(state, old_position, token_ahead,
+                                       edits)
+            if node is not None:
+                if position != node.start_position:
+                    _move(node, position - node.start_position)
+                if node.layout_content != layout_ahead:
+                    _set_layout(node, layout_ahead)
+                stack.append(state.gotos_by_id[node.symbol.nonterm_id])
+                parser.reused_nodes += 1
+            else:
+                node = NodeTerm(position, position + token_ahead.length,
+                                token_ahead, layout_ahead)
+                node.state = state
+                stack.append(act.state)
+            stack.append(node)
+            position = node.end_position
+            token_ahead = None
+
+        elif act.action is REDUCE:
+            production = act.prod
+            # If this is EMPTY reduction try to take another if exists.
+            if not production.rhs and len(actions) > 1:
+                production = actions[1].prod
+            r_length = len(production.rhs)
+            if r_length:
+                children = stack[-2 * r_length + 1::2]
+                del stack[-2 * r_length:]
+                node = NodeNonTerm(children[0].start_position,
+                                   children[-1].end_position, production,
+                                   children, children[0].layout_content)
+            else:
+                end_position = stack[-1].end_position \
+                    if stack[-1] is not None else 0
+                node = NodeNonTerm(end_position, end_position, production,
+                                   [], '')
+            node.state = stack[-2]
+            stack.append(stack[-2].gotos_by_id[production.symbol.nonterm_id])
+            stack.append(node)
+
+        elif act.action is ACCEPT:
+            assert len(stack) == 4
+            parser.prescanned = None
+            return stack[3]
+
+
+class Edits(object):
+    """
+    Maps positions in the new input to the previous input and checks if the
+    regions of the previous input are touched by the edits.
+
+    Attributes:
+    starts, ends(list): Start and end positions of the edits in the previous
+        input.
+    new_starts, new_ends(list): Start and end positions of the edits in the
+        new input.
+    """
+    __slots__ = ['starts', 'ends', 'new_starts', 'new_ends']
+
+    def __init__(self, edits):
+        self.starts = []
+        self.ends = []
+        self.new_starts = []
+        self.new_ends = []
+        delta = 0
+        for start, end, new_text in sorted(edits, key=lambda e: e[:2]):
+            if self.ends and start < self.ends[-1]:
+                raise ValueError('Edits must not overlap.')
+            self.starts.append(start)
+            self.ends.append(end)
+            self.new_starts.append(start + delta)
+            delta += len(new_text) - (end - start)
+            self.new_ends.append(end + delta)
+
+    def old_position(self, position):
+        """
+        Returns the position in the previous input for the given position in
+        the new input or None if the position is in the new text.
+        """
+        idx = bisect_right(self.new_ends, position)
+        if idx < len(self.new_starts) \
+                and self.new_starts[idx] <= position:
+            return None
+        if idx:
+            return position - self.new_ends[idx - 1] + self.ends[idx - 1]
+        return position
+
+    def touched(self, start, end):
+        """
+        Checks if the region of the previous input is touched by an edit.
+        Text inserted right before the region doesn't touch it but text
+        inserted right after does as it may extend the last token.
+        """
+        idx = bisect_right(self.ends, start)
+        return idx < len(self.starts) and self.starts[idx] <= end
+
+
+class ReuseCursor(object):
+    """
+    Walks the previous tree in input order finding subtrees which may be
+    reused. As the parser position only grows the cursor only moves forward
+    and visits only the nodes on the way to the reused subtrees.
+
+    Attributes:
+    path(list): `[nodes, index, leaf]` entries from the root of the tree to
+        the current node. `leaf` is the terminal node following the nodes of
+        the entry (i.e. their parent) or None. It is found when the parent is
+        entered so the terminal following any node on the path is found
+        without climbing the path.
+    """
+    __slots__ = ['path']
+
+    def __init__(self, tree):
+        self.path = [[[tree], 0, None]]
+
+    def node_at(self, position):
+        """
+        Returns the outermost non-empty node starting at the given position
+        of the previous input or None if no node starts there. Nodes which
+        end before the position are skipped and nodes which span it are
+        entered.
+        """
+        path = self.path
+        while path:
+            entry = path[-1]
+            nodes, idx, _ = entry
+            if idx == len(nodes):
+                path.pop()
+                if path:
+                    path[-1][1] += 1
+                continue
+            node = nodes[idx]
+            if node.end_position <= position:
+                entry[1] += 1
+            elif node.start_position < position:
+                if type(node) is NodeNonTerm:
+                    self._enter(node)
+                else:
+                    entry[1] += 1
+            elif node.start_position == position:
+                return node
+            else:
+                return None
+        return None
+
+    def reusable(self, state, position, token, edits):
+        """
+        Returns the outermost non-terminal node starting at the given
+        position of the previous input which may be shifted in the given
+        state with the given token ahead. The cursor is moved past the
+        returned node.
+        """
+        node = self.node_at(position)
+        if type(node) is not NodeNonTerm:
+            return None
+        # All non-empty nodes starting at the position have the same first
+        # token.
+        leaf = _first_leaf(node)
+        if leaf.symbol is not token.symbol \
+                or leaf.end_position - leaf.start_position != token.length:
+            return None
+        while type(node) is NodeNonTerm:
+            if node.state is state:
+                next_leaf = self.leaf_after()
+                end = next_leaf.end_position \
+                    if next_leaf is not None else float('inf')
+                if not edits.touched(node.start_position, end):
+                    self.path[-1][1] += 1
+                    return node
+            self._enter(node)
+            node = self.node_at(position)
+        return None
+
+    def leaf_after(self):
+        """
+        Returns the terminal node following the current node or None.
+        """
+        nodes, idx, leaf = self.path[-1]
+        for idx in range(idx + 1, len(nodes)):
+            first = _first_leaf(nodes[idx])
+            if first is not None:
+                return first
+        return leaf
+
+    def _enter(self, node):
+        """
+        Moves the cursor to the first child of the current node.
+        """
+        self.path.append([node.children, 0, self.leaf_after()])
+
+
+def _first_leaf(node):
+    """
+    Returns the first terminal node of the subtree or None if the subtree is
+    empty.
+    """
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if type(node) is NodeTerm:
+            return node
+        nodes.extend(reversed(node.children))
+    return None
+
+
+def _move(node, delta):
+    """
+    Shifts positions of the non-terminal node. Positions of its descendants
+    are shifted when its children are accessed.
+    """
+    node.start_position += delta
+    node.end_position += delta
+    node._delta += delta
+
+
+def _set_layout(node, layout):
+    """
+    Sets the layout preceding the subtree. Nodes take the layout of their
+    first child.
+    """
+    path = []
+    while type(node) is NodeNonTerm and node.children:
+        path.append(node)
+        node = node.children[0]
+    if type(node) is NodeTerm:
+        node.layout_content = layout
+    for node in reversed(path):
+        node.layout_content = node.children[0].layout_content
@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""
+Observers of parsing events given to parsers by the `observers` parameter.
+"""
+from __future__ import unicode_literals, print_function
+import codecs
+from .common import position_context, replace_newlines as _
+from .exceptions import ParseError
+from .export import dot_escape
+from .tables import SHIFT, REDUCE
+from .termui import prints, h_print, a_print
+
+
+class ParseObserver(object):
+    """
+    Base class for observers of parsing events. Only the hooks overridden by
+    an observer are installed in the parser so events nobody observes cost
+    nothing. All hooks get the context of the event whose `parser` is the
+    parse session.
+
+    `GLRParser` also reports the changes of its graph-structured stack by the
+    `on_heads`, `on_link`, `on_kill`, `on_accept` and `on_drop` hooks.
+    """
+
+    def on_start(self, context):
+        """
+        Called when parsing starts with the initial context.
+        """
+
+    def on_tokens(self, context, tokens):
+        """
+        Called with the tokens recognized ahead in the given context.
+        """
+
+    def on_lexical_disambiguation(self, context, tokens, result):
+        """
+        Called with the tokens matched at the same position and the tokens
+        left by lexical disambiguation.
+        """
+
+    def on_dynamic_filter(self, context, action, subresults, accepted):
+        """
+        Called after the dynamic filter is called for the given action
+        (`SHIFT`, `REDUCE` or None when the filter is initialized at the
+        start of parsing) with the filter result.
+        """
+
+    def on_shift(self, context, result):
+        """
+        Called after the shift of `context.token` with the result of the
+        shift action.
+        """
+
+    def on_reduce(self, context, subresults, result):
+        """
+        Called after the reduction by `context.production` with the results
+        of the reduced symbols and the result of the reduce action.
+        """
+
+    def on_error(self, context, error):
+        """
+        Called with a parse error found in the given context.
+        """
+
+    def on_end(self, context):
+        """
+        Called with the initial context when parsing ends, successfully or
+        with an error.
+        """
+
+    def on_heads(self, action, heads):
+        """
+        Called with the active GLR heads before they are reduced (`action` is
+        `REDUCE`) or shifted (`SHIFT`).
+        """
+
+    def on_link(self, head, old_head, root_head, created):
+        """
+        Called when `head` is linked to `root_head` by the shift or reduction
+        done from `old_head`. `created` is False if the head already existed
+        and the link is added to it.
+        """
+
+    def on_kill(self, head):
+        """
+        Called when a GLR head can't continue.
+        """
+
+    def on_accept(self, head):
+        """
+        Called when a GLR head accepts the input.
+        """
+
+    def on_drop(self, head, parent):
+        """
+        Called when the link from `head` to `parent` is dropped in favour of
+        less empty links.
+        """
+
+
+def hooks(observers, name):
+    """
+    Returns the bound hooks of the given name of the observers which override
+    it.
+    """
+    default = getattr(ParseObserver, name)
+    return [getattr(observer, name) for observer in observers
+            if getattr(type(observer), name, default) is not default]
+
+
+def notifier(hooks):
+    """
+    Returns a function calling all the given hooks with its arguments.
+    """
+    def notify(*args):
+        for hook in hooks:
+            hook(*args)
+    return notify
+
+
+def observe(parser, observers, loop='_parse'):
+    """
+    Replaces the methods and reducers of the given parse session with wrappers
+    which call the hooks of the given observers. Only the session is changed
+    and only the methods whose events are observed, so the parse loops don't
+    check for observers.
+
+    Args:
+    loop(str): The name of the method which runs the parse loop and ends
+        parsing.
+    """
+    on_start = hooks(observers, 'on_start')
+    on_end = hooks(observers, 'on_end')
+    if on_start or on_end:
+        get_init_context = parser._get_init_context
+        started = []
+
+        def init_context(*args):
+            context = get_init_context(*args)
+            started.append(context)
+            for hook in on_start:
+                hook(context)
+            return context
+        parser._get_init_context = init_context
+
+    on_error = hooks(observers, 'on_error')
+    if on_end or on_error:
+        parse_loop = getattr(parser, loop)
+
+        def parse(*args, **kwargs):
+            try:
+                result = parse_loop(*args, **kwargs)
+            except ParseError as error:
+                # Errors raised without being reported, e.g. by the GLR
+                # parser when all heads are killed.
+                if error not in parser.errors:
+                    for hook in on_error:
+                        hook(parser.context, error)
+                for hook in on_end:
+                    hook(started[-1] if started else None)
+                raise
+            for hook in on_end:
+                hook(started[-1] if started else None)
+            return result
+        setattr(parser, loop, parse)
+
+    if on_error:
+        create_error = parser._create_error
+
+        def report_error(context, *args, **kwargs):
+            error = create_error(context, *args, **kwargs)
+            for hook in on_error:
+                hook(context, error)
+            return error
+        parser._create_error = report_error
+
+    on_tokens = hooks(observers, 'on_tokens')
+    if on_tokens:
+        next_tokens = parser._next_tokens
+
+        def observed_next_tokens(context):
+            tokens = next_tokens(context)
+            for hook in on_tokens:
+                hook(context, tokens)
+            return tokens
+        parser._next_tokens = observed_next_tokens
+
+    on_lexical_disambiguation = hooks(observers, 'on_lexical_disambiguation')
+    if on_lexical_disambiguation:
+        lexical_disambiguation = parser._lexical_disambiguation
+
+        def observed_lexical_disambiguation(context, tokens):
+            result = lexical_disambiguation(context, tokens)
+            for hook in on_lexical_disambiguation:
+                hook(context, tokens, result)
+            return result
+        parser._lexical_disambiguation = observed_lexical_disambiguation
+
+    on_dynamic_filter = hooks(observers, 'on_dynamic_filter')
+    if on_dynamic_filter and parser.dynamic_filter:
+        dynamic_filter = parser.dynamic_filter
+
+        def observed_dynamic_filter(context, action, subresults):
+            accepted = dynamic_filter(context, action, subresults)
+            for hook in on_dynamic_filter:
+                hook(context, action, subresults, accepted)
+            return accepted
+        parser.dynamic_filter = observed_dynamic_filter
+
+    on_shift = hooks(observers, 'on_shift')
+    if on_shift:
+        call_shift_action = parser._call_shift_action
+
+        def shift_action(context):
+            result = call_shift_action(context)
+            for hook in on_shift:
+                hook(context, result)
+            return result
+        parser._call_shift_action = shift_action
+
+    on_reduce = hooks(observers, 'on_reduce')
+    if on_reduce:
+        parser._reducers = [_observed_reducer(reducer, on_reduce)
+                            for reducer in parser._reducers]
+
+
+def _observed_reducer(reducer, on_reduce):
+
+    def reduce_observed(context, subresults):
+        if reducer is None:
+            result = subresults[0] if len(subresults) == 1 else subresults
+        else:
+            result = reducer(context, subresults)
+        for hook in on_reduce:
+            hook(context, subresults, result)
+        return result
+    return reduce_observed
+
+
+class DebugObserver(ParseObserver):
+    """
+    Prints the debug output of parsers created with `debug=True`.
+
+    Attributes:
+    colors(bool): If the output may be styled, given by `debug_colors` of
+        the parser.
+    """
+
+    def __init__(self, colors=False):
+        self.colors = colors
+
+    def on_start(self, context):
+        self.step = 0
+        a_print("*** PARSING STARTED", new_line=True)
+
+    def on_tokens(self, context, tokens):
+        h_print("Current state:", str(context.state.state_id),
+                new_line=True)
+        h_print("Position:",
+                context.line_index.line_col(context.position), level=1)
+        h_print("Context:", _(position_context(context)), level=1)
+        layout_content = context.layout_content_ahead
+        if layout_content:
+            h_print("Layout content:", "'{}'".format(_(layout_content)),
+                    level=1)
+        h_print("Tokens expected:",
+                [s.name for s in context.state.actions], level=1)
+        h_print("Token(s) ahead:", _(str(tokens)), level=1)
+
+    def on_shift(self, context, result):
+        self.step += 1
+        a_print("{}. SHIFT".format(self.step),
+                _("\"{}\" to state {} at position {}".format(
+                    context.token.value, context.state.state_id,
+                    context.line_index.line_col(context.start_position))),
+                level=1)
+        self._result(result)
+
+    def on_reduce(self, context, subresults, result):
+        self.step += 1
+        a_print("{}. REDUCE".format(self.step),
+                "by prod '{}' to state {}".format(context.production,
+                                                  context.state.state_id),
+                level=1)
+        self._result(result)
+
+    def _result(self, result):
+        h_print("Action result =",
+                "type:{} value:{}".format(type(result), repr(result)),
+                level=1)
+
+    def on_lexical_disambiguation(self, context, tokens, result):
+        if len(tokens) > 1:
+            h_print("Lexical disambiguation.",
+                    " Tokens: {}".format(tokens), level=1)
+            h_print("Tokens left:", result, level=1)
+
+    def on_dynamic_filter(self, context, action, subresults, accepted):
+        if action is None:
+            prints("\tInitializing dynamic disambiguation.")
+            return
+        h_print("Calling filter for action:",
+                " {}, token={}{}{}"
+                .format(
+                    "SHIFT" if action is SHIFT else "REDUCE",
+                    context.token,
+                    ", prod={}".format(context.production)
+                    if action is REDUCE else "",
+                    ", subresults={}".format(subresults)
+                    if action is REDUCE else ""), level=2)
+        a_print("Action accepted." if accepted else "Action rejected.",
+                level=2)
+
+    def on_error(self, context, error):
+        a_print("Error: ", error, level=1)
+        h_print("Tokens expected:", error.symbols_expected, level=1)
+        h_print("Tokens found:", error.tokens_ahead, level=1)
+
+    def on_end(self, context):
+        a_print("*** PARSING FINISHED", new_line=True)
+
+    def on_heads(self, action, heads):
+        a_print("**{} HEADS".format("SHIFTING" if action is SHIFT
+                                    else "REDUCING"), new_line=True)
+        h_print("Active heads = ", len(heads))
+        for head in heads:
+            prints("\t{}".format(head))
+        h_print("Number of trees = ", sum([h.number_of_trees for h in heads]))
+
+    def on_link(self, head, old_head, root_head, created):
+        if created:
+            a_print("New head ", head, level=1)
+        else:
+            h_print("Merging to head ", head, level=1)
+        h_print("from head:", old_head, level=2)
+        h_print("linked to head:", root_head, level=2)
+
+    def on_kill(self, head):
+        a_print("Killing head: ", head, level=1)
+
+    def on_accept(self, head):
+        a_print("SUCCESS!!!", head, level=1)
+
+    def on_drop(self, head, parent):
+        h_print("Dropping link of more empty head", head, level=1)
+        h_print("to head:", parent, level=2)
+
+
+class DotTraceObserver(ParseObserver):
+    """
+    Writes the trace of the graph-structured stack of `GLRParser` created
+    with `debug=True` and `debug_trace=True` to a dot file named after the
+    parsed file (`<file_name>_trace.dot`, or `parglare_trace.dot`).
+    """
+
+    def on_start(self, context):
+        self.step = 0
+        self.trace = []
+        self.heads = set()
+
+    def _head(self, head):
+        key = head.key
+        if key not in self.heads:
+            self.heads.add(key)
+            state = head.context.state
+            self.trace.append('{} [label="{}:{}"];\n'.format(
+                key, state.state_id, dot_escape(state.symbol.name)))
+        return key
+
+    def _step(self, from_key, to_key, label, style=None):
+        self.step += 1
+        self.trace.append('{} -> {} [label="{}. {}" {}];\n'.format(
+            from_key, to_key, self.step, label,
+            style or TRACE_DOT_STEP_STYLE))
+
+    def on_link(self, head, old_head, root_head, created):
+        context = head.context
+        if context.production is None:
+            label = "S:{}({})".format(dot_escape(context.token.symbol.name),
+                                      dot_escape(context.token.value))
+        else:
+            label = "R:{}".format(dot_escape(context.production))
+        key = self._head(head)
+        self._step(self._head(old_head), key, label)
+        self.trace.append('{} -> {};\n'.format(key, self._head(root_head)))
+
+    def on_kill(self, head):
+        key = self._head(head)
+        self.trace.append(
+            '{}_killed [shape="diamond" fillcolor="red" label="killed"];\n'
+            .format(key))
+        self._step(key, '{}_killed'.format(key), '')
+
+    def on_accept(self, head):
+        self._step(self._head(head), 'success', '')
+
+    def on_drop(self, head, parent):
+        self.trace.append('{} -> {} [label="drop empty" {}];\n'.format(
+            self._head(head), self._head(parent), TRACE_DOT_DROP_STYLE))
+
+    def on_end(self, context):
+        file_name = "{}_trace.dot".format(context.file_name) \
+                    if context.file_name else "parglare_trace.dot"
+        with codecs.open(file_name, 'w', encoding="utf-8") as f:
+            f.write(DOT_HEADER)
+            f.write(''.join(self.trace))
+            f.write("}\n")
+
+        prints("Generated file {}.".format(file_name))
+        prints("You can use dot viewer or generate pdf with the "
+               "following command:")
+        h_print("dot -Tpdf {0} -O {0}.pdf".format(file_name))
+
+
+DOT_HEADER = """
+    digraph parglare_trace {
+    rankdir=LR
+    fontname = "Bitstream Vera Sans"
+    fontsize = 8
+    node[
+        style=filled,
+        fillcolor=aliceblue
+    ]
+    nodesep = 0.3
+    edge[dir=black,arrowtail=empty]
+
+"""
+
+TRACE_DOT_STEP_STYLE = 'color="red" style="dashed"'
+TRACE_DOT_DROP_STYLE = 'color="orange" style="dotted"'
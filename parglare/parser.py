@@ -1,18 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
 import codecs
+import inspect
 import logging
+import re
 import sys
 from copy import copy
-from .grammar import EMPTY, EOF, STOP
+from itertools import chain
+from .grammar import EMPTY, EOF, STOP, RegExRecognizer
 from .tables import LALR, SLR, SHIFT, REDUCE, ACCEPT
 from .exceptions import ParseError, ParserInitError, DisambiguationError, \
-    DynamicDisambiguationConflict, SRConflicts, RRConflicts, \
-    expected_symbols_str
-from .common import Location, position_context
-from .actions import pass_none
+    DynamicDisambiguationConflict, SRConflicts, RRConflicts
+from .common import Location, LineIndex
+from .actions import pass_none, pass_single, obj
 from .termui import prints, h_print, a_print
-from parglare import termui
 
 if sys.version < '3':
     text = unicode  # NOQA
@@ -27,6 +28,9 @@ class Parser(object):
     """Parser works like a DFA driven by LR tables. For a given grammar LR table
     will be created and cached or loaded from cache if cache is found.
     """
+    # Results of the last parse kept as parser attributes.
+    _published_attrs = ('errors', 'last_checkpoint', 'reused_nodes', 'stats')
+
     def __init__(self, grammar, in_layout=False, actions=None,
                  layout_actions=None, debug=False, debug_trace=False,
                  debug_colors=False, debug_layout=False, ws='\n\r\t ',
@@ -35,23 +39,44 @@ class Parser(object):
                  prefer_shifts=None, prefer_shifts_over_empty=None,
                  error_recovery=False, dynamic_filter=None,
                  custom_token_recognition=None, lexical_disambiguation=True,
-                 force_load_table=False, table=None):
+                 force_load_table=False, table=None, combined_scanner=False,
+                 prescan=False, lazy_context=None, checkpoints=None,
+                 bypass_unit_chains=False, collect_stats=False,
+                 observers=None):
+        # Arguments for creating the same parser in worker processes.
+        init_args = dict(locals())
+        del init_args['self'], init_args['grammar'], init_args['table']
+        self._init_args = init_args
+
         self.grammar = grammar
         self.in_layout = in_layout
 
-        EMPTY.action = pass_none
-        EOF.action = pass_none
         if actions:
             self.grammar._resolve_actions(action_overrides=actions,
                                           fail_on_no_resolve=True)
+        # Shift actions by terminal ids. EMPTY and EOF are shared by all
+        # grammars so, unless actions are given, their actions resolved by
+        # other parsers are not used.
+        self._shift_actions = [None] * len(grammar.terminals)
+        for terminal in grammar.terminals.values():
+            self._shift_actions[terminal.term_id] = terminal.action
+        if not actions:
+            self._shift_actions[EMPTY_ID] = pass_none
+            self._shift_actions[EOF_ID] = pass_none
 
         self.layout_parser = None
+        self.layout_regex = None
         if self.in_layout:
             start_production = grammar.get_production_id('LAYOUT')
         else:
             start_production = 1
             layout_symbol = grammar.get_symbol('LAYOUT')
             if layout_symbol:
+                if not layout_actions and not debug_layout:
+                    from .scanner import layout_regex
+                    self.layout_regex = layout_regex(layout_symbol)
+                # Layout parser is used if layout can't be matched by a regex,
+                # for non-textual input and for error reporting.
                 self.layout_parser = Parser(
                     grammar,
                     in_layout=True,
@@ -59,18 +84,29 @@ class Parser(object):
                     ws=None, return_position=True,
                     prefer_shifts=True,
                     prefer_shifts_over_empty=True,
-                    debug=debug_layout)
+                    debug=debug_layout,
+                    combined_scanner=combined_scanner,
+                    lazy_context=lazy_context)
 
         self.ws = ws
+        self.ws_regex = None
+        if ws and type(ws) is text:
+            self.ws_regex = re.compile(
+                '[{}]*'.format(''.join(re.escape(c) for c in ws)))
         self.return_position = return_position
         self.debug = debug
         self.debug_trace = debug_trace
         self.debug_colors = debug_colors
-        termui.colors = debug_colors
         self.debug_layout = debug_layout
+        # Debug output is printed by observers.
+        self.observers = list(observers or [])
+        if debug:
+            self.observers.extend(self._debug_observers())
 
         self.build_tree = build_tree
-        self.call_actions_during_tree_build = call_actions_during_tree_build
+        # Tree kept in arrays by `CompactTree`.
+        self._compact = build_tree == 'compact'
+        self._call_actions_during_tree_build = call_actions_during_tree_build
 
         self.error_recovery = error_recovery
         self.dynamic_filter = dynamic_filter
@@ -113,10 +149,109 @@ class Parser(object):
                     logger.warn("Precomputed table overrides value of "
                                 "parameter %s", name)
 
+        self.prescan = prescan
+        self.prescanned = None
+
+        self.scanners = None
+        if combined_scanner:
+            from .scanner import StateScanner
+            self.scanners = {state.state_id: StateScanner(state)
+                             for state in self.table.states}
+
+        if lazy_context is None:
+            # Recognizers given the context and custom token recognition may
+            # look at the last token and production which the lazy context
+            # doesn't keep.
+            lazy_context = bool(checkpoints) or not (
+                custom_token_recognition is not None
+                or any(_needs_context(action)
+                       for action in chain(
+                           self._shift_actions,
+                           (symbol.action
+                            for symbol in grammar.nonterminals.values())))
+                or any(_recognizer_needs_context(terminal.recognizer)
+                       for terminal in grammar.terminals.values()))
+        # Features which need a context for each step use the full parse loop.
+        self.lazy_context = lazy_context and not (
+            self.observers or build_tree or error_recovery or dynamic_filter
+            or collect_stats)
+
+        self.checkpoint_symbols = None
+        self.last_checkpoint = None
+        if checkpoints:
+            if not self.lazy_context:
+                raise ParserInitError(
+                    'Checkpoints are not supported with lazy_context=False, '
+                    'debug, observers, build_tree, error_recovery, '
+                    'dynamic_filter and collect_stats.')
+            self.checkpoint_symbols = set()
+            for name in checkpoints:
+                symbol = grammar.get_nonterminal(name)
+                if symbol is None:
+                    raise ParserInitError(
+                        'Unknown checkpoint non-terminal "{}".'.format(name))
+                self.checkpoint_symbols.add(symbol)
+        self._rhs_lengths = [len(production.rhs)
+                             for production in grammar.productions]
+
+        # Unit chains change the reductions which are seen by observers and
+        # dynamic filters.
+        self.bypass_unit_chains = bypass_unit_chains and not (
+            self.observers or dynamic_filter)
+
+        # Reduce actions compiled per production (None if the production
+        # has no action) and flags if they need a context.
+        self._action_reducers = [action_reducer(production, grammar)
+                                 for production in grammar.productions]
+        self._reducers_need_context = [
+            _needs_context(_production_action(production))
+            for production in grammar.productions]
+        self._init_reducers()
+
+        # Statistics are collected by the instrumented parse sessions.
+        self.collect_stats = collect_stats
+        self.stats = None
+
         self._check_parser()
         if debug:
             self.print_debug()
 
+    @property
+    def call_actions_during_tree_build(self):
+        return self._call_actions_during_tree_build
+
+    @call_actions_during_tree_build.setter
+    def call_actions_during_tree_build(self, value):
+        self._call_actions_during_tree_build = value
+        self._init_reducers()
+
+    def _init_reducers(self):
+        """
+        Sets reducers called on reductions for the tree building mode and
+        finds unit chains which may be bypassed with these reducers.
+        """
+        if self.build_tree:
+            make_reducer = compact_reducer if self._compact \
+                else tree_reducer
+            self._reducers = [
+                make_reducer(reducer
+                             if self._call_actions_during_tree_build
+                             else None)
+                for reducer in self._action_reducers]
+        else:
+            self._reducers = self._action_reducers
+
+        self._unit_gotos = None
+        if self.bypass_unit_chains:
+            reducers = self._reducers
+            checkpoint_symbols = self.checkpoint_symbols or ()
+
+            def bypass(production):
+                # Reduction passes the single subresult up.
+                return reducers[production.prod_id] in (None, pass_single) \
+                    and production.symbol not in checkpoint_symbols
+            self._unit_gotos = self.table.unit_chain_gotos(bypass)
+
     def _check_parser(self):
         if self.table.sr_conflicts:
             self.print_debug()
@@ -160,7 +295,144 @@ class Parser(object):
             content = f.read()
         return self.parse(content, file_name=file_name, **kwargs)
 
-    def parse(self, input_str, position=0, file_name=None, context=None):
+    def parse_files(self, file_names, workers=None, ordered=False,
+                    chunk_size=None, chunk_bytes=None):
+        """
+        Parses the given files in parallel by a pool of worker processes.
+        Returns an iterator of `(file_name, result, error)` tuples yielded as
+        the files are parsed. `error` is the exception raised for the file.
+        Args:
+            file_names(iterable): File names to parse.
+            workers(int): Number of worker processes. By default the number
+                of processors.
+            ordered(bool): If True results are yielded in the order of the
+                files.
+            chunk_size(int): Maximal number of files sent to a worker at once.
+            chunk_bytes(int): Maximal size of files sent to a worker at once.
+                A file larger than this is sent alone.
+        """
+        from .batch import parse_files
+        return parse_files(self, file_names, workers=workers,
+                           ordered=ordered, chunk_size=chunk_size,
+                           chunk_bytes=chunk_bytes)
+
+    def parse_stream(self, stream, chunk_size=None, file_name=None,
+                     context=None):
+        """
+        Parses textual input read from the given file-like object. Input is
+        read in chunks on demand and consumed input is discarded so the whole
+        input is never kept in memory. Positions are absolute.
+        Args:
+            stream(file): A file-like object with `read` method.
+            chunk_size(int): Number of characters read at once.
+            file_name(str): File name used in error reporting. By default
+                taken from the `name` attribute of the stream.
+            context(Context): An object used to keep parser context info.
+        """
+        from .stream import InputWindow, DEFAULT_CHUNK_SIZE
+        self._check_stream_parsing()
+
+        if file_name is None:
+            file_name = getattr(stream, 'name', None)
+        session = self._session()
+        try:
+            return session._parse_stream(
+                InputWindow(stream, chunk_size or DEFAULT_CHUNK_SIZE),
+                file_name, context)
+        finally:
+            self._publish(session)
+
+    def _parse_stream(self, window, file_name, context):
+        self.errors = []
+        self.file_name = file_name
+        self.in_error_recovery = False
+        context = self._get_init_context(context, window.buffer, 0,
+                                         file_name)
+        self.prescanned = None
+        return self._lazy_context_parse(context, window)
+
+    def reparse(self, tree, input_str, edits, file_name=None, context=None):
+        """
+        Parses the input changed by the given edits reusing subtrees of the
+        tree built by the previous parse which are not affected by the edits.
+        Parser must be created with `build_tree=True`.
+        Args:
+            tree(NodeNonTerm): The tree of the previous input.
+            input_str(str): The new input.
+            edits(list): `(start, end, new_text)` tuples. `start` and `end`
+                are positions in the previous input.
+            file_name(str): File name if applicable. Used in error reporting.
+            context(Context): An object used to keep parser context info.
+        """
+        from .incremental import reparse
+        session = self._session()
+        try:
+            return reparse(session, tree, input_str, edits,
+                           file_name=file_name, context=context)
+        finally:
+            self._publish(session)
+
+    def start(self, file_name=None, context=None):
+        """
+        Starts push parsing. Returns a `ParseSession` whose `feed` method is
+        called with chunks of the input as they arrive and `finish` method
+        at the end of the input to get the result.
+        Args:
+            file_name(str): File name used in error reporting.
+            context(Context): An object used to keep parser context info.
+        """
+        from .stream import ParseSession
+        self._check_stream_parsing()
+        return ParseSession(self._session(), file_name, context)
+
+    def parse_async(self, source, file_name=None, context=None,
+                    chunk_size=None, steps=None, time_slice=None):
+        """
+        Parses input read from an asyncio stream. Returns a coroutine which
+        feeds a push parsing session with the chunks of the input and gives
+        the control back to the event loop after each `steps` tokens and
+        `time_slice` seconds while parsing.
+        Args:
+            source: `asyncio.StreamReader` or other object with `read`
+                coroutine, or an async iterable of chunks (text or UTF-8
+                encoded bytes).
+            file_name(str): File name used in error reporting.
+            context(Context): An object used to keep parser context info.
+            chunk_size(int): Number of characters/bytes read at once.
+            steps(int): Number of tokens parsed before giving the control
+                back to the event loop. By default 1000.
+            time_slice(float): Maximal time in seconds of parsing before
+                giving the control back to the event loop.
+        """
+        from .aio import parse_async
+        return parse_async(self.start(file_name, context), source,
+                           chunk_size=chunk_size, steps=steps,
+                           time_slice=time_slice)
+
+    def _check_stream_parsing(self):
+        if self.observers or self.build_tree or self.error_recovery \
+                or self.dynamic_filter or self.collect_stats \
+                or self.in_layout:
+            raise ParserInitError(
+                'Stream parsing is not supported with debug, observers, '
+                'build_tree, error_recovery, dynamic_filter, collect_stats '
+                'and for layout parsers.')
+
+    def _init_push(self, window, file_name, context):
+        self.errors = []
+        self.file_name = file_name
+        self.in_error_recovery = False
+        context = self._get_init_context(context, window.buffer, 0,
+                                         file_name)
+        self.prescanned = None
+        return context, []
+
+    def _resume_push(self, state, window):
+        context, stack = state
+        return self._lazy_context_parse(context, window, stack)
+
+    def parse(self, input_str, position=0, file_name=None, context=None,
+              resume_from=None):
         """
         Parses the given input string.
         Args:
@@ -168,15 +440,75 @@ class Parser(object):
             position(int): Position to start from.
             file_name(str): File name if applicable. Used in error reporting.
             context(Context): An object used to keep parser context info.
+            resume_from(Checkpoint): A checkpoint of the previous parse of
+                the beginning of the input to continue from.
         """
+        session = self._session()
+        try:
+            return session._parse(input_str, position, file_name, context,
+                                  resume_from)
+        finally:
+            self._publish(session)
+
+    def _session(self):
+        """
+        Returns a shallow copy of this parser used for a single parse. The
+        state of the parse is kept in the copy so this parser is not changed
+        by parsing and may be shared between threads. Tables, scanners and
+        other objects built at construction are shared.
+        """
+        session = object.__new__(type(self))
+        session.__dict__.update(self.__dict__)
+        if self.layout_parser is not None:
+            session.layout_parser = self.layout_parser._session()
+        if self.observers:
+            session._observe()
+        if self.collect_stats:
+            session._instrument()
+        return session
+
+    def _debug_observers(self):
+        """
+        Returns observers printing the debug output.
+        """
+        from .observers import DebugObserver
+        return [DebugObserver(colors=self.debug_colors)]
 
-        if self.debug:
-            a_print("*** PARSING STARTED", new_line=True)
+    def _observe(self):
+        """
+        Makes this parse session call the hooks of the observers.
+        """
+        from .observers import observe
+        observe(self, self.observers)
+
+    def _instrument(self):
+        """
+        Makes this parse session collect statistics of the parse in the
+        `stats` attribute.
+        """
+        from .stats import ParseStats, instrument
+        self.stats = ParseStats()
+        instrument(self, self.stats,
+                   stack_depth=lambda: len(self.state_stack) + 1)
+
+    def _publish(self, session):
+        """
+        Makes the results of the last parse (e.g. `errors`) available as
+        attributes of this parser. This is not thread-safe: when the parser
+        is shared between threads the attributes are set by the parse which
+        finished last and a thread may see results of another one, so they
+        should be taken from `context.parser`, which is the session.
+        """
+        for name in self._published_attrs:
+            if name in session.__dict__:
+                self.__dict__[name] = session.__dict__[name]
+
+    def _parse(self, input_str, position=0, file_name=None, context=None,
+               resume_from=None):
 
         self.errors = []
 
         next_token = self._next_token
-        debug = self.debug
         self.file_name = file_name
         self.in_error_recovery = False
 
@@ -184,33 +516,39 @@ class Parser(object):
                                          file_name)
         assert isinstance(context, Context)
 
+        self.last_checkpoint = resume_from
+        if resume_from is not None:
+            if not self.lazy_context:
+                raise ParserInitError(
+                    'Parsing can be resumed only by the lazy context parse '
+                    'loop.')
+            return self._lazy_context_parse(context,
+                                            stack=resume_from.restore(self))
+
+        if self.lazy_context:
+            return self._lazy_context_parse(context)
+
         self._init_dynamic_disambiguation(context)
         self.state_stack = state_stack = [StackNode(context, None)]
+        rhs_lengths = self._rhs_lengths
+        reducers = self._reducers
+        unit_gotos = self._unit_gotos
+        # LR states are kept in the nodes for incremental reparsing.
+        node_states = self.build_tree and not self._compact
+        if self._compact:
+            from .compact import CompactTree
+            self._tree = CompactTree(self.grammar, input_str)
 
         while True:
             cur_state = state_stack[-1].context.state
-            if debug:
-                a_print("Current state:", str(cur_state.state_id),
-                        new_line=True)
 
             if context.token_ahead is None:
                 if not self.in_layout:
                     self._skipws(context)
-                    if self.debug:
-                        h_print("Layout content:",
-                                "'{}'".format(context.layout_content),
-                                level=1)
-
                 context.token_ahead = next_token(context)
 
-            if debug:
-                h_print("Context:", position_context(context), level=1)
-                h_print("Tokens expected:",
-                        expected_symbols_str(cur_state.actions.keys()),
-                        level=1)
-                h_print("Token ahead:", context.token_ahead, level=1)
-
-            actions = cur_state.actions.get(context.token_ahead.symbol)
+            actions = cur_state.actions_by_id[
+                context.token_ahead.symbol.term_id]
 
             if not actions:
 
@@ -253,18 +591,8 @@ class Parser(object):
 
             if act.action is SHIFT:
                 cur_state = act.state
-
-                if debug:
-                    a_print("Shift:",
-                            "{} \"{}\""
-                            .format(cur_state.state_id,
-                                    context.token_ahead.value)
-                            + " at position " +
-                            str(pos_to_line_col(context.input_str,
-                                                context.position)), level=1)
-
                 new_position = context.position \
-                    + len(context.token_ahead.value)
+                    + context.token_ahead.length
                 context = Context(
                     state=act.state,
                     start_position=context.position,
@@ -275,6 +603,8 @@ class Parser(object):
                     context=context)
 
                 result = self._call_shift_action(context)
+                if node_states:
+                    result.state = state_stack[-1].context.state
                 state_stack.append(StackNode(context, result))
 
                 self.in_error_recovery = False
@@ -286,19 +616,14 @@ class Parser(object):
                     if len(actions) > 1:
                         act = actions[1]
                 context.production = production = act.prod
-
-                if debug:
-                    a_print("Reducing", "by prod '{}'.".format(production),
-                            level=1)
-
-                r_length = len(production.rhs)
+                r_length = rhs_lengths[production.prod_id]
                 top_stack_context = state_stack[-1].context
                 if r_length:
                     start_reduction_context = state_stack[-r_length].context
                     subresults = [x.result for x in state_stack[-r_length:]]
                     del state_stack[-r_length:]
-                    cur_state = state_stack[-1].context.state.gotos[
-                        production.symbol]
+                    cur_state = state_stack[-1].context.state.gotos_by_id[
+                        production.symbol.nonterm_id]
                     context = Context(
                         state=cur_state,
                         start_position=start_reduction_context.start_position,
@@ -311,7 +636,8 @@ class Parser(object):
                         context=context)
                 else:
                     subresults = []
-                    cur_state = cur_state.gotos[production.symbol]
+                    cur_state = cur_state.gotos_by_id[
+                        production.symbol.nonterm_id]
                     context = Context(
                         state=cur_state,
                         start_position=context.end_position,
@@ -323,25 +649,248 @@ class Parser(object):
                         layout_content_ahead=top_stack_context.layout_content_ahead,  # noqa
                         context=context)
 
+                if unit_gotos is not None:
+                    chains = unit_gotos[state_stack[-1].context.state.state_id]
+                    if chains is not None \
+                            and chains[production.symbol.nonterm_id]:
+                        context.state = cur_state = chains[
+                            production.symbol.nonterm_id].get(
+                                context.token_ahead.symbol.term_id, cur_state)
+
                 # Calling reduce action
-                result = self._call_reduce_action(context, subresults)
+                reducer = reducers[production.prod_id]
+                if reducer is None:
+                    result = subresults[0] if r_length == 1 else subresults
+                else:
+                    result = reducer(context, subresults)
+                if node_states:
+                    result.state = state_stack[-1].context.state
                 state_stack.append(StackNode(context, result))
 
             elif act.action is ACCEPT:
-                if debug:
-                    a_print("SUCCESS!!!")
                 assert len(state_stack) == 2
+                self.prescanned = None
+                result = state_stack[1].result
+                if self._compact:
+                    self._tree.root = result
+                    result = self._tree.node(result)
+                if self.return_position:
+                    return result, context.position
+                else:
+                    return result
+
+    def _lazy_context_parse(self, context, window=None, stack=None):
+        """
+        Parse loop which doesn't create a Context object in each step. LR
+        states, results, positions and layout contents are kept in a flat
+        stack (five items per entry) and the given context is updated and
+        reused for token recognition. Contexts are created only for actions
+        which need them.
+
+        If input window is given the input is read from a stream and tokens
+        are recognized by the window. The parsing is continued on the given
+        stack if it is not empty.
+        """
+        in_layout = self.in_layout
+        skipws = self._skipws
+        next_token = self._next_token
+        token_recognition = self._token_recognition
+        rhs_lengths = self._rhs_lengths
+        reducers = self._reducers
+        reducers_need_context = self._reducers_need_context
+        unit_gotos = self._unit_gotos
+        shift_actions = self._shift_actions
+        input_str = context.input_str
+        in_len = len(input_str)
+        ws_regex = None
+        if not self.layout_parser and type(input_str) is text:
+            ws_regex = self.ws_regex
+        # Special tokens and custom recognition are handled by the full token
+        # recognition.
+        scan = self.custom_token_recognition is None
+        checkpoint_symbols = self.checkpoint_symbols \
+            if window is None else None
+
+        if stack is None:
+            stack = []
+        if not stack:
+            # Entry items: state, result, start position, end position,
+            # layout.
+            stack.extend((context.state, None, context.position,
+                          context.position, context.layout_content))
+        position = stack[-2]
+        layout_ahead = context.layout_content_ahead
+        token_ahead = None
+
+        while True:
+            state = stack[-5]
+
+            if token_ahead is None:
+                context.state = state
+                context.start_position = stack[-3]
+                context.end_position = stack[-2]
+                if window is not None:
+                    position, token_ahead = window.next_token(self, context,
+                                                              position)
+                    layout_ahead = context.layout_content_ahead
+                else:
+                    if in_layout:
+                        pass
+                    elif ws_regex is not None:
+                        new_position = \
+                            ws_regex.match(input_str, position).end()
+                        if new_position > position:
+                            layout_ahead = input_str[position:new_position]
+                            position = new_position
+                        else:
+                            layout_ahead = ''
+                        context.layout_content_ahead = layout_ahead
+                    else:
+                        context.position = position
+                        skipws(context)
+                        position = context.position
+                        layout_ahead = context.layout_content_ahead
+                    context.position = position
+
+                    actions_by_id = state.actions_by_id
+                    if scan and position < in_len \
+                            and actions_by_id[STOP_ID] is None \
+                            and actions_by_id[EMPTY_ID] is None:
+                        tokens = token_recognition(context)
+                        if len(tokens) == 1:
+                            token_ahead = tokens[0]
+                        else:
+                            if self.lexical_disambiguation:
+                                tokens = self._lexical_disambiguation(
+                                    context, tokens)
+                            token_ahead = self._choose_token(context, tokens)
+                    else:
+                        token_ahead = next_token(context)
+
+            actions = state.actions_by_id[token_ahead.symbol.term_id]
+
+            if not actions:
+                context.state = state
+                context.position = position
+                context.token_ahead = token_ahead
+                if window is not None:
+                    raise window.parse_error(self, context)
+                raise self._create_error(
+                    context, list(state.actions),
+                    self._get_all_possible_tokens_ahead(context),
+                    symbols_before=[state.symbol])
+
+            act = actions[0]
+            action = act.action
+
+            if action is SHIFT:
+                new_position = position + token_ahead.length
+                sem_action = shift_actions[token_ahead.symbol.term_id]
+                if sem_action is None:
+                    result = token_ahead.value
+                elif getattr(sem_action, 'no_context', False):
+                    result = sem_action(context, token_ahead.value)
+                else:
+                    result = sem_action(
+                        Context(state=act.state,
+                                start_position=position,
+                                end_position=new_position,
+                                token=token_ahead,
+                                layout_content=layout_ahead,
+                                position=new_position,
+                                context=context),
+                        token_ahead.value)
+
+                stack.extend((act.state, result, position, new_position,
+                              layout_ahead))
+                position = new_position
+                token_ahead = None
+
+            elif action is REDUCE:
+                production = act.prod
+                r_length = rhs_lengths[production.prod_id]
+                # if this is EMPTY reduction try to take another if
+                # exists.
+                if not r_length and len(actions) > 1:
+                    production = actions[1].prod
+                    r_length = rhs_lengths[production.prod_id]
+
+                end_position = stack[-2]
+                if r_length:
+                    entries = -5 * r_length
+                    subresults = stack[entries + 1::5]
+                    start_position = stack[entries + 2]
+                    layout = stack[entries + 4]
+                    del stack[entries:]
+                else:
+                    subresults = []
+                    start_position = end_position
+                    layout = ''
+                goto = stack[-5].gotos_by_id[production.symbol.nonterm_id]
+                if unit_gotos is not None:
+                    # Reductions by bypassed unit productions which would
+                    # follow are skipped.
+                    chains = unit_gotos[stack[-5].state_id]
+                    if chains is not None \
+                            and chains[production.symbol.nonterm_id]:
+                        goto = chains[production.symbol.nonterm_id].get(
+                            token_ahead.symbol.term_id, goto)
+
+                reducer = reducers[production.prod_id]
+                if reducer is None:
+                    result = subresults[0] if r_length == 1 else subresults
+                else:
+                    if not reducers_need_context[production.prod_id]:
+                        context.production = production
+                        result = reducer(context, subresults)
+                    else:
+                        result = reducer(
+                            Context(state=goto,
+                                    start_position=start_position,
+                                    end_position=end_position,
+                                    position=position,
+                                    production=production,
+                                    token_ahead=token_ahead,
+                                    layout_content=layout,
+                                    layout_content_ahead=layout_ahead,
+                                    context=context),
+                            subresults)
+
+                stack.extend((goto, result, start_position, end_position,
+                              layout))
+
+                # Reduction is stable if the input may only grow after the
+                # token ahead.
+                if checkpoint_symbols is not None \
+                        and production.symbol in checkpoint_symbols \
+                        and position + token_ahead.length < in_len:
+                    self.last_checkpoint = Checkpoint(stack)
+
+            elif action is ACCEPT:
+                assert len(stack) == 10
+                self.prescanned = None
                 if self.return_position:
-                    return state_stack[1].result, context.position
+                    return stack[6], position
                 else:
-                    return state_stack[1].result
+                    return stack[6]
 
-    def call_actions(self, node, context=None):
+    def call_actions(self, node, context=None, visitor=None, release=False):
         """
-        Calls semantic actions for the given tree node.
+        Calls semantic actions for the given tree node and returns the
+        result. Children are processed right to left, bottom up.
+
+        The tree is traversed with an explicit stack so the depth of the tree
+        is not limited by the recursion limit. If `visitor` is given it is
+        called with each node and its result as soon as the action of the
+        node is called. If `release` is set, children of each node are
+        detached from the node after its action, so processed subtrees and
+        their results which are not kept by the visitor may be freed while
+        the traversal goes on.
         """
-        self.context = context = context if context else Context()
+        context = context if context else Context()
         context.parser = self
+        action_reducers = self._action_reducers
+        shift_actions = self._shift_actions
 
         def set_context(context, node):
             context.start_position = node.start_position
@@ -351,61 +900,50 @@ class Parser(object):
             context.token = None
             context.layout_content = node.layout_content
 
-        def inner_call_actions(node):
-            sem_action = node.symbol.action
-            if isinstance(node, NodeTerm):
-                if sem_action:
-                    set_context(context, node)
-                    result = sem_action(context, node.value)
-                else:
-                    result = node.value
-            else:
-                subresults = []
-                # Recursive right to left, bottom up. Simulate LR
-                # reductions.
-                for n in reversed(node):
-                    subresults.append(inner_call_actions(n))
+        # Nodes to visit and, for non-terminals whose children are visited,
+        # tuples of the node and the number of results before the results of
+        # the children.
+        stack = [node]
+        results = []
+        while stack:
+            node = stack.pop()
+            if type(node) is tuple:
+                node, mark = node
+                subresults = results[mark:]
+                del results[mark:]
                 subresults.reverse()
 
-                if sem_action:
+                reducer = action_reducers[node.production.prod_id]
+                if reducer is not None:
                     set_context(context, node)
                     context.production = node.production
-                    assignments = node.production.assignments
-                    if assignments:
-                        assgn_results = {}
-                        for a in assignments.values():
-                            if a.op == '=':
-                                assgn_results[a.name] = subresults[a.index]
-                            else:
-                                assgn_results[a.name] = \
-                                    bool(subresults[a.index])
-                    if type(sem_action) is list:
-                        if assignments:
-                            result = \
-                                sem_action[
-                                    node.production.prod_symbol_id](
-                                        context, subresults, **assgn_results)
-                        else:
-                            result = \
-                                sem_action[
-                                    node.production.prod_symbol_id](context,
-                                                                    subresults)
-                    else:
-                        if assignments:
-                            result = sem_action(context, subresults,
-                                                **assgn_results)
-                        else:
-                            result = sem_action(context, subresults)
+                    result = reducer(context, subresults)
                 else:
                     if len(subresults) == 1:
                         # Unpack if single subresult
                         result = subresults[0]
                     else:
                         result = subresults
+                if release and type(node) is NodeNonTerm:
+                    node.children = []
+            elif isinstance(node, NodeTerm):
+                sem_action = shift_actions[node.symbol.term_id]
+                if sem_action:
+                    set_context(context, node)
+                    result = sem_action(context, node.value)
+                else:
+                    result = node.value
+            else:
+                # Children results are collected right to left, bottom up.
+                stack.append((node, len(results)))
+                stack.extend(node.children)
+                continue
 
-            return result
+            results.append(result)
+            if visitor is not None:
+                visitor(node, result)
 
-        return inner_call_actions(node)
+        return results[0]
 
     def _get_init_context(self, context, input_str, position, file_name):
 
@@ -419,46 +957,67 @@ class Parser(object):
         context.position = context.start_position = \
             context.end_position = position
         context.layout_content = ''
+        # Lines are indexed on the first lookup, e.g. for an error location.
+        if context.line_index is None \
+                or context.line_index.input_str is not input_str:
+            context.line_index = LineIndex(input_str)
+
+        self.prescanned = None
+        if self.prescan and type(input_str) is text:
+            from .scanner import Prescan
+            self.prescanned = Prescan(input_str)
 
         return context
 
     def _skipws(self, context):
 
-        in_len = len(context.input_str)
         context.layout_content_ahead = ''
 
-        if self.layout_parser:
-            _, pos = self.layout_parser.parse(
+        layout_match = None
+        if self.layout_regex is not None \
+                and type(context.input_str) is text:
+            layout_match = self.layout_regex.match(context.input_str,
+                                                   context.position)
+
+        if layout_match is not None:
+            pos = layout_match.end()
+            if pos > context.position:
+                context.layout_content_ahead = \
+                    context.input_str[context.position:pos]
+                context.position = pos
+        elif self.layout_parser:
+            _, pos = self.layout_parser._parse(
                 context.input_str, context.position, context=copy(context))
             if pos > context.position:
                 context.layout_content_ahead = \
                     context.input_str[context.position:pos]
                 context.position = pos
         elif self.ws:
+            input_str = context.input_str
             old_pos = context.position
-            try:
-                while context.position < in_len \
-                      and context.input_str[context.position] in self.ws:
-                    context.position += 1
-            except TypeError:
-                raise ParserInitError(
-                    "For parsing non-textual content please "
-                    "set `ws` to `None`.")
+            if self.ws_regex is not None and type(input_str) is text:
+                # Skip the whole run of whitespaces in a single regex match.
+                context.position = \
+                    self.ws_regex.match(input_str, old_pos).end()
+            else:
+                ws = self.ws
+                in_len = len(input_str)
+                position = old_pos
+                try:
+                    while position < in_len and input_str[position] in ws:
+                        position += 1
+                except TypeError:
+                    raise ParserInitError(
+                        "For parsing non-textual content please "
+                        "set `ws` to `None`.")
+                context.position = position
             context.layout_content_ahead = \
-                context.input_str[old_pos:context.position]
-
-        if self.debug:
-            content = context.layout_content_ahead
-            if type(context.layout_content_ahead) is text:
-                content = content.replace("\n", "\\n")
-            h_print("Skipping whitespaces:",
-                    "'{}'".format(content), level=1)
-            h_print("New position:", pos_to_line_col(context.input_str,
-                                                     context.position),
-                    level=1)
+                input_str[old_pos:context.position]
 
     def _next_token(self, context):
-        tokens = self._next_tokens(context)
+        return self._choose_token(context, self._next_tokens(context))
+
+    def _choose_token(self, context, tokens):
         if not tokens:
             # We have to return something.
             # Returning EMPTY token is not a lie (EMPTY can always be matched)
@@ -514,9 +1073,20 @@ class Parser(object):
 
     def _token_recognition(self, context):
         input_str = context.input_str
+        if type(input_str) is text:
+            state = context.state
+            if self.scanners is not None:
+                return self.scanners[state.state_id].scan(
+                    context, input_str, context.position)
+            if state.string_index is not None \
+                    or state.first_chars is not None:
+                return self._indexed_token_recognition(context, state,
+                                                       input_str)
+
         actions = context.state.actions
         position = context.position
         finish_flags = context.state.finish_flags
+        prescanned = self.prescanned
 
         tokens = []
         last_prior = -1
@@ -524,16 +1094,83 @@ class Parser(object):
             if symbol.prior < last_prior and tokens:
                 break
             last_prior = symbol.prior
-            try:
-                tok = symbol.recognizer(input_str, position)
-            except TypeError:
-                tok = symbol.recognizer(context, input_str, position)
+            recognizer = symbol.recognizer
+            if type(recognizer) is RegExRecognizer:
+                if prescanned is not None:
+                    tok = prescanned.match(recognizer, position)
+                else:
+                    # Take just the length of the match to avoid slicing the
+                    # input.
+                    match = recognizer.regex.match(input_str, position)
+                    tok = match.end() - position if match else None
+            else:
+                try:
+                    tok = recognizer(input_str, position)
+                except TypeError:
+                    tok = recognizer(context, input_str, position)
             if tok:
-                tokens.append(Token(symbol, tok))
+                tokens.append(Token(symbol, tok, input_str=input_str,
+                                    position=position))
                 if finish_flags[idx]:
                     break
         return tokens
 
+    def _indexed_token_recognition(self, context, state, input_str):
+        """
+        Token recognition which uses state indexes. All string terminals of
+        the state are matched with a single string index lookup. Other
+        terminals are tried in order as usual but only if they may match the
+        character at the current position.
+        """
+        position = context.position
+        string_index = state.string_index
+        if string_index is None:
+            index = state.first_chars
+            candidates = index.candidates(input_str, position)
+            matched = None
+        else:
+            index = string_index.first_chars
+            if index is None:
+                index = string_index
+                candidates = string_index.others
+            else:
+                candidates = index.candidates(input_str, position)
+            matched = string_index.match(input_str, position)
+            if matched:
+                candidates = sorted(candidates + list(matched))
+
+        symbols = index.symbols
+        priority_ends = index.priority_ends
+        finish_flags = state.finish_flags
+        prescanned = self.prescanned
+        tokens = []
+        end = len(symbols)
+        for idx in candidates:
+            if idx >= end:
+                break
+            symbol = symbols[idx]
+            recognizer = symbol.recognizer
+            if matched and idx in matched:
+                tok = matched[idx]
+            elif type(recognizer) is RegExRecognizer:
+                if prescanned is not None:
+                    tok = prescanned.match(recognizer, position)
+                else:
+                    match = recognizer.regex.match(input_str, position)
+                    tok = match.end() - position if match else None
+            else:
+                try:
+                    tok = recognizer(input_str, position)
+                except TypeError:
+                    tok = recognizer(context, input_str, position)
+            if tok:
+                tokens.append(Token(symbol, tok, input_str=input_str,
+                                    position=position))
+                if finish_flags[idx]:
+                    break
+                end = priority_ends[idx]
+        return tokens
+
     def _get_all_possible_tokens_ahead(self, context):
         """
         Check what is ahead no matter the current state.
@@ -541,21 +1178,26 @@ class Parser(object):
         """
         tokens = []
         if context.position < len(context.input_str):
+            prescanned = self.prescanned
             for terminal in self.grammar.terminals.values():
-                try:
-                    tok = terminal.recognizer(context.input_str,
-                                              context.position)
-                except TypeError:
-                    tok = terminal.recognizer(context, context.input_str,
-                                              context.position)
+                recognizer = terminal.recognizer
+                if prescanned is not None \
+                        and type(recognizer) is RegExRecognizer:
+                    tok = prescanned.match(recognizer, context.position)
+                else:
+                    try:
+                        tok = recognizer(context.input_str, context.position)
+                    except TypeError:
+                        tok = recognizer(context, context.input_str,
+                                         context.position)
                 if tok:
-                    tokens.append(Token(terminal, tok))
+                    tokens.append(Token(terminal, tok,
+                                        input_str=context.input_str,
+                                        position=context.position))
         return tokens
 
     def _init_dynamic_disambiguation(self, context):
         if self.dynamic_filter:
-            if self.debug:
-                prints("\tInitializing dynamic disambiguation.")
             self.dynamic_filter(context, None, None)
 
     def _dynamic_disambiguation(self, context, actions):
@@ -584,40 +1226,17 @@ class Parser(object):
            or (action is REDUCE and not context.production.dynamic):
             return True
 
-        if self.debug:
-            h_print("Calling filter for action:",
-                    " {}, token={}{}{}"
-                    .format(
-                        "SHIFT" if action is SHIFT else "REDUCE",
-                        context.token,
-                        ", prod={}".format(context.production)
-                        if action is REDUCE else "",
-                        ", subresults={}".format(subresults)
-                        if action is REDUCE else ""), level=2)
-
-        accepted = self.dynamic_filter(context, action, subresults)
-        if self.debug:
-            if accepted:
-                a_print("Action accepted.", level=2)
-            else:
-                a_print("Action rejected.", level=2)
-
-        return accepted
+        return self.dynamic_filter(context, action, subresults)
 
     def _call_shift_action(self, context):
         """
         Calls registered shift action for the given grammar symbol.
         """
-        debug = self.debug
         token = context.token
-        sem_action = token.symbol.action
+        sem_action = self._shift_actions[token.symbol.term_id]
 
         if self.build_tree:
-            # call action for building tree node if tree building is enabled
-            if debug:
-                h_print("Building terminal node",
-                        "'{}'.".format(token.symbol.name), level=2)
-
+            # call action for building tree node if tree building is enabled.
             # If both build_tree and call_actions_during_build are set to
             # True, semantic actions will be call but their result will be
             # discarded. For more info check following issue:
@@ -625,90 +1244,25 @@ class Parser(object):
             if self.call_actions_during_tree_build and sem_action:
                 sem_action(context, token.value)
 
+            if self._compact:
+                return self._tree.add_term(context)
             return treebuild_shift_action(context)
 
         if sem_action:
             result = sem_action(context, token.value)
-
         else:
-            if debug:
-                h_print("No action defined",
-                        "for '{}'. "
-                        "Result is matched string.".format(token.symbol.name),
-                        level=1)
             result = token.value
 
-        if debug:
-            h_print("Action result = ",
-                    "type:{} value:{}"
-                    .format(type(result), repr(result)), level=1)
-
         return result
 
     def _call_reduce_action(self, context, subresults):
         """
         Calls registered reduce action for the given grammar symbol.
         """
-        debug = self.debug
-        result = None
-        bt_result = None
-        production = context.production
-
-        if self.build_tree:
-            # call action for building tree node if enabled.
-            if debug:
-                h_print("Building non-terminal node",
-                        "'{}'.".format(production.symbol.name), level=2)
-
-            bt_result = treebuild_reduce_action(context, nodes=subresults)
-            if not self.call_actions_during_tree_build:
-                return bt_result
-
-        sem_action = production.symbol.action
-        if sem_action:
-            assignments = production.assignments
-            if assignments:
-                assgn_results = {}
-                for a in assignments.values():
-                    if a.op == '=':
-                        assgn_results[a.name] = subresults[a.index]
-                    else:
-                        assgn_results[a.name] = bool(subresults[a.index])
-
-            if type(sem_action) is list:
-                if assignments:
-                    result = sem_action[production.prod_symbol_id](
-                        context, subresults, **assgn_results)
-                else:
-                    result = sem_action[production.prod_symbol_id](context,
-                                                                   subresults)
-            else:
-                if assignments:
-                    result = sem_action(context, subresults, **assgn_results)
-                else:
-                    result = sem_action(context, subresults)
-
-        else:
-            if debug:
-                h_print("No action defined",
-                        " for '{}'.".format(production.symbol.name), level=1)
-            if len(subresults) == 1:
-                if debug:
-                    h_print("Unpacking a single subresult.", level=1)
-                result = subresults[0]
-            else:
-                if debug:
-                    h_print("Result is a list of subresults.", level=1)
-                result = subresults
-
-        if debug:
-            h_print("Action result =",
-                    "type:{} value:{}"
-                    .format(type(result), repr(result)), level=1)
-
-        # If build_tree is set to True, discard the result of the semantic
-        # action, and return the result of treebuild_reduce_action.
-        return bt_result if bt_result is not None else result
+        reducer = self._reducers[context.production.prod_id]
+        if reducer is None:
+            return subresults[0] if len(subresults) == 1 else subresults
+        return reducer(context, subresults)
 
     def _lexical_disambiguation(self, context, tokens):
         """
@@ -718,10 +1272,6 @@ class Parser(object):
         tokens (list of Token)
         """
 
-        if self.debug:
-            h_print("Lexical disambiguation.",
-                    " Tokens: {}".format([x for x in tokens]), level=1)
-
         if len(tokens) <= 1:
             return tokens
 
@@ -733,20 +1283,14 @@ class Parser(object):
             tokens = [t for t in tokens if t != EOF_token]
 
         # Longest-match strategy.
-        max_len = max((len(x.value) for x in tokens))
-        tokens = [x for x in tokens if len(x.value) == max_len]
-        if self.debug:
-            h_print("Disambiguation by longest-match strategy.",
-                    "Tokens: {}".format([x for x in tokens]), level=1)
+        max_len = max((x.length for x in tokens))
+        tokens = [x for x in tokens if x.length == max_len]
         if len(tokens) == 1:
             return tokens
 
         # try to find preferred token.
         pref_tokens = [x for x in tokens if x.symbol.prefer]
         if pref_tokens:
-            if self.debug:
-                h_print("Preferring tokens {}.".format(pref_tokens),
-                        level=1)
             return pref_tokens
 
         return tokens
@@ -777,7 +1321,7 @@ class Parser(object):
             context.position = position
             if debug:
                 h_print("Advancing position to ",
-                        pos_to_line_col(context.input_str, position),
+                        context.line_index.line_col(position),
                         level=1)
 
         context.token_ahead = token
@@ -809,10 +1353,6 @@ class Parser(object):
                            symbols_expected,
                            tokens_ahead,
                            symbols_before=symbols_before)
-
-        if self.debug:
-            a_print("Error: ", error, level=1)
-
         self.errors.append(error)
 
         return error
@@ -832,6 +1372,8 @@ class Context:
              state.
         extra(anything): Used for additional state maintained by the user.
              If not given empty dict is used.
+        line_index(LineIndex): Lines of the input, shared by the contexts
+             of a parse.
     """
 
     __local = ['state',
@@ -847,7 +1389,8 @@ class Context:
     __t = ['file_name',
            'input_str',
            'parser',
-           'extra']
+           'extra',
+           'line_index']
 
     __slots__ = __local + __t
 
@@ -855,7 +1398,8 @@ class Context:
                  end_position=None, token=None, token_ahead=None,
                  production=None, layout_content=None,
                  layout_content_ahead=None, node=None, file_name=None,
-                 input_str=None, parser=None, extra=None, context=None):
+                 input_str=None, parser=None, extra=None, line_index=None,
+                 context=None):
         self.state = state
         self.position = position
         self.start_position = start_position
@@ -871,11 +1415,13 @@ class Context:
             self.file_name = context.file_name
             self.input_str = context.input_str
             self.parser = context.parser
+            self.line_index = context.line_index
         else:
             self.extra = extra if extra is not None else {}
             self.file_name = file_name
             self.input_str = input_str
             self.parser = parser
+            self.line_index = line_index
 
     @property
     def symbol(self):
@@ -895,6 +1441,43 @@ class Context:
             return str(self.production)
 
 
+class Checkpoint(object):
+    """
+    Snapshot of the parser stack taken after the reduction of a checkpoint
+    non-terminal. Parsing of the input which has the same beginning may be
+    resumed from the checkpoint.
+
+    Attributes:
+        position(int): Position in the input to continue from.
+        stack(list): Parser stack entries (LR state id, result, start
+            position, end position, layout content).
+    """
+    __slots__ = ['position', 'stack']
+
+    def __init__(self, stack=None):
+        if stack is not None:
+            self.stack = [entry.state_id if idx % 5 == 0 else entry
+                          for idx, entry in enumerate(stack)]
+            self.position = stack[-2]
+
+    def restore(self, parser):
+        """
+        Returns the parser stack with LR states of the given parser.
+        """
+        states = parser.table.states
+        return [states[entry] if idx % 5 == 0 else entry
+                for idx, entry in enumerate(self.stack)]
+
+    def __getstate__(self):
+        return self.position, self.stack
+
+    def __setstate__(self, state):
+        self.position, self.stack = state
+
+    def __repr__(self):
+        return '<Checkpoint(position={})>'.format(self.position)
+
+
 class StackNode:
     __slots__ = ['context', 'result']
 
@@ -909,14 +1492,21 @@ class StackNode:
 
 
 class Node(object):
-    """A node of the parse tree."""
+    """
+    A node of the parse tree.
 
-    __slots__ = ['start_position', 'end_position', 'layout_content']
+    The LR state the parser was in before the node, i.e. the state from which
+    the first token of the node was shifted, is kept in `state` by the LR
+    parser for incremental reparsing.
+    """
+
+    __slots__ = ['start_position', 'end_position', 'layout_content', 'state']
 
     def __init__(self, start_position, end_position, layout_content=None):
         self.start_position = start_position
         self.end_position = end_position
         self.layout_content = layout_content
+        self.state = None
 
     def __repr__(self):
         return str(self)
@@ -929,7 +1519,14 @@ class Node(object):
 
 
 class NodeNonTerm(Node):
-    __slots__ = ['production', 'children']
+    """
+    A non-terminal node of the parse tree.
+
+    When incremental reparsing moves a subtree only the positions of its root
+    are changed at once. The shift of the positions of the descendants is
+    kept in `_delta` and applied to the children when they are accessed.
+    """
+    __slots__ = ['production', '_children', '_delta']
 
     def __init__(self, start_position, end_position, production, children,
                  layout_content=None):
@@ -937,7 +1534,24 @@ class NodeNonTerm(Node):
                                           end_position,
                                           layout_content=layout_content)
         self.production = production
-        self.children = children
+        self._children = children
+        self._delta = 0
+
+    @property
+    def children(self):
+        delta = self._delta
+        if delta:
+            self._delta = 0
+            for child in self._children:
+                child.start_position += delta
+                child.end_position += delta
+                if type(child) is NodeNonTerm:
+                    child._delta += delta
+        return self._children
+
+    @children.setter
+    def children(self, children):
+        self._children = children
 
     def tree_str(self, depth=0):
         indent = '  ' * depth
@@ -1008,13 +1622,34 @@ class NodeTerm(Node):
 class Token(object):
     """
     Token or lexeme matched from the input.
+
+    Token may be created with the length of the match (e.g. returned by the
+    recognizer) instead of the matched value. In that case the value is
+    sliced from the input at the given position only when accessed.
     """
-    __slots__ = ['symbol', 'value', 'length']
+    __slots__ = ['symbol', '_value', 'length', 'input_str', 'position']
 
-    def __init__(self, symbol=None, value='', length=None):
+    def __init__(self, symbol=None, value='', length=None, input_str=None,
+                 position=None):
         self.symbol = symbol
-        self.value = value
+        if type(value) is int:
+            length = value
+            value = None
+        self._value = value
         self.length = length if length is not None else len(value)
+        self.input_str = input_str
+        self.position = position
+
+    @property
+    def value(self):
+        if self._value is None:
+            self._value = self.input_str[self.position:
+                                         self.position + self.length]
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
 
     def __repr__(self):
         return "<{}({})>".format(text(self.symbol), text(self.value))
@@ -1026,6 +1661,10 @@ class Token(object):
         return True
 
 
+STOP_ID = STOP.term_id
+EMPTY_ID = EMPTY.term_id
+EOF_ID = EOF.term_id
+
 STOP_token = Token(STOP)
 EMPTY_token = Token(EMPTY)
 EOF_token = Token(EOF)
@@ -1045,6 +1684,114 @@ def treebuild_reduce_action(context, nodes):
                            context.production, nodes, context.layout_content)
 
 
+def compact_reduce_action(context, nodes):
+    return context.parser._tree.add_nonterm(context, nodes)
+
+
+def compact_reducer(reducer=None):
+    """
+    Returns a callable which adds the node for the reduction to the compact
+    tree of the parse. The given action reducer, if any, is called before
+    with the views of the child nodes.
+    """
+    if reducer is None:
+        return compact_reduce_action
+
+    def reduce_compact(context, subresults):
+        tree = context.parser._tree
+        reducer(context, [tree.node(node) for node in subresults])
+        return tree.add_nonterm(context, subresults)
+    return reduce_compact
+
+
+def _production_action(production):
+    """
+    Returns the semantic action of the given production or None.
+    """
+    sem_action = production.symbol.action
+    if type(sem_action) is list:
+        sem_action = sem_action[production.prod_symbol_id]
+    return sem_action or None
+
+
+def action_reducer(production, grammar):
+    """
+    Returns a callable which calls the semantic action of the given
+    production with the context and the subresults, or None if the production
+    has no action. The action is resolved and the values of the named matches
+    are prepared once for each production instead of on each reduction.
+    """
+    sem_action = _production_action(production)
+    if sem_action is None:
+        return None
+    assignments = [(a.name, a.index, a.op == '=')
+                   for a in production.assignments.values()] \
+        if production.assignments else None
+    if not assignments:
+        return sem_action
+
+    if sem_action is obj and production.symbol.fqn in grammar.classes:
+        # Objects are created directly with the class of the rule.
+        cls = grammar.classes[production.symbol.fqn]
+
+        def reduce_obj(context, subresults):
+            instance = cls(**{name: subresults[index] if plain
+                              else bool(subresults[index])
+                              for name, index, plain in assignments})
+            instance._pg_start_position = context.start_position
+            instance._pg_end_position = context.end_position
+            return instance
+        return reduce_obj
+
+    def reduce_assignments(context, subresults):
+        return sem_action(context, subresults,
+                          **{name: subresults[index] if plain
+                             else bool(subresults[index])
+                             for name, index, plain in assignments})
+    return reduce_assignments
+
+
+def tree_reducer(reducer=None):
+    """
+    Returns a callable which builds the tree node for the reduction. The given
+    action reducer, if any, is called before building the node.
+    """
+    if reducer is None:
+        return treebuild_reduce_action
+
+    def reduce_tree(context, subresults):
+        reducer(context, subresults)
+        return treebuild_reduce_action(context, subresults)
+    return reduce_tree
+
+
+def _needs_context(action):
+    """
+    Returns True if the given action (or any of the actions given as a list)
+    may use its context, i.e. it is not marked with `no_context`.
+    """
+    if type(action) is list:
+        return any(_needs_context(a) for a in action)
+    return action is not None and not getattr(action, 'no_context', False)
+
+
+def _recognizer_needs_context(recognizer):
+    """
+    Returns True if the given recognizer can't be called with just the input
+    and position so the parser calls it with the context too.
+    """
+    if recognizer is None:
+        return False
+    try:
+        inspect.signature(recognizer).bind(None, None)
+    except TypeError:
+        return True
+    except ValueError:
+        # Signature is not available.
+        return True
+    return False
+
+
 def pos_to_line_col(input_str, position):
     """
     Returns position in the (line,column) form.
@@ -1057,15 +1804,6 @@ def pos_to_line_col(input_str, position):
         # If we are not parsing string
         return 1, position
 
-    line = 1
-    old_pos = 0
-    try:
-        cur_pos = input_str.index("\n")
-        while cur_pos < position:
-            line += 1
-            old_pos = cur_pos + 1
-            cur_pos = input_str.index("\n", cur_pos + 1)
-    except ValueError:
-        pass
-
-    return line, position - old_pos
+    # For many positions of the same input use `LineIndex`.
+    return input_str.count("\n", 0, position) + 1, \
+        position - input_str.rfind("\n", 0, position) - 1
@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+"""
+Scanning optimizations used by the parsers.
+"""
+from __future__ import unicode_literals
+import re
+from array import array
+from bisect import bisect_right
+from parglare.grammar import StringRecognizer, RegExRecognizer, Terminal, \
+    EMPTY, EOF, STOP
+from parglare.parser import Token
+from parglare.tables.first_chars import first_chars
+
+# Regex constructs which can't be safely embedded in a combined regex as
+# they depend on the group numbering of the original regex.
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class StateScanner(object):
+    """
+    Recognizes tokens for a single LR state using combined regular
+    expressions.
+
+    String and regex terminals expected in the state are combined into
+    alternation regexes following the order of state actions so that a single
+    match call finds the first terminal, in priority order, that matches at
+    the current position. Scanning then resumes after the matched terminal
+    only if its finish flag is not set and only up to the next lower priority.
+    This gives the same tokens as `Parser._token_recognition` but with all
+    non-matching terminals skipped in C. Terminals with custom recognizers (or
+    regexes that can't be combined) are called only if they are reached.
+
+    Attributes:
+    flags(int): Regex flags of the combined regexes.
+    entries(list): A list of (symbol, finish_flag, recognizer, pattern) in
+        the order of state actions. Either `recognizer` (for terminals that
+        must be called) or `pattern` (for combined terminals) is set. Both are
+        `None` for special terminals (EMPTY, EOF, STOP) which are handled by
+        the parser.
+    priority_ends(list): For each entry, the index of the first following
+        entry with a lower priority than its predecessor. This is where
+        scanning stops once a token is found.
+    """
+    __slots__ = ['flags', 'entries', 'priority_ends', '_segments']
+
+    def __init__(self, state):
+        self.entries = []
+        self._segments = {}
+
+        # The combined regexes use the flags of the first regex terminal.
+        # Terminals which need different flags are not combined.
+        self.flags = flags = next((s.recognizer.re_flags
+                                   for s in state.actions
+                                   if type(s.recognizer) is RegExRecognizer),
+                                  re.MULTILINE)
+
+        for symbol, finish in zip(state.actions, state.finish_flags):
+            recognizer = symbol.recognizer
+            pattern = None
+            if symbol in (EMPTY, EOF, STOP):
+                recognizer = None
+            elif type(recognizer) is RegExRecognizer:
+                if _can_combine(recognizer, flags):
+                    pattern = recognizer._regex
+            elif type(recognizer) is StringRecognizer \
+                    and not recognizer.ignore_case \
+                    and not flags & re.IGNORECASE:
+                pattern = re.escape(recognizer.value)
+            if pattern is not None:
+                recognizer = None
+            self.entries.append((symbol, finish, recognizer, pattern))
+
+        entries_len = len(self.entries)
+        self.priority_ends = [entries_len] * entries_len
+        end = entries_len
+        for idx in reversed(range(1, entries_len)):
+            if self.entries[idx][0].prior < self.entries[idx - 1][0].prior:
+                end = idx
+            self.priority_ends[idx - 1] = end
+
+    def scan(self, context, input_str, position):
+        """
+        Returns a list of tokens found at the given position.
+        """
+        entries = self.entries
+        tokens = []
+        end = len(entries)
+        idx = 0
+        while idx < end:
+            symbol, finish, recognizer, pattern = entries[idx]
+            if pattern is not None:
+                regex, group_entries, segment_end = self._segment(idx, end)
+                match = regex.match(input_str, position)
+                if match is None:
+                    idx = segment_end
+                    continue
+                idx = group_entries[match.lastindex]
+                symbol, finish, _, _ = entries[idx]
+                tok = match.end() - position
+            elif recognizer is not None:
+                try:
+                    tok = recognizer(input_str, position)
+                except TypeError:
+                    tok = recognizer(context, input_str, position)
+            else:
+                tok = None
+
+            if tok:
+                tokens.append(Token(symbol, tok, input_str=input_str,
+                                    position=position))
+                if finish:
+                    break
+                end = min(end, self.priority_ends[idx])
+            idx += 1
+        return tokens
+
+    def _segment(self, start, end):
+        """
+        Returns a combined alternation regex for the run of combined entries
+        starting at `start` and bounded by `end`, a dict mapping regex groups
+        to entry indexes and the index where the run ends.
+        """
+        try:
+            return self._segments[(start, end)]
+        except KeyError:
+            pass
+
+        patterns = []
+        group_entries = {}
+        group = 0
+        idx = start
+        while idx < end:
+            symbol, _, recognizer, pattern = self.entries[idx]
+            if recognizer is not None:
+                break
+            if pattern is not None:
+                patterns.append('({})'.format(pattern))
+                group_entries[group + 1] = idx
+                group += 1
+                if type(symbol.recognizer) is RegExRecognizer:
+                    group += symbol.recognizer.regex.groups
+            idx += 1
+
+        segment = (re.compile('|'.join(patterns), self.flags),
+                   group_entries, idx)
+        self._segments[(start, end)] = segment
+        return segment
+
+
+class Prescan(object):
+    """
+    Matches of regex terminals found by scanning the whole input once.
+
+    Each regex is scanned with `finditer` over the whole input on the first
+    lookup and start and end positions of the matches are kept in arrays.
+    Position where a match was found gives that match. Positions that were
+    skipped by the search give no match. Only positions inside a found match
+    are not known and the regex is matched there as usual. Regex matches
+    don't depend on parsing context so this gives the same result as
+    `RegExRecognizer`.
+
+    Attributes:
+    input_str(str): The input being parsed.
+    matches(dict): Arrays of (starts, ends) of the matches keyed by
+        recognizer. A negative end is the end of a non-empty match found
+        after an empty match at the same start. The match at the start is
+        empty and the positions inside are covered by the non-empty match.
+    """
+    __slots__ = ['input_str', 'matches']
+
+    def __init__(self, input_str):
+        self.input_str = input_str
+        self.matches = {}
+
+    def match(self, recognizer, position):
+        """
+        Returns the length of the match of the given regex recognizer at the
+        given position or `None` if there is no match.
+        """
+        try:
+            starts, ends = self.matches[recognizer]
+        except KeyError:
+            starts, ends = self.matches[recognizer] = self._scan(recognizer)
+
+        idx = bisect_right(starts, position) - 1
+        if idx >= 0:
+            end = ends[idx]
+            if starts[idx] == position:
+                return end - position if end >= 0 else 0
+            if position < abs(end):
+                match = recognizer.regex.match(self.input_str, position)
+                return match.end() - position if match else None
+        return None
+
+    def _scan(self, recognizer):
+        starts = array('l')
+        ends = array('l')
+        last_start = -1
+        for match in recognizer.regex.finditer(self.input_str):
+            start = match.start()
+            # After an empty match the search continues at the same position
+            # but only non-empty matches are allowed. A regex match at that
+            # position gives the empty match but positions inside the
+            # non-empty match must be matched as usual.
+            if start != last_start:
+                starts.append(start)
+                ends.append(match.end())
+                last_start = start
+            else:
+                ends[-1] = -match.end()
+        return starts, ends
+
+
+def _can_combine(recognizer, flags):
+    """
+    Check if the given regex recognizer can be embedded in a combined regex
+    compiled with the given flags.
+    """
+    regex = recognizer.regex
+    return recognizer.re_flags == flags \
+        and not regex.groupindex \
+        and not BACKREFERENCE.search(recognizer._regex) \
+        and regex.flags == re.compile('', flags).flags
+
+
+def layout_regex(layout):
+    """
+    Compiles the given LAYOUT non-terminal to a single regex if the layout
+    language is regular and the regex matches exactly what the layout parser
+    would parse. Returns `None` otherwise.
+
+    Layout productions may use only string and regex terminals, EMPTY,
+    alternatives and simple left or right recursion (i.e. repetition). To
+    match the layout parser, which never backtracks, each choice (between
+    alternatives, or between another repetition and what follows) must be
+    decided by the first character of the input and only the first element of
+    each sequence may be mandatory.
+    """
+    try:
+        node = _layout_node(layout, set())
+    except _NotRegular:
+        return None
+
+    terminals = set()
+    _collect_terminals(node, terminals)
+    if not terminals:
+        return None
+    flags = next((t.recognizer.re_flags for t in terminals
+                  if type(t.recognizer) is RegExRecognizer), re.MULTILINE)
+    for terminal in terminals:
+        recognizer = terminal.recognizer
+        if terminal.action is not None \
+                and not _is_builtin_action(terminal.action):
+            return None
+        if type(recognizer) is RegExRecognizer:
+            if not _can_combine(recognizer, flags):
+                return None
+        elif type(recognizer) is not StringRecognizer \
+                or recognizer.ignore_case or flags & re.IGNORECASE:
+            return None
+        if first_chars(recognizer) is None:
+            return None
+
+    if not _is_deterministic(node, (frozenset(), False)):
+        return None
+
+    return re.compile(_node_regex(node), flags)
+
+
+class _NotRegular(Exception):
+    pass
+
+
+# Layout regex nodes are tuples whose first element is one of these.
+_TERM, _EMPTY, _SEQ, _ALT, _STAR = range(5)
+_EMPTY_NODE = (_EMPTY,)
+
+
+def _layout_node(symbol, visiting):
+    """
+    Converts grammar symbol to a layout regex node.
+    """
+    if symbol is EMPTY:
+        return _EMPTY_NODE
+    if isinstance(symbol, Terminal):
+        if symbol in (EOF, STOP):
+            raise _NotRegular()
+        return (_TERM, symbol)
+
+    if symbol in visiting or not symbol.productions:
+        raise _NotRegular()
+    if symbol.action is not None and not _is_builtin_action(symbol.action):
+        raise _NotRegular()
+    visiting.add(symbol)
+
+    bases, lefts, rights = [], [], []
+    for production in symbol.productions:
+        rhs = list(production.rhs)
+        if rhs.count(symbol) > 1:
+            raise _NotRegular()
+        if rhs and rhs[0] is symbol and len(rhs) > 1:
+            lefts.append(rhs[1:])
+        elif rhs and rhs[-1] is symbol and len(rhs) > 1:
+            rights.append(rhs[:-1])
+        elif symbol in rhs:
+            raise _NotRegular()
+        else:
+            bases.append(rhs)
+    if (lefts and rights) or not bases:
+        raise _NotRegular()
+
+    def alt(sequences):
+        return _alt([_seq([_layout_node(s, visiting) for s in seq])
+                     for seq in sequences])
+
+    node = alt(bases)
+    if lefts:
+        node = _seq([node, _star(alt(lefts))])
+    elif rights:
+        node = _seq([_star(alt(rights)), node])
+
+    visiting.remove(symbol)
+    return node
+
+
+def _seq(nodes):
+    result = []
+    for node in nodes:
+        if node[0] == _SEQ:
+            result.extend(node[1])
+        elif node != _EMPTY_NODE:
+            result.append(node)
+    # `X? X*` and `X* X?` are `X*`
+    idx = 0
+    while idx < len(result) - 1:
+        first, second = result[idx], result[idx + 1]
+        if second[0] == _STAR and _nullable(first) \
+                and _non_empty(first) == second[1]:
+            del result[idx]
+        elif first[0] == _STAR and _nullable(second) \
+                and _non_empty(second) == first[1]:
+            del result[idx + 1]
+        else:
+            idx += 1
+    if not result:
+        return _EMPTY_NODE
+    return result[0] if len(result) == 1 else (_SEQ, tuple(result))
+
+
+def _alt(nodes):
+    result = []
+    for node in nodes:
+        for alternative in (node[1] if node[0] == _ALT else [node]):
+            if alternative not in result:
+                result.append(alternative)
+    if _EMPTY_NODE in result:
+        # `X X* | EMPTY` is `X*`
+        for idx, node in enumerate(result):
+            if node[0] == _SEQ and len(node[1]) == 2 \
+                    and node[1][1] == (_STAR, node[1][0]):
+                result[idx] = node[1][1]
+                result.remove(_EMPTY_NODE)
+                break
+    return result[0] if len(result) == 1 else (_ALT, tuple(result))
+
+
+def _star(node):
+    node = _non_empty(node)
+    if node is None:
+        return _EMPTY_NODE
+    return (_STAR, node)
+
+
+def _non_empty(node):
+    """
+    Returns node whose repetition matches the same as the repetition of the
+    given node but which doesn't match empty string if possible.
+    """
+    kind = node[0]
+    if kind == _EMPTY:
+        return None
+    if kind == _STAR:
+        return node[1]
+    if kind == _ALT:
+        alternatives = [n for n in (_non_empty(a) for a in node[1])
+                        if n is not None]
+        return _alt(alternatives) if alternatives else None
+    return node
+
+
+def _nullable(node):
+    kind = node[0]
+    if kind == _TERM:
+        return False
+    if kind == _SEQ:
+        return all(_nullable(n) for n in node[1])
+    if kind == _ALT:
+        return any(_nullable(n) for n in node[1])
+    return True
+
+
+def _first(node):
+    """
+    Returns a tuple (chars, non_ascii) of characters the node may start with.
+    """
+    kind = node[0]
+    if kind == _TERM:
+        return first_chars(node[1].recognizer)
+    if kind == _EMPTY:
+        return frozenset(), False
+    if kind == _STAR:
+        return _first(node[1])
+    chars, non_ascii = frozenset(), False
+    for n in node[1]:
+        n_chars, n_non_ascii = _first(n)
+        chars |= n_chars
+        non_ascii = non_ascii or n_non_ascii
+        if kind == _SEQ and not _nullable(n):
+            break
+    return chars, non_ascii
+
+
+def _union(first, other):
+    return first[0] | other[0], first[1] or other[1]
+
+
+def _disjoint(first, other):
+    return not (first[0] & other[0]) and not (first[1] and other[1])
+
+
+def _is_deterministic(node, follow):
+    """
+    Check if all choices in the node are decided by the first character of
+    the input and that no backtracking is needed once a choice is made.
+    `follow` are first characters of what may follow the node within the
+    layout.
+    """
+    kind = node[0]
+    if kind == _SEQ:
+        nodes = node[1]
+        if not all(_nullable(n) for n in nodes[1:]):
+            return False
+        for idx, n in enumerate(nodes):
+            n_follow = follow
+            for next_node in nodes[idx + 1:]:
+                n_follow = _union(n_follow, _first(next_node))
+            if not _is_deterministic(n, n_follow):
+                return False
+        return True
+    if kind == _ALT:
+        nodes = node[1]
+        firsts = [_first(n) for n in nodes]
+        for idx, first in enumerate(firsts):
+            if not all(_disjoint(first, other) for other in firsts[idx + 1:]):
+                return False
+        if any(_nullable(n) for n in nodes):
+            if len([n for n in nodes if _nullable(n)]) > 1 \
+                    or not all(_disjoint(first, follow) for first in firsts):
+                return False
+        return all(_is_deterministic(n, follow) for n in nodes)
+    if kind == _STAR:
+        body = node[1]
+        first = _first(body)
+        return not _nullable(body) and _disjoint(first, follow) \
+            and _is_deterministic(body, _union(first, follow))
+    return True
+
+
+def _collect_terminals(node, terminals):
+    if node[0] == _TERM:
+        terminals.add(node[1])
+    elif node[0] in (_SEQ, _ALT):
+        for n in node[1]:
+            _collect_terminals(n, terminals)
+    elif node[0] == _STAR:
+        _collect_terminals(node[1], terminals)
+
+
+def _node_regex(node):
+    kind = node[0]
+    if kind == _TERM:
+        recognizer = node[1].recognizer
+        if type(recognizer) is RegExRecognizer:
+            return '(?:{})'.format(recognizer._regex)
+        return re.escape(recognizer.value)
+    if kind == _EMPTY:
+        return ''
+    if kind == _SEQ:
+        return ''.join(_node_regex(n) for n in node[1])
+    if kind == _ALT:
+        return '(?:{})'.format('|'.join(_node_regex(n) for n in node[1]))
+    return '(?:{})*'.format(_node_regex(node[1]))
+
+
+def _is_builtin_action(action):
+    """
+    Check if the given action is provided by parglare and thus has no side
+    effects so it doesn't have to be called for layout.
+    """
+    if type(action) is list:
+        return all(_is_builtin_action(a) for a in action)
+    return getattr(action, '__module__', None) in ('parglare.actions',
+                                                   'parglare.grammar')
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Statistics of parsing collected by parsers created with `collect_stats=True`.
+"""
+from __future__ import unicode_literals
+from collections import Counter
+from time import perf_counter
+from .grammar import RegExRecognizer
+from .parser import Token
+
+
+class ParseStats(object):
+    """
+    Counters and times of a single parse.
+
+    Attributes:
+    shifts(int): Number of shifted tokens.
+    reductions(Counter): Number of reductions by productions.
+    recognizer_calls(Counter): Number of recognizer calls by terminal names.
+    recognizer_hits(Counter): Number of recognizer calls which matched by
+        terminal names.
+    recognition_time, action_time, layout_time(float): Seconds spent in token
+        recognition, in actions (including tree building) and in layout
+        skipping.
+    max_stack_depth(int): Maximal depth of the LR parser stack.
+    max_active_heads(int): Maximal number of heads reduced or shifted at once
+        by the GLR parser.
+    gss_nodes(int): Number of nodes of the graph-structured stack created by
+        the GLR parser.
+    """
+
+    def __init__(self):
+        self.shifts = 0
+        self.reductions = Counter()
+        self.recognizer_calls = Counter()
+        self.recognizer_hits = Counter()
+        self.recognition_time = 0.
+        self.action_time = 0.
+        self.layout_time = 0.
+        self.max_stack_depth = 0
+        self.max_active_heads = 0
+        self.gss_nodes = 0
+
+    def hit_rate(self, terminal_name):
+        """
+        Returns the ratio of calls of the recognizer of the given terminal
+        which matched, or None if it wasn't called.
+        """
+        calls = self.recognizer_calls[terminal_name]
+        if not calls:
+            return None
+        return self.recognizer_hits[terminal_name] / calls
+
+    def __str__(self):
+        lines = ['Shifts: {}'.format(self.shifts),
+                 'Reductions: {}'.format(sum(self.reductions.values()))]
+        for production, count in self.reductions.most_common():
+            lines.append('    {}: {}'.format(production, count))
+        lines.append('Recognizer calls/hits:')
+        for name, calls in self.recognizer_calls.most_common():
+            lines.append('    {}: {}/{} ({:.1%})'.format(
+                name, calls, self.recognizer_hits[name],
+                self.hit_rate(name)))
+        lines.append('Time (s): recognition {:.6f}, actions {:.6f}, '
+                     'layout {:.6f}'.format(self.recognition_time,
+                                            self.action_time,
+                                            self.layout_time))
+        if self.gss_nodes:
+            lines.append('Max active heads: {}'.format(self.max_active_heads))
+            lines.append('GSS nodes: {}'.format(self.gss_nodes))
+        else:
+            lines.append('Max stack depth: {}'.format(self.max_stack_depth))
+        return '\n'.join(lines)
+
+
+def instrument(parser, stats, stack_depth=None, cached=False):
+    """
+    Replaces the methods and reducers of the given parse session with wrappers
+    which count and time the operations into the given stats. Only the session
+    is changed so parsers which don't collect statistics run as usual.
+
+    Tokens are recognized by calling the recognizers of the expected
+    terminals in turn, without the state indexes and combined scanners, so
+    that each call is counted.
+
+    Args:
+    stack_depth(callable): Returns the depth of the parser stack after the
+        current shift or reduction.
+    cached(bool): If True recognizer results are shared through the
+        `token_cache` of the GLR parser.
+    """
+    timer = perf_counter
+    calls = stats.recognizer_calls
+    hits = stats.recognizer_hits
+
+    def token_recognition(context):
+        start = timer()
+        input_str = context.input_str
+        position = context.position
+        state = context.state
+        prescanned = parser.prescanned
+        cache = parser.token_cache if cached else None
+        tokens = []
+        last_prior = -1
+        for idx, symbol in enumerate(state.actions):
+            if symbol.prior < last_prior and tokens:
+                break
+            last_prior = symbol.prior
+            key = (position, symbol)
+            if cache is not None and key in cache:
+                parser.token_cache_hits += 1
+                tok = cache[key]
+            else:
+                if cache is not None:
+                    parser.token_cache_misses += 1
+                calls[symbol.name] += 1
+                recognizer = symbol.recognizer
+                if type(recognizer) is RegExRecognizer:
+                    if prescanned is not None:
+                        tok = prescanned.match(recognizer, position)
+                    else:
+                        match = recognizer.regex.match(input_str, position)
+                        tok = match.end() - position if match else None
+                    if cache is not None:
+                        cache[key] = tok
+                else:
+                    try:
+                        tok = recognizer(input_str, position)
+                        if cache is not None:
+                            cache[key] = tok
+                    except TypeError:
+                        tok = recognizer(context, input_str, position)
+                if tok:
+                    hits[symbol.name] += 1
+            if tok:
+                tokens.append(Token(symbol, tok, input_str=input_str,
+                                    position=position))
+                if state.finish_flags[idx]:
+                    break
+        stats.recognition_time += timer() - start
+        return tokens
+    parser._token_recognition = token_recognition
+
+    skipws = parser._skipws
+
+    def skip_layout(context):
+        start = timer()
+        skipws(context)
+        stats.layout_time += timer() - start
+    parser._skipws = skip_layout
+
+    call_shift_action = parser._call_shift_action
+
+    def shift_action(context):
+        stats.shifts += 1
+        if stack_depth is not None:
+            stats.max_stack_depth = max(stats.max_stack_depth, stack_depth())
+        start = timer()
+        result = call_shift_action(context)
+        stats.action_time += timer() - start
+        return result
+    parser._call_shift_action = shift_action
+
+    parser._reducers = [
+        _counting_reducer(production, reducer, stats, stack_depth)
+        for production, reducer in zip(parser.grammar.productions,
+                                       parser._reducers)]
+
+
+def instrument_gss(parser, stats):
+    """
+    Makes the given GLR parse session track the number of active heads and
+    of the nodes of the graph-structured stack. New nodes are those added to
+    the heads for reducing, the others are merged to the existing heads.
+    """
+    stats.gss_nodes = 1
+
+    def counting_new_heads(method):
+        def count_new_heads(*args):
+            heads = len(parser.heads_for_reduce)
+            method(*args)
+            stats.gss_nodes += len(parser.heads_for_reduce) - heads
+        return count_new_heads
+
+    do_reductions = parser._do_reductions
+    do_shifts = parser._do_shifts
+
+    def reductions():
+        stats.max_active_heads = max(stats.max_active_heads,
+                                     len(parser.heads_for_reduce))
+        do_reductions()
+
+    def shifts():
+        stats.max_active_heads = max(stats.max_active_heads,
+                                     len(parser.heads_for_shift))
+        do_shifts()
+    parser._do_reductions = reductions
+    parser._do_shifts = shifts
+    parser._shift = counting_new_heads(parser._shift)
+    parser._merge_create_head = counting_new_heads(parser._merge_create_head)
+
+
+def _counting_reducer(production, reducer, stats, stack_depth):
+    timer = perf_counter
+    reductions = stats.reductions
+
+    def reduce_counted(context, subresults):
+        reductions[production] += 1
+        if stack_depth is not None:
+            stats.max_stack_depth = max(stats.max_stack_depth, stack_depth())
+        if reducer is None:
+            return subresults[0] if len(subresults) == 1 else subresults
+        start = timer()
+        result = reducer(context, subresults)
+        stats.action_time += timer() - start
+        return result
+    return reduce_counted
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+Parsing of textual input read from file-like objects or fed in chunks.
+"""
+from __future__ import unicode_literals
+import codecs
+from copy import copy
+from time import monotonic
+from parglare.common import Location, replace_newlines, text
+from parglare.grammar import EMPTY, STOP, EOF
+from parglare.exceptions import ParseError, ParserInitError, \
+    DisambiguationError
+from parglare.termui import s_attention as _a
+
+DEFAULT_CHUNK_SIZE = 2 ** 16
+
+
+class InputNeeded(Exception):
+    """
+    Raised by a push input window when more input must be fed before the
+    next token can be recognized.
+    """
+
+
+class InputWindow(object):
+    """
+    Keeps a window of the input read from a file-like object. Consumed input
+    is discarded once it makes at least half of the window, so the window is
+    not copied for each token, and new chunks are read on demand so that at
+    least `chunk_size` characters are available ahead of the current
+    position, or more if a token or layout doesn't fit.
+
+    Parser positions are absolute. Token recognition is done on the window
+    (`buffer`) with positions relative to `offset`.
+
+    Attributes:
+    stream: A file-like object to read from.
+    chunk_size(int): Number of characters read at once.
+    buffer(str): The current window of the input.
+    offset(int): Absolute position of the start of the window.
+    line, column(int): Line and column of the start of the window.
+    eof(bool): True if the whole input is read.
+    decoder: Incremental UTF-8 decoder used if the input is in bytes.
+    layout_parser(Parser): Builds layout trees whose actions are called
+        only once the layout is known to be complete.
+    """
+    __slots__ = ['stream', 'chunk_size', 'buffer', 'offset', 'line', 'column',
+                 'eof', 'decoder', 'layout_parser']
+
+    def __init__(self, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.offset = 0
+        self.line = 1
+        self.column = 0
+        self.eof = False
+        self.decoder = None
+        self.layout_parser = None
+
+    def discard(self, position):
+        """
+        Discards the input before the given absolute position if it makes at
+        least half of the window. Otherwise it is kept until more is
+        consumed.
+        """
+        consumed = position - self.offset
+        if consumed > 0 and 2 * consumed >= len(self.buffer):
+            dropped = self.buffer[:consumed]
+            newlines = dropped.count('\n')
+            if newlines:
+                self.line += newlines
+                self.column = len(dropped) - dropped.rindex('\n') - 1
+            else:
+                self.column += len(dropped)
+            self.buffer = self.buffer[consumed:]
+            self.offset = position
+
+    def read(self, size):
+        """
+        Reads at least `size` characters more if available.
+        """
+        while size > 0:
+            chunk = self.stream.read(max(size, self.chunk_size))
+            if not chunk:
+                self.eof = True
+                self.buffer += self.decode(b'', final=True)
+                break
+            chunk = self.decode(chunk)
+            self.buffer += chunk
+            size -= len(chunk)
+
+    def decode(self, chunk, final=False):
+        """
+        Decodes bytes as UTF-8. Characters split between chunks are kept by
+        the decoder until the rest is read.
+        """
+        if type(chunk) is text:
+            return chunk
+        if self.decoder is None:
+            self.decoder = codecs.getincrementaldecoder('utf-8')()
+        return self.decoder.decode(chunk, final)
+
+    def next_token(self, parser, context, position):
+        """
+        Skips layout and recognizes the next token at the given absolute
+        position. Returns the absolute position of the token and the token.
+        Context is updated with the window and the relative position.
+        """
+        self.discard(position)
+        tokens = self.next_tokens(parser, context, position)
+        context.start_position = context.end_position = context.position
+        try:
+            token = parser._choose_token(context, tokens)
+        except DisambiguationError as e:
+            raise DisambiguationError(self.location(e.location), e.tokens)
+        return self.offset + context.position, token
+
+    def next_tokens(self, parser, context, position, layout_actions=True):
+        """
+        Skips layout and recognizes tokens at the given absolute position.
+        More input is read while the layout or any of the tokens reaches the
+        end of the window, as it may continue in the input not read yet.
+        """
+        ahead = self.chunk_size
+        while True:
+            buffer = self.buffer
+            rel_position = position - self.offset
+            if not self.eof and len(buffer) - rel_position < ahead:
+                self.read(ahead - len(buffer) + rel_position)
+                continue
+
+            context.input_str = buffer
+            context.position = rel_position
+            layout_tree = None
+            if parser.in_layout:
+                pass
+            elif parser.layout_parser is not None \
+                    and parser.layout_regex is None:
+                layout_tree = self._skip_layout(parser, context)
+            else:
+                parser._skipws(context)
+
+            in_len = len(buffer)
+            tokens = None
+            if self.eof or context.position < in_len:
+                tokens = parser._next_tokens(context)
+                if not self.eof:
+                    if any(context.position + t.length == in_len
+                           for t in tokens) \
+                            or not tokens and self._may_match(parser,
+                                                              context):
+                        tokens = None
+            if tokens is None:
+                ahead = in_len - rel_position + 1
+                continue
+
+            if layout_tree is not None and layout_actions:
+                parser.layout_parser.call_actions(layout_tree)
+            return tokens
+
+    def _may_match(self, parser, context):
+        """
+        Checks if a terminal expected in the context state, or a layout
+        terminal, may match at the context position if more input is read.
+        """
+        if parser.custom_token_recognition is not None:
+            return True
+        states = [context.state]
+        if parser.layout_parser is not None:
+            states.append(parser.layout_parser.table.states[0])
+        for state in states:
+            index = state.first_chars
+            if index is None:
+                return True
+            symbols = index.symbols
+            if any(symbols[idx] not in (EMPTY, STOP, EOF)
+                   for idx in index.candidates(context.input_str,
+                                               context.position)):
+                return True
+        return False
+
+    def _skip_layout(self, parser, context):
+        """
+        Skips layout by building its tree. Layout actions may have side
+        effects so they are not called until the layout is complete, as the
+        layout is parsed again if the window is extended.
+        """
+        if self.layout_parser is None:
+            from parglare.parser import Parser
+            self.layout_parser = Parser(
+                parser.grammar, in_layout=True, ws=None,
+                return_position=True, prefer_shifts=True,
+                prefer_shifts_over_empty=True, build_tree=True)
+        tree, position = self.layout_parser.parse(
+            context.input_str, context.position, context=copy(context))
+        context.layout_content_ahead = \
+            context.input_str[context.position:position]
+        context.position = position
+        return tree
+
+    def parse_error(self, parser, context):
+        """
+        Creates the parse error for the absolute position of the context.
+        """
+        context.input_str = self.buffer
+        context.position -= self.offset
+        state = context.state
+        error = parser._create_error(
+            context, list(state.actions),
+            parser._get_all_possible_tokens_ahead(context),
+            symbols_before=[state.symbol])
+        error = ParseError(self.location(error.location),
+                           error.symbols_expected, error.tokens_ahead,
+                           symbols_before=error.symbols_before)
+        parser.errors[-1] = error
+        return error
+
+    def location(self, location):
+        """
+        Converts the location relative to the window to `StreamLocation`.
+        """
+        stream_location = StreamLocation(
+            location.input_str, self.offset, self.line, self.column,
+            file_name=getattr(location, 'file_name', None))
+        stream_location.start_position = \
+            self.offset + location.start_position
+        stream_location.end_position = self.offset + location.end_position
+        stream_location.position = self.offset + location.position
+        return stream_location
+
+
+class PushWindow(InputWindow):
+    """
+    Input window which is fed with chunks of the input as they arrive.
+    Tokens are recognized as soon as they can't be extended by more input.
+    `InputNeeded` is raised if the next token needs input not fed yet.
+
+    Parsing may also be paused by raising `InputNeeded` after the given
+    number of parser steps or at the given time (see `ParseSession.resume`).
+
+    Attributes:
+    closed(bool): True if the whole input is fed.
+    steps(int): Number of parser steps left before the pause or None.
+    deadline(float): `time.monotonic` value after which the parser is paused
+        or None.
+    limit_reached(bool): True if the parser is to be paused before the next
+        step.
+    paused(bool): True if the parser is paused.
+    """
+    __slots__ = ['closed', 'steps', 'deadline', 'limit_reached', 'paused']
+
+    def __init__(self):
+        super(PushWindow, self).__init__(None, chunk_size=0)
+        self.closed = False
+        self.steps = None
+        self.deadline = None
+        self.limit_reached = False
+        self.paused = False
+
+    def feed(self, chunk):
+        self.buffer += self.decode(chunk)
+
+    def close(self):
+        self.buffer += self.decode(b'', final=True)
+        self.closed = True
+
+    def read(self, size):
+        if not self.closed:
+            raise InputNeeded()
+        self.eof = True
+
+    def step(self):
+        """
+        Called by the parser before each step (recognition of the next
+        token). Pauses the parser if the limits were reached by the previous
+        steps, so at least one step is done after each resume.
+        """
+        if self.limit_reached:
+            self.paused = True
+            raise InputNeeded()
+        if self.steps is not None:
+            self.steps -= 1
+            if self.steps <= 0:
+                self.limit_reached = True
+        if self.deadline is not None and monotonic() >= self.deadline:
+            self.limit_reached = True
+
+    def next_token(self, parser, context, position):
+        self.step()
+        return super(PushWindow, self).next_token(parser, context, position)
+
+
+class ParseSession(object):
+    """
+    Push parsing session created by `Parser.start`. The input is given to
+    `feed` in chunks as it arrives and the parser advances as far as the
+    input allows, keeping its state between the calls.
+
+    Attributes:
+    parser(Parser): The parser used.
+    window(PushWindow): The input fed so far.
+    state: Parser state kept between the calls.
+    result: The parse result once the parsing is done.
+    done(bool): True if the parsing is done.
+    """
+    __slots__ = ['parser', 'window', 'state', 'result', 'done']
+
+    def __init__(self, parser, file_name=None, context=None):
+        self.parser = parser
+        self.window = PushWindow()
+        self.state = parser._init_push(self.window, file_name, context)
+        self.result = None
+        self.done = False
+
+    def feed(self, chunk):
+        """
+        Feeds the next chunk of the input (text or UTF-8 encoded bytes) and
+        parses as far as possible. Raises `ParseError` as soon as an error is
+        found.
+        """
+        if self.window.closed:
+            raise ParserInitError('Parse session is already finished.')
+        self.window.feed(chunk)
+        self._resume()
+
+    def finish(self):
+        """
+        Marks the end of the input, finishes the parsing and returns the
+        result.
+        """
+        if not self.window.closed:
+            self.window.close()
+            self._resume()
+        return self.result
+
+    def resume(self, steps=None, seconds=None):
+        """
+        Continues parsing of the input fed so far but pauses after the given
+        number of parser steps (tokens) or seconds. Returns True if the
+        parsing is paused and may continue with the input already fed.
+        Used to parse large chunks in slices, e.g. to avoid blocking
+        an event loop.
+        """
+        window = self.window
+        window.steps = steps
+        window.deadline = monotonic() + seconds \
+            if seconds is not None else None
+        window.limit_reached = window.paused = False
+        try:
+            self._resume()
+        finally:
+            window.steps = window.deadline = None
+            window.limit_reached = False
+        return window.paused
+
+    def _resume(self):
+        if self.done:
+            return
+        try:
+            self.result = self.parser._resume_push(self.state, self.window)
+        except InputNeeded:
+            return
+        except Exception:
+            self.done = True
+            raise
+        self.done = True
+
+
+class StreamLocation(Location):
+    """
+    Location in the input parsed from a stream. Positions are absolute but
+    only a window of the input, starting at `offset` which is at the given
+    `offset_line` and `offset_column`, is available in `input_str`.
+    """
+    __slots__ = ['offset', 'offset_line', 'offset_column']
+
+    def __init__(self, input_str, offset, offset_line, offset_column,
+                 file_name=None):
+        super(StreamLocation, self).__init__(file_name=file_name)
+        if not file_name:
+            self.file_name = None
+        self.input_str = input_str
+        self.offset = offset
+        self.offset_line = offset_line
+        self.offset_column = offset_column
+
+    def evaluate_line_col(self):
+        from parglare.parser import pos_to_line_col
+        line, column = pos_to_line_col(self.input_str,
+                                       self.start_position - self.offset)
+        if line == 1:
+            column += self.offset_column
+        self._line = self.offset_line + line - 1
+        self._column = column
+
+    def __str__(self):
+        position = self.position - self.offset
+        start = max(position - 10, 0)
+        position_context = replace_newlines(
+            self.input_str[start:position] + "*"
+            + self.input_str[position:position + 10])
+        return _a('{}{}:{}:"{}"'.format(
+            "{}:".format(self.file_name) if self.file_name else "",
+            self.line, self.column, position_context))
@@ -1,6 +1,7 @@
 from __future__ import print_function, unicode_literals
 import logging
 import os
+import re
 from collections import OrderedDict
 from itertools import chain
 from parglare.grammar import ProductionRHS, AUGSYMBOL, \
@@ -10,6 +11,7 @@ from parglare.exceptions import GrammarError, SRConflict, RRConflict
 from parglare.closure import closure, LR_1
 from parglare.termui import prints, s_header, h_print, a_print, s_emph
 from parglare.tables.persist import load_table, save_table
+from parglare.tables.first_chars import first_chars
 
 try:
     text = unicode  # noqa
@@ -33,6 +35,9 @@ ACCEPT = 2
 SLR = 0
 LALR = 1
 
+# Minimal number of string terminals in a state for the state to be indexed.
+STRING_INDEX_MIN_TERMINALS = 3
+
 
 def create_load_table(grammar, itemset_type=LR_1, start_production=1,
                       prefer_shifts=False, prefer_shifts_over_empty=True,
@@ -394,6 +399,9 @@ class LRTable(object):
                 logger.warn('lexical_disambiguation flag ignored '
                             'because calc_finish_flags is not set')
         self.calc_conflicts_and_dynamic_terminals()
+        self.calc_first_char_indexes()
+        self.calc_string_indexes()
+        self.calc_dense_tables()
 
     def sort_state_actions(self):
         """
@@ -444,6 +452,111 @@ class LRTable(object):
             finish_flags.reverse()
             state.finish_flags = finish_flags
 
+    def calc_first_char_indexes(self):
+        """
+        Scanning optimization. Index terminals of each state by the first
+        character they may match so that recognizers which can't match are
+        not called. Indexes already given for states (e.g. loaded from a table
+        file) are kept if valid.
+        """
+        terminal_chars = {}
+        for state in self.states:
+            first_chars = state.first_chars
+            if first_chars is None or not first_chars.is_valid_for(state):
+                first_chars = FirstCharIndex.from_state(state, terminal_chars)
+            state.first_chars = None if first_chars.is_trivial() \
+                else first_chars
+
+    def calc_string_indexes(self):
+        """
+        Scanning optimization. Index string and keyword terminals of each
+        state so that all of them are matched with a single lookup. States
+        with only a few string terminals are not indexed as calling their
+        recognizers in turn is cheaper.
+        """
+        for state in self.states:
+            string_index = StringIndex(state)
+            if len(string_index.symbols) - len(string_index.others) \
+                    >= STRING_INDEX_MIN_TERMINALS:
+                state.string_index = string_index
+            else:
+                state.string_index = None
+
+    def calc_dense_tables(self):
+        """
+        Parsing optimization. Lay out actions and gotos of each state in lists
+        indexed by terminal/nonterminal ids so that the parser doesn't need to
+        hash grammar symbols in each step. Missing entries are None.
+        """
+        term_count = max([s.term_id for state in self.states
+                          for s in state.actions] + [0]) + 1
+        nonterm_count = max([s.nonterm_id for state in self.states
+                             for s in state.gotos] + [0]) + 1
+        for state in self.states:
+            actions_by_id = [None] * term_count
+            for symbol, actions in state.actions.items():
+                actions_by_id[symbol.term_id] = actions
+            state.actions_by_id = actions_by_id
+
+            gotos_by_id = [None] * nonterm_count
+            for symbol, goto_state in state.gotos.items():
+                gotos_by_id[symbol.nonterm_id] = goto_state
+            state.gotos_by_id = gotos_by_id
+
+    def unit_chain_gotos(self, bypass):
+        """
+        Parsing optimization. Finds chains of reductions by unit productions
+        (e.g. `E: T;`) which are taken right after a goto. If the only action
+        of the goto state for a lookahead is a reduction by a unit production
+        for which `bypass(production)` is true the parser may go directly to
+        the state at the end of the chain.
+
+        Returns a list indexed by state ids. Entries are None for states
+        without chains or lists indexed by nonterminal ids of None or dicts
+        which map terminal ids to the last state of the chain.
+        """
+        # Unit productions reduced in each state by terminal ids.
+        unit_reductions = {}
+        for state in self.states:
+            reductions = {}
+            for term_id, actions in enumerate(state.actions_by_id):
+                if actions and len(actions) == 1 \
+                        and actions[0].action is REDUCE \
+                        and len(actions[0].prod.rhs) == 1 \
+                        and bypass(actions[0].prod):
+                    reductions[term_id] = actions[0].prod
+            unit_reductions[state.state_id] = reductions
+
+        chain_gotos = [None] * (max(unit_reductions) + 1)
+        for state in self.states:
+            state_chains = None
+            for nonterm_id, goto_state in enumerate(state.gotos_by_id):
+                if goto_state is None \
+                        or not unit_reductions[goto_state.state_id]:
+                    continue
+                chains = {}
+                for term_id in unit_reductions[goto_state.state_id]:
+                    target = goto_state
+                    visited = [target]
+                    while term_id in unit_reductions[target.state_id]:
+                        production = unit_reductions[target.state_id][term_id]
+                        target = state.gotos_by_id[
+                            production.symbol.nonterm_id]
+                        if target in visited:
+                            # Cyclic unit productions are left to the
+                            # parser.
+                            target = goto_state
+                            break
+                        visited.append(target)
+                    if target is not goto_state:
+                        chains[term_id] = target
+                if chains:
+                    if state_chains is None:
+                        state_chains = [None] * len(state.gotos_by_id)
+                    state_chains[nonterm_id] = chains
+            chain_gotos[state.state_id] = state_chains
+        return chain_gotos
+
     def calc_conflicts_and_dynamic_terminals(self):
         """
         Determine S/R and R/R conflicts and states dynamic terminals.
@@ -563,6 +676,231 @@ class Action(object):
             return False
 
 
+class StringIndex(object):
+    """
+    Index of string and keyword terminals expected in an LR state.
+
+    String values are grouped in buckets by length. To find all matching
+    string terminals one input slice per bucket is taken and looked up in the
+    bucket dict, so the cost doesn't depend on the number of terminals.
+
+    Attributes:
+    symbols(list of Terminal): Terminals of state actions in order.
+    lengths(list of int): Lengths of indexed values in descending order.
+    exact(dict): Keyed by length. Values are dicts mapping string values to
+        lists of action indexes.
+    nocase(dict): Same as `exact` but for terminals which ignore case. Keys
+        are lowercase values.
+    keywords(set of int): Indexes of keyword terminals. These have to be
+        checked for word boundaries by their recognizer.
+    others(list of int): Indexes of not indexed terminals. These must be
+        checked by calling their recognizers.
+    priority_ends(list of int): For each action index, the index of the
+        first following action of lower priority than its predecessor. This is
+        where token recognition stops once a token is found.
+    first_chars(FirstCharIndex): First character index of `others` or None.
+    """
+    __slots__ = ['symbols', 'lengths', 'exact', 'nocase', 'keywords',
+                 'others', 'priority_ends', 'first_chars']
+
+    def __init__(self, state):
+        self.symbols = list(state.actions)
+        self.exact = {}
+        self.nocase = {}
+        self.keywords = set()
+        self.others = []
+
+        for idx, symbol in enumerate(self.symbols):
+            recognizer = symbol.recognizer
+            value = None
+            if type(recognizer) is StringRecognizer:
+                value = recognizer.value
+            elif type(recognizer) is RegExRecognizer and symbol.keyword \
+                    and recognizer._regex.startswith(r'\b') \
+                    and recognizer._regex.endswith(r'\b'):
+                # Keyword regexes are created by
+                # `Grammar._fix_keyword_terminals` from string values.
+                # Non-ascii keywords may match ascii input when case is
+                # ignored, so they are left to their recognizers.
+                value = recognizer._regex[2:-2]
+                if re.escape(value) == value and \
+                        (_isascii(value) or not recognizer.ignore_case):
+                    self.keywords.add(idx)
+                else:
+                    value = None
+
+            if value:
+                if recognizer.ignore_case:
+                    self.nocase.setdefault(len(value), {})\
+                        .setdefault(value.lower(), []).append(idx)
+                else:
+                    self.exact.setdefault(len(value), {})\
+                        .setdefault(value, []).append(idx)
+            else:
+                self.others.append(idx)
+
+        self.lengths = sorted(set(self.exact) | set(self.nocase),
+                              reverse=True)
+
+        self.priority_ends = _priority_ends(self.symbols)
+        self.first_chars = None
+        if state.first_chars is not None:
+            first_chars = state.first_chars.restrict(self.others)
+            if not first_chars.is_trivial():
+                self.first_chars = first_chars
+
+    def match(self, input_str, position):
+        """
+        Returns a dict of values of indexed terminals matched at the given
+        position keyed by action index.
+        """
+        matched = {}
+        exact = self.exact
+        nocase = self.nocase
+        for length in self.lengths:
+            value = input_str[position:position + length]
+            if len(value) < length:
+                continue
+            if length in exact:
+                for idx in exact[length].get(value, ()):
+                    matched[idx] = value
+            if length in nocase:
+                lower_value = value.lower()
+                if _isascii(value):
+                    candidates = nocase[length].get(lower_value, ())
+                else:
+                    # Regex case folding differs from `str.lower` for some
+                    # non-ascii characters. Let the recognizers decide.
+                    candidates = [idx for idxs in nocase[length].values()
+                                  for idx in idxs if idx in self.keywords]
+                    candidates.extend(nocase[length].get(lower_value, ()))
+                for idx in candidates:
+                    recognizer = self.symbols[idx].recognizer
+                    matched[idx] = value if idx in self.keywords \
+                        else recognizer.value
+
+        for idx in self.keywords.intersection(matched):
+            matched[idx] = self.symbols[idx].recognizer(input_str, position)
+
+        return matched
+
+
+class FirstCharIndex(object):
+    """
+    Index of terminals expected in an LR state by the first character of the
+    input they may match. Used to skip recognizers which can't match at the
+    current position.
+
+    Attributes:
+    symbols(list of Terminal): Terminals of state actions in order.
+    chars(dict): Maps ascii characters to sorted lists of action indexes of
+        terminals which may match input starting with the character. Only
+        characters with candidates other than `any` are given.
+    any(list of int): Indexes of terminals which may match at any position.
+        These are the candidates for ascii characters not in `chars` and at
+        the end of input.
+    non_ascii(list of int): Candidates for non-ascii characters.
+    priority_ends(list of int): See `StringIndex`.
+    """
+    __slots__ = ['symbols', 'chars', 'any', 'non_ascii', 'priority_ends']
+
+    def __init__(self, symbols, chars, any_candidates, non_ascii):
+        self.symbols = symbols
+        self.chars = chars
+        self.any = any_candidates
+        self.non_ascii = non_ascii
+        self.priority_ends = _priority_ends(symbols)
+
+    @classmethod
+    def from_state(cls, state, terminal_chars=None):
+        """
+        Creates index for the given state. `terminal_chars` is a dict used to
+        cache the result of `first_chars` per terminal.
+        """
+        if terminal_chars is None:
+            terminal_chars = {}
+        symbols = list(state.actions)
+        infos = []
+        for symbol in symbols:
+            if symbol not in terminal_chars:
+                terminal_chars[symbol] = first_chars(symbol.recognizer)
+            infos.append(terminal_chars[symbol])
+
+        any_candidates = [idx for idx, info in enumerate(infos)
+                          if info is None]
+        non_ascii = [idx for idx, info in enumerate(infos)
+                     if info is None or info[1]]
+        chars = {}
+        for char in set(chain(*(info[0] for info in infos if info))):
+            chars[char] = [idx for idx, info in enumerate(infos)
+                           if info is None or char in info[0]]
+        return cls(symbols, chars, any_candidates, non_ascii)
+
+    def is_trivial(self):
+        """
+        True if the index can't filter out any terminal.
+        """
+        return self.non_ascii == self.any \
+            and all(candidates == self.any
+                    for candidates in self.chars.values())
+
+    def is_valid_for(self, state):
+        """
+        Check if the index, e.g. loaded from a table file, may be used with
+        the given state. Custom recognizers may be given for terminals when
+        grammar is loaded so the index is not valid if such terminals are not
+        tried at every position.
+        """
+        return self.symbols == list(state.actions) \
+            and all(idx in self.any for idx, symbol in enumerate(self.symbols)
+                    if type(symbol.recognizer) not in (StringRecognizer,
+                                                       RegExRecognizer))
+
+    def restrict(self, indexes):
+        """
+        Returns an index with only the given action indexes as candidates.
+        """
+        indexes = set(indexes)
+        return FirstCharIndex(
+            self.symbols,
+            {char: [idx for idx in candidates if idx in indexes]
+             for char, candidates in self.chars.items()},
+            [idx for idx in self.any if idx in indexes],
+            [idx for idx in self.non_ascii if idx in indexes])
+
+    def candidates(self, input_str, position):
+        """
+        Returns sorted action indexes of terminals that may match at the given
+        position.
+        """
+        char = input_str[position:position + 1]
+        candidates = self.chars.get(char)
+        if candidates is None:
+            candidates = self.any if char < '\x80' else self.non_ascii
+        return candidates
+
+
+def _priority_ends(symbols):
+    """
+    For each terminal returns the index of the first following terminal of
+    lower priority than its predecessor.
+    """
+    priority_ends = [len(symbols)] * len(symbols)
+    end = len(symbols)
+    for idx in reversed(range(1, len(symbols))):
+        if symbols[idx].prior < symbols[idx - 1].prior:
+            end = idx
+        priority_ends[idx - 1] = end
+    return priority_ends
+
+
+def _isascii(value):
+    try:
+        return value.isascii()
+    except AttributeError:
+        return all(ord(c) < 128 for c in value)
+
+
 class LRItem(object):
     """
     Represents an item in the items set. Item is defined by a production and a
@@ -654,10 +992,19 @@ class LRState(object):
         ambiguity strategy callable is called for the terminal symbol
         lookahead.
     finish_flags:
+    first_chars(FirstCharIndex): Index of terminals by the first character
+        used to speed up scanning or None if it can't filter any terminal.
+    string_index(StringIndex): Index of string terminals used to speed up
+        scanning or None if there are no string terminals in this state.
+    actions_by_id(list): Lists of Action instances indexed by terminal
+        `term_id`. Dense form of `actions` used by the parsers.
+    gotos_by_id(list): Instances of LRState indexed by nonterminal
+        `nonterm_id`. Dense form of `gotos` used by the parsers.
 
     """
     __slots__ = ['grammar', 'state_id', 'symbol', 'items',
-                 'actions', 'gotos', 'dynamic', 'finish_flags',
+                 'actions', 'gotos', 'dynamic', 'finish_flags', 'first_chars',
+                 'string_index', 'actions_by_id', 'gotos_by_id',
                  '_per_next_symbol', '_max_prior_per_symbol']
 
     def __init__(self, grammar, state_id, symbol, items=None):
@@ -669,6 +1016,10 @@ class LRState(object):
         self.actions = OrderedDict()
         self.gotos = OrderedDict()
         self.dynamic = set()
+        self.first_chars = None
+        self.string_index = None
+        self.actions_by_id = None
+        self.gotos_by_id = None
 
     def __eq__(self, other):
         """Two states are equal if their kernel items are equal."""
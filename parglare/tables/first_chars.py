@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Calculation of characters terminal recognizers may start with. Used to build
+per-state first character indexes.
+"""
+from __future__ import unicode_literals
+import re
+import string
+from parglare.grammar import StringRecognizer, RegExRecognizer
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse  # noqa
+    import sre_constants  # noqa
+
+try:
+    unichr  # noqa
+except NameError:
+    unichr = chr
+
+ASCII = frozenset(unichr(c) for c in range(128))
+
+# Characters which unicode regex categories match in the ascii range.
+CATEGORY_CHARS = {
+    sre_constants.CATEGORY_DIGIT: frozenset(string.digits),
+    sre_constants.CATEGORY_WORD: frozenset(string.ascii_letters +
+                                           string.digits + '_'),
+    sre_constants.CATEGORY_SPACE: frozenset(' \t\n\r\f\v\x1c\x1d\x1e\x1f'),
+}
+
+REPEATS = tuple(op for op in (sre_constants.MAX_REPEAT,
+                              sre_constants.MIN_REPEAT,
+                              getattr(sre_constants, 'POSSESSIVE_REPEAT',
+                                      None))
+                if op is not None)
+ZERO_WIDTH = (sre_constants.AT, sre_constants.ASSERT,
+              sre_constants.ASSERT_NOT)
+
+
+def first_chars(recognizer):
+    """
+    Returns a tuple (chars, non_ascii) where `chars` is a frozenset of ascii
+    characters the given recognizer may start its match with and `non_ascii`
+    tells if the match may start with a non-ascii character.
+
+    The result is conservative, i.e. recognizer will never match at a position
+    with a character not covered. `None` is returned if the recognizer may
+    match on any character or at the end of input (e.g. custom recognizers or
+    regexes which match empty string).
+    """
+    if type(recognizer) is StringRecognizer:
+        return _string_first_chars(recognizer)
+    if type(recognizer) is RegExRecognizer:
+        try:
+            parsed = sre_parse.parse(recognizer._regex,
+                                     recognizer.regex.flags)
+        except Exception:
+            return None
+        result = _seq_first_chars(parsed,
+                                  recognizer.regex.flags & re.IGNORECASE)
+        if result is None or result[2]:
+            return None
+        return result[:2]
+    return None
+
+
+def _string_first_chars(recognizer):
+    if not recognizer.value:
+        return None
+    first = recognizer.value_cmp[0]
+    if recognizer.ignore_case:
+        # `str.lower` of the input slice is compared with the lowercase value.
+        # Some non-ascii characters lower to ascii.
+        return frozenset(c for c in ASCII if c.lower() == first), True
+    if first in ASCII:
+        return frozenset(first), False
+    return frozenset(), True
+
+
+def _seq_first_chars(items, ignore_case):
+    """
+    Returns a tuple (chars, non_ascii, nullable) for a sequence of parsed regex
+    items or None if unknown.
+    """
+    chars = set()
+    non_ascii = False
+    for op, av in items:
+        result = _item_first_chars(op, av, ignore_case)
+        if result is None:
+            return None
+        item_chars, item_non_ascii, nullable = result
+        chars.update(item_chars)
+        non_ascii = non_ascii or item_non_ascii
+        if not nullable:
+            return chars, non_ascii, False
+    return chars, non_ascii, True
+
+
+def _item_first_chars(op, av, ignore_case):
+    if op is sre_constants.LITERAL:
+        return _literal_first_chars(av, ignore_case) + (False,)
+
+    if op is sre_constants.NOT_LITERAL or op is sre_constants.ANY:
+        return ASCII, True, False
+
+    if op is sre_constants.IN:
+        chars = set()
+        non_ascii = False
+        for in_op, in_av in av:
+            if in_op is sre_constants.LITERAL:
+                result = _literal_first_chars(in_av, ignore_case)
+            elif in_op is sre_constants.RANGE:
+                result = _range_first_chars(in_av, ignore_case)
+            elif in_op is sre_constants.CATEGORY and in_av in CATEGORY_CHARS:
+                result = CATEGORY_CHARS[in_av], True
+            elif in_op is sre_constants.NEGATE \
+                    or in_op is sre_constants.CATEGORY:
+                result = ASCII, True
+            else:
+                return None
+            if result is None:
+                return None
+            chars.update(result[0])
+            non_ascii = non_ascii or result[1]
+        return chars, non_ascii, False
+
+    if op is sre_constants.SUBPATTERN:
+        # Python 3.6+ has (group, add_flags, del_flags, pattern).
+        if len(av) == 4 and (av[1] or av[2]):
+            return None
+        return _seq_first_chars(av[-1], ignore_case)
+
+    if op is sre_constants.BRANCH:
+        chars = set()
+        non_ascii = nullable = False
+        for alternative in av[1]:
+            result = _seq_first_chars(alternative, ignore_case)
+            if result is None:
+                return None
+            chars.update(result[0])
+            non_ascii = non_ascii or result[1]
+            nullable = nullable or result[2]
+        return chars, non_ascii, nullable
+
+    if op in REPEATS:
+        result = _seq_first_chars(av[2], ignore_case)
+        if result is None:
+            return None
+        return result[0], result[1], result[2] or av[0] == 0
+
+    if op in ZERO_WIDTH:
+        # Anchors and lookarounds don't consume input. Ignoring them only
+        # makes the result less precise.
+        return frozenset(), False, True
+
+    if op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+        return _seq_first_chars(av, ignore_case)
+
+    return None
+
+
+def _literal_first_chars(code, ignore_case):
+    char = unichr(code)
+    if char not in ASCII:
+        # Some non-ascii characters match ascii ones when case is ignored.
+        return None if ignore_case else (frozenset(), True)
+    if ignore_case and char.isalpha():
+        return frozenset((char.lower(), char.upper())), True
+    return frozenset(char), False
+
+
+def _range_first_chars(bounds, ignore_case):
+    low, high = bounds
+    if ignore_case and high >= 128:
+        return None
+    chars = frozenset(unichr(c) for c in range(low, min(high, 127) + 1))
+    non_ascii = high >= 128
+    if ignore_case and any(c.isalpha() for c in chars):
+        chars = chars.union(c.swapcase() for c in chars)
+        non_ascii = True
+    return chars, non_ascii
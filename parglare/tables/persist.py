@@ -21,7 +21,7 @@ def save_table(file_name, table):
 def table_from_serializable(serialized_states, grammar):
     """Convert serializable representation of a parsing table into
     LRTable object."""
-    from parglare.tables import LRState, LRTable, Action
+    from parglare.tables import LRState, LRTable, Action, FirstCharIndex
 
     states = []
     states_dict = {}
@@ -32,6 +32,7 @@ def table_from_serializable(serialized_states, grammar):
         state.finish_flags = json_state['finish_flags']
         state.actions = json_state['actions']
         state.gotos = json_state['gotos']
+        state.first_chars = json_state.get('first_chars')
         states.append(state)
 
     # Unpack actions and gotos
@@ -63,6 +64,12 @@ def table_from_serializable(serialized_states, grammar):
                 states_dict[goto_state]
         state.gotos = gotos
 
+        json_first_chars = state.first_chars
+        if json_first_chars is not None:
+            state.first_chars = FirstCharIndex(
+                list(actions), json_first_chars['chars'],
+                json_first_chars['any'], json_first_chars['non_ascii'])
+
     table = LRTable(states, calc_finish_flags=False)
 
     return table
@@ -84,6 +91,7 @@ def _dump_state(state):
     s['gotos'] = [[nonterminal.fqn, st.state_id]
                   for nonterminal, st in goto_items]
     s['finish_flags'] = state.finish_flags
+    s['first_chars'] = _dump_first_chars(state)
 
     return s
 
@@ -100,3 +108,14 @@ def _dump_actions(actions):
         alist.append(a)
 
     return alist
+
+
+def _dump_first_chars(state):
+    first_chars = state.first_chars
+    if first_chars is None:
+        # Index is trivial. Save it anyway so that it is not calculated on
+        # load.
+        return {'chars': {}, 'any': list(range(len(state.actions))),
+                'non_ascii': list(range(len(state.actions)))}
+    return {'chars': first_chars.chars, 'any': first_chars.any,
+            'non_ascii': first_chars.non_ascii}
@@ -1,3 +1,5 @@
+colors = False
+
 S_ATTENTION = {'fg': 'red', 'bold': True}
 S_HEADER = {'fg': 'green'}
 S_EMPH = {'fg': 'yellow'}
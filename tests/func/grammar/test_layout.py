@@ -231,3 +231,133 @@ def test_layout_terminal():
         parser.parse("a b")
     result = parser.parse("4444a23b545")
     assert result == ['a', 'b']
+
+
+@parsers
+@pytest.mark.parametrize("layout", [
+    r"""
+    LAYOUT: LayoutItem | LAYOUT LayoutItem;
+    LayoutItem: WS | Comment | EMPTY;
+    """,
+    r"""
+    LAYOUT: LayoutItem*;
+    LayoutItem: WS | Comment;
+    """,
+    r"""
+    LAYOUT: LayoutItem LAYOUT | EMPTY;
+    LayoutItem: WS | Comment;
+    """,
+])
+def test_layout_regex(parser_class, layout):
+    """
+    Test that regular layouts are matched by a regex instead of the layout
+    parser.
+    """
+    grammar = r"""
+    S: K EOF;
+    K: A | B;
+    A: 'a' A | 'a';
+    B: 'b' B | 'b';
+    """ + layout + r"""
+    terminals
+    WS: /\s+/;
+    Comment: /\/\/.*/;
+    """
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g)
+    assert parser.layout_regex is not None
+    assert parser.layout_regex.pattern == \
+        r'(?:(?:(?:\s+)|(?:\/\/.*)))*'
+
+    in_str = """aaa a    aaaa
+    aa    aa a aaa // This is a comment
+    // Another comment
+    aaa
+    """
+
+    contents = []
+
+    def a_action(context, _):
+        contents.append(context.layout_content)
+
+    parser = parser_class(g, actions={'a': a_action})
+    parser.parse(in_str)
+
+    # Layout content is the same as found by the layout parser.
+    regex_contents = contents
+    contents = []
+    parser.layout_regex = None
+    parser.parse(in_str)
+    assert contents == regex_contents
+    assert any('// Another comment' in x for x in contents)
+
+
+def test_layout_regex_not_used():
+    """
+    Test that layout parser is used for context-free layouts, layouts
+    that would need backtracking and if layout actions are given.
+    """
+    grammar = r"""
+    S: 'a'+;
+    LAYOUT: LayoutItem | LAYOUT LayoutItem;
+    LayoutItem: WS | Comment | EMPTY;
+    Comment: '/*' CorNCs '*/' | LineComment;
+    CorNCs: CorNC | CorNCs CorNC | EMPTY;
+    CorNC: Comment | NotComment | WS;
+
+    terminals
+    WS: /\s+/;
+    LineComment: /\/\/.*/;
+    NotComment: /((\*[^\/])|[^\s*\/]|\/[^\*])+/;
+    """
+    g = Grammar.from_string(grammar)
+    assert Parser(g).layout_regex is None
+
+    # Both items may start with a newline.
+    grammar = r"""
+    S: 'a'+;
+    LAYOUT: LayoutItem*;
+    LayoutItem: WS | NL;
+
+    terminals
+    WS: /\s+/;
+    NL: /\n/;
+    """
+    g = Grammar.from_string(grammar)
+    assert Parser(g).layout_regex is None
+
+    # Comment must be followed by a newline.
+    grammar = r"""
+    S: 'a'+;
+    LAYOUT: LayoutItem*;
+    LayoutItem: WS | Comment NL;
+
+    terminals
+    WS: /[ \t]+/;
+    Comment: /#[^\n]*/;
+    NL: /\n/;
+    """
+    g = Grammar.from_string(grammar)
+    assert Parser(g).layout_regex is None
+
+    grammar = r"""
+    S: 'a'+;
+    LAYOUT: LayoutItem*;
+    LayoutItem: WS | Comment;
+
+    terminals
+    WS: /\s+/;
+    Comment: /#.*/;
+    """
+    g = Grammar.from_string(grammar)
+    assert Parser(g).layout_regex is not None
+
+    comments = []
+
+    def comment(_, value):
+        comments.append(value)
+
+    parser = Parser(g, layout_actions={'Comment': comment})
+    assert parser.layout_regex is None
+    parser.parse('a #first\na #second\n')
+    assert comments == ['#first', '#second']
@@ -45,3 +45,49 @@ def test_whitespace_not_used_if_layout():
     parser = Parser(g)
     with pytest.raises(ParseError):
         parser.parse('a b')
+
+
+def test_whitespace_special_regex_chars():
+    """
+    Test that ws characters which are special in regexes are skipped
+    literally.
+    """
+    grammar = get_grammar()
+    p = Parser(grammar, ws=' ]^-\\')
+
+    p.parse("""id+ ]^ id * (id -\\ +id  ) """)
+
+    with pytest.raises(ParseError) as e:
+        p.parse("""id+ ]^ id * (id .+id  )""")
+    assert e.value.location.start_position == 16
+
+
+def test_layout_content_ahead():
+
+    grammar = get_grammar()
+    layout = []
+
+    def id_action(context, value):
+        layout.append(context.layout_content)
+
+    p = Parser(grammar, actions={'id': id_action})
+    p.parse("""id+  id * (\n\tid +id)""")
+    assert layout == ['', '  ', '\n\t', '']
+
+
+def test_whitespace_non_textual_input():
+
+    grammar = """
+    S: item+;
+
+    terminals
+    item:;
+    """
+
+    def item(input, pos):
+        if input[pos] == 'a':
+            return input[pos:pos + 1]
+
+    g = Grammar.from_string(grammar, recognizers={'item': item})
+    p = Parser(g, ws=['\n'])
+    assert p.parse(['a', '\n', '\n', 'a']) == [['a'], ['a']]
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Test parsing of input read from asyncio streams.
+"""
+import asyncio
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParseError
+
+
+grammar = r"""
+Model: Statement* EOF;
+Statement: ID '=' Expr ';';
+Expr: Expr '+' Expr {left} | INT | STRING | ID;
+
+terminals
+INT: /\d+/;
+STRING: /"[^"]*"/;
+ID: /[a-zA-Z_]\w*/;
+"""
+
+input_str = '''
+a = 1 + 2;
+bb = "a čćž string" + a;
+ccc = 33 + "x";
+'''
+
+
+async def chunks(data, size):
+    for idx in range(0, len(data), size):
+        await asyncio.sleep(0)
+        yield data[idx:idx + size]
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_parse_async_stream_reader(parser_class):
+
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g)
+    expected = parser.parse(input_str)
+
+    async def parse():
+        reader = asyncio.StreamReader()
+        reader.feed_data(input_str.encode('utf-8'))
+        reader.feed_eof()
+        return await parser.parse_async(reader, chunk_size=5)
+
+    assert asyncio.run(parse()) == expected
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_parse_async_iterable(parser_class):
+
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g)
+    expected = parser.parse(input_str)
+
+    async def parse(size):
+        return await parser.parse_async(chunks(input_str, size))
+
+    for size in [1, 7, 1000]:
+        assert asyncio.run(parse(size)) == expected
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_parse_async_gives_control_back(parser_class):
+    """
+    Test that other tasks run while a large input is parsed.
+    """
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g)
+    statements = 'a = 1 + b;\n' * 200
+    expected = parser.parse(statements)
+
+    async def ticker(ticks):
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0)
+
+    async def parse(**kwargs):
+        ticks = []
+        task = asyncio.ensure_future(ticker(ticks))
+        result = await parser.parse_async(chunks(statements, 10**6),
+                                          **kwargs)
+        task.cancel()
+        return result, len(ticks)
+
+    result, ticks = asyncio.run(parse(steps=100))
+    assert result == expected
+    # 1200 tokens parsed 100 at a time.
+    assert ticks >= 12
+
+    result, ticks = asyncio.run(parse(steps=10**6, time_slice=0))
+    assert result == expected
+    assert ticks >= 1200
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_session_resume(parser_class):
+
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g)
+    expected = parser.parse(input_str)
+
+    session = parser.start()
+    session.window.feed(input_str)
+    resumes = 1
+    while session.resume(steps=2):
+        resumes += 1
+    # Parser waits for more input before the last token.
+    assert resumes >= 8
+    assert session.finish() == expected
+
+
+def test_parse_async_error():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+
+    async def parse():
+        return await parser.parse_async(chunks('a = 1 + ;', 3))
+
+    with pytest.raises(ParseError) as e:
+        asyncio.run(parse())
+    assert e.value.location.position == 8
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Test calling of actions over parse trees.
+"""
+from __future__ import unicode_literals
+import sys
+import pytest  # noqa
+from parglare import Grammar, Parser, NodeTerm, NodeNonTerm
+
+
+grammar = r"""
+Program: Statements EOF;
+Statements: Statement Statements | EMPTY;
+Statement: name=ID '=' values=Value+[Comma] ';';
+Value: INT | ID;
+
+terminals
+ID: /[a-z]+/;
+INT: /\d+/;
+Comma: ',';
+"""
+
+actions = {
+    'INT': lambda _, value: int(value),
+}
+
+
+def statements(count):
+    return '\n'.join('{} = {}, {};'.format('abc'[idx % 3] * (idx % 5 + 1),
+                                           idx, 'abc'[idx % 3])
+                     for idx in range(count))
+
+
+def flatten(statements):
+    items = []
+    while statements:
+        items.append(statements[0])
+        statements = statements[1]
+    return items
+
+
+@pytest.mark.parametrize('build_tree', [True, 'compact'])
+def test_call_actions(build_tree):
+
+    g = Grammar.from_string(grammar)
+    input_str = statements(20)
+    expected = Parser(g, actions=actions).parse(input_str)
+
+    parser = Parser(g, actions=actions, build_tree=build_tree)
+    tree = parser.parse(input_str)
+    result = parser.call_actions(tree)
+
+    assert len(result) == 2
+    assert type(result) is type(expected)
+
+    got, exp = flatten(result[0]), flatten(expected[0])
+    assert [(s.name, s.values) for s in got] == \
+        [(s.name, s.values) for s in exp]
+    assert got[3].values == [3, 'a']
+
+
+def test_call_actions_deep_tree():
+    """
+    Test that the depth of the tree is not limited by the recursion limit.
+    """
+
+    g = Grammar.from_string(grammar)
+    count = sys.getrecursionlimit() * 2
+    parser = Parser(g, actions=actions, build_tree=True)
+    tree = parser.parse(statements(count))
+
+    result = parser.call_actions(tree)
+    assert len(flatten(result[0])) == count
+
+
+def test_call_actions_order():
+    """
+    Test that children are visited right to left, bottom up.
+    """
+
+    g = Grammar.from_string(grammar)
+    calls = []
+
+    def act_int(_, value):
+        calls.append(value)
+        return int(value)
+
+    parser = Parser(g, actions={'INT': act_int}, build_tree=True)
+    parser.call_actions(parser.parse('a = 1, 2; b = 3;'))
+    assert calls == ['3', '2', '1']
+
+
+def test_call_actions_visitor():
+
+    g = Grammar.from_string(grammar)
+    input_str = statements(50)
+    parser = Parser(g, actions=actions, build_tree=True)
+    tree = parser.parse(input_str)
+    expected = parser.call_actions(parser.parse(input_str))
+
+    names = []
+    visited = []
+
+    def visitor(node, result):
+        assert isinstance(node, (NodeTerm, NodeNonTerm))
+        if node.symbol.name == 'Statement':
+            names.append(result.name)
+            # Statement is processed so its subtree is released.
+            assert node.children == []
+        visited.append(node)
+
+    result = parser.call_actions(tree, visitor=visitor, release=True)
+    assert visited[-1] is tree
+    assert tree.children == []
+    assert len(flatten(result[0])) == 50
+    assert names == [s.name for s in reversed(flatten(expected[0]))]
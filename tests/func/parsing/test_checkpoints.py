@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Test resuming of parsing of growing input from checkpoints.
+"""
+from __future__ import unicode_literals
+import pickle
+import pytest  # noqa
+from parglare import Grammar, Parser, ParseError, ParserInitError
+
+
+grammar = r"""
+Log: Entry* EOF;
+Entry: Time Level Message;
+Time: INT ':' INT;
+Level: 'INFO' | 'ERROR';
+
+terminals
+INT: /\d+/;
+Message: /"[^"]*"/;
+"""
+
+log = '''
+10:01 INFO "started"
+10:02 ERROR "failed"
+10:03 INFO "retry"
+'''
+
+
+def test_checkpoints():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, checkpoints=['Entry'])
+    result = parser.parse(log)
+
+    checkpoint = parser.last_checkpoint
+    # Last entry is reduced on EOF which may change if the input grows.
+    assert checkpoint.position == log.index('\n10:03')
+
+    new_log = log + '10:04 INFO "done"\n'
+    expected = parser.parse(new_log)
+    assert expected[0][:3] == result[0]
+
+    assert parser.parse(new_log, resume_from=checkpoint) == expected
+
+
+def test_checkpoints_incomplete_input():
+    """
+    Test that parsing can be resumed after an error at the end of the input
+    which is not complete yet.
+    """
+    calls = []
+
+    def entry(_, nodes):
+        calls.append(nodes[2])
+        return nodes[2]
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, checkpoints=['Entry'], actions={'Entry': entry})
+
+    with pytest.raises(ParseError):
+        parser.parse(log + '10:04 INFO "do')
+    # Entry before the incomplete entry is stable.
+    checkpoint = parser.last_checkpoint
+    assert checkpoint.position == len(log) - 1
+
+    del calls[:]
+    result = parser.parse(log + '10:04 INFO "done"',
+                          resume_from=checkpoint)
+    assert result == [['"started"', '"failed"', '"retry"', '"done"'], None]
+    # Only entries after the checkpoint are parsed again.
+    assert calls == ['"done"']
+
+
+def test_checkpoints_pickle():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, checkpoints=['Entry'])
+    parser.parse(log)
+    checkpoint = pickle.loads(pickle.dumps(parser.last_checkpoint))
+
+    # A new parser for the same grammar, e.g. after a process restart.
+    parser = Parser(Grammar.from_string(grammar), checkpoints=['Entry'])
+    new_log = log + '10:04 INFO "done"\n'
+    assert parser.parse(new_log, resume_from=checkpoint) == \
+        parser.parse(new_log)
+
+    # Without new stable checkpoints the given one is kept.
+    parser.parse(log, resume_from=checkpoint)
+    assert parser.last_checkpoint is checkpoint
+
+
+def test_checkpoints_init_errors():
+
+    g = Grammar.from_string(grammar)
+    with pytest.raises(ParserInitError):
+        Parser(g, checkpoints=['Unknown'])
+    with pytest.raises(ParserInitError):
+        Parser(g, checkpoints=['Entry'], build_tree=True)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Test generation of standalone parser modules.
+"""
+from __future__ import unicode_literals
+import os
+import pytest
+from parglare import Grammar, Parser, GLRParser, ParseError, ParserInitError
+from parglare.actions import no_context
+from parglare.codegen import generate_parser, write_parser
+from parglare.common import load_python_module
+import parglare.tables
+
+
+grammar = r"""
+Model: Statement* EOF;
+Statement: ID '=' Expr ';' | 'print' Expr+[Comma] ';';
+Expr: Expr '+' Expr {left, 1}
+    | Expr '*' Expr {left, 2}
+    | '(' Expr ')'
+    | INT | FLOAT | STRING | ID;
+
+LAYOUT: LayoutItem*;
+LayoutItem: WS | Comment;
+
+terminals
+INT: /\d+/ {prefer};
+FLOAT: /\d+(\.\d*)?/;
+STRING: /"[^"]*"/;
+ID: /[a-zA-Z_]\w*/;
+WS: /\s+/;
+Comment: /\/\/.*/;
+Comma: ',';
+"""
+
+input_str = '''
+a = 1 + 2 * (3.5 + 4); // comment
+print "a", a * 2;
+'''
+
+
+@no_context
+def number(_, value):
+    return float(value)
+
+
+def expression(context, nodes):
+    return ('Expr', context.start_position, context.end_position, nodes)
+
+
+def generated_parser(tmpdir, parser, name='generated_parser'):
+    file_name = os.path.join(str(tmpdir), '{}.py'.format(name))
+    write_parser(parser, file_name)
+    return load_python_module(name, file_name)
+
+
+def test_generated_parser(tmpdir):
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+    module = generated_parser(tmpdir, parser)
+
+    assert module.parse(input_str) == parser.parse(input_str)
+
+
+def test_generated_parser_actions(tmpdir):
+
+    g = Grammar.from_string(grammar)
+    actions = {'INT': number, 'FLOAT': number, 'Expr': expression}
+    parser = Parser(g, actions=actions)
+    module = generated_parser(tmpdir, parser)
+
+    result = parser.parse(input_str)
+    assert module.parse(input_str) == result
+    assert result[0][0][2] == ('Expr', 5, 22, [
+        ('Expr', 5, 6, [1.0]), '+',
+        ('Expr', 9, 22, [('Expr', 9, 10, [2.0]), '*',
+                         ('Expr', 13, 22, ['(', ('Expr', 14, 21, [
+                             ('Expr', 14, 17, [3.5]), '+',
+                             ('Expr', 20, 21, [4.0])]), ')'])])])
+
+    # Actions may be overridden when parsing.
+    assert module.parse('a = 1;', actions={'INT': lambda _, v: int(v)}) \
+        == [[['a', '=', ('Expr', 4, 5, [1]), ';']], None]
+
+
+def test_generated_parser_required_actions(tmpdir):
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions={'INT': lambda _, value: int(value)})
+    module = generated_parser(tmpdir, parser)
+
+    with pytest.raises(ParserInitError) as e:
+        module.parse(input_str)
+    assert 'Action for "INT" must be given' in str(e.value)
+
+    assert module.parse('a = 1;', actions={'INT': number}) \
+        == [[['a', '=', 1.0, ';']], None]
+
+
+def test_generated_parser_errors(tmpdir):
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+    module = generated_parser(tmpdir, parser)
+
+    for invalid in ['a = 1 +\n  ;', 'a = 1 2;', 'a = 1']:
+        with pytest.raises(ParseError) as e:
+            parser.parse(invalid)
+        with pytest.raises(ParseError) as generated_e:
+            module.parse(invalid)
+        assert str(generated_e.value) == str(e.value)
+        assert generated_e.value.location.line == e.value.location.line
+        assert generated_e.value.location.column == e.value.location.column
+
+
+def test_generated_parser_doesnt_build_table(tmpdir, monkeypatch):
+
+    g = Grammar.from_string(grammar)
+    file_name = os.path.join(str(tmpdir), 'generated_parser.py')
+    write_parser(Parser(g), file_name)
+
+    def create_table(*args, **kwargs):
+        assert False, 'Table must not be created.'
+
+    monkeypatch.setattr(parglare.tables, 'create_table', create_table)
+    module = load_python_module('generated_parser', file_name)
+    assert module.parse('print 1;') == [[['print', ['1'], ';']], None]
+
+
+def test_generated_parser_source_is_deterministic():
+
+    g = Grammar.from_string(grammar)
+    source = generate_parser(Parser(g))
+    g = Grammar.from_string(grammar)
+    assert generate_parser(Parser(g)) == source
+
+
+def test_generated_parser_unsupported():
+
+    g = Grammar.from_string(grammar)
+    with pytest.raises(ParserInitError):
+        generate_parser(GLRParser(g))
+    with pytest.raises(ParserInitError):
+        generate_parser(Parser(g, build_tree=True))
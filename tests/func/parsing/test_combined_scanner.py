@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Test combined regex scanner mode.
+"""
+from __future__ import unicode_literals
+import os
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParseError
+from parglare.scanner import StateScanner
+
+
+grammar = r"""
+Model: Statement+ EOF;
+Statement: 'if' Expr 'then' Statement 'end' | ID '=' Expr ';';
+Expr: Expr '+' Expr {left} | Expr '==' Expr {left} | Value | '(' Expr ')';
+Value: INT | FLOAT | ID | Special | Nocase;
+
+terminals
+KEYWORD: /\w+/;
+INT: /\d+/;
+FLOAT: /\d+\.\d+/ {15};
+ID: /[a-zA-Z_]\w*/;
+Special:;
+Nocase: 'nocase';
+"""
+
+INPUT = """
+a = 3 + 4.5;
+if a == 7.5 then
+    b = (a + 1) + $$ + nocase;
+end
+"""
+
+
+def special(input, pos):
+    if input[pos:pos+2] == '$$':
+        return '$$'
+
+
+def test_combined_scanner_same_result():
+
+    g = Grammar.from_string(grammar, recognizers={'Special': special})
+    tree = Parser(g, build_tree=True).parse(INPUT)
+    combined_tree = Parser(g, build_tree=True,
+                           combined_scanner=True).parse(INPUT)
+
+    assert combined_tree.tree_str() == tree.tree_str()
+
+
+def test_combined_scanner_glr():
+
+    g = Grammar.from_string(grammar, recognizers={'Special': special})
+
+    results = GLRParser(g, build_tree=True).parse(INPUT)
+    combined_results = GLRParser(g, build_tree=True,
+                                 combined_scanner=True).parse(INPUT)
+
+    assert len(combined_results) == len(results) == 2
+    assert sorted(r.tree_str() for r in combined_results) == \
+        sorted(r.tree_str() for r in results)
+
+
+def test_combined_scanner_entries():
+    """
+    Test that custom recognizers are not combined.
+    """
+
+    g = Grammar.from_string(grammar, recognizers={'Special': special})
+    parser = Parser(g, combined_scanner=True)
+
+    for state in parser.table.states:
+        scanner = parser.scanners[state.state_id]
+        assert isinstance(scanner, StateScanner)
+        assert [e[0] for e in scanner.entries] == list(state.actions)
+        for symbol, _, recognizer, pattern in scanner.entries:
+            if symbol.name == 'Special':
+                assert recognizer is symbol.recognizer
+                assert pattern is None
+            elif symbol.name in ['EOF', 'STOP', 'EMPTY']:
+                assert recognizer is None
+                assert pattern is None
+            else:
+                assert recognizer is None
+                assert pattern is not None
+
+
+def test_combined_scanner_ignore_case():
+    """
+    Test that ignore case string recognizers are not combined and that ignore
+    case regexes are.
+    """
+
+    g = Grammar.from_string(grammar, recognizers={'Special': special},
+                            ignore_case=True)
+    parser = Parser(g, build_tree=True, combined_scanner=True)
+
+    for state in parser.table.states:
+        for symbol, _, recognizer, pattern in \
+                parser.scanners[state.state_id].entries:
+            if symbol.name in ['INT', 'FLOAT', 'ID']:
+                assert pattern is not None
+            elif symbol.name in ['=', '+']:
+                assert recognizer is symbol.recognizer
+
+    upper_input = INPUT.upper()
+    assert parser.parse(upper_input).tree_str() == \
+        Parser(g, build_tree=True).parse(upper_input).tree_str()
+
+
+def test_combined_scanner_priority_and_finish():
+
+    grammar = r"""
+    S: M EOF;
+    M: First | Second  | Third "5";
+
+    terminals
+    First: /\d+\.75/;
+    Second: '14.75';
+    Third: /\d+\.\d/ {15};
+    """
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, build_tree=True, combined_scanner=True)
+
+    # Third has the highest priority and wins even if it is not the longest.
+    tree = parser.parse('14.75')
+    assert tree.children[0].children[0].symbol.name == 'Third'
+
+
+def test_combined_scanner_regex_groups():
+    """
+    Test that regexes with groups are combined correctly.
+    """
+
+    grammar = r"""
+    S: Element+ EOF;
+    Element: A | B | C;
+
+    terminals
+    A: /(a|b)+(c)?/;
+    B: /(x)(y)/;
+    C: /(?P<z>z)(?P=z)/;
+    """
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, combined_scanner=True)
+
+    assert parser.parse('abcxyzzab') == [['abc', 'xy', 'zz', 'ab'], None]
+
+
+def test_combined_scanner_parse_error():
+
+    g = Grammar.from_string(grammar, recognizers={'Special': special})
+    parser = Parser(g, combined_scanner=True)
+
+    with pytest.raises(ParseError) as e:
+        parser.parse('a = 3 + ;')
+
+    assert 'Expected: ( or FLOAT or ID or INT or Nocase or Special' in str(e)
+
+
+def test_combined_scanner_rhapsody():
+
+    this_folder = os.path.dirname(__file__)
+    g = Grammar.from_file(os.path.join(this_folder, '..', '..', 'perf',
+                                       'rhapsody.pg'))
+    with open(os.path.join(this_folder, '..', '..', 'perf', 'test_inputs',
+                           'LightSwitch.rpy')) as f:
+        content = f.read()
+
+    assert Parser(g, combined_scanner=True).parse(content) == \
+        Parser(g).parse(content)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Test parse trees kept in arrays (`build_tree='compact'`).
+"""
+from __future__ import unicode_literals
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParserInitError, \
+    NodeTerm, NodeNonTerm
+from parglare.compact import CompactTree
+
+
+grammar = r"""
+Program: Statement* EOF;
+Statement: ID '=' E ';' | ';';
+E: E '+' E {left} | E '*' E {left, 2} | '(' E ')' | number | ID;
+
+LAYOUT: LayoutItem | LAYOUT LayoutItem | EMPTY;
+LayoutItem: WS | Comment;
+
+terminals
+ID: /[a-z]+/;
+number: /\d+/;
+WS: /\s+/;
+Comment: /#[^\n]*/;
+"""
+
+actions = {
+    'Program': lambda _, nodes: nodes[0],
+    'Statement': [lambda _, nodes: (nodes[0], nodes[2]),
+                  lambda _, nodes: None],
+    'E': [lambda _, nodes: nodes[0] + nodes[2],
+          lambda _, nodes: nodes[0] * nodes[2],
+          lambda _, nodes: nodes[1],
+          lambda _, nodes: nodes[0],
+          lambda _, nodes: 1],
+    'number': lambda _, value: int(value),
+}
+
+input_str = '''
+# first
+a = 2 * (3 + x);
+ ;
+b = 4 + 5 * 6;  # last
+'''
+
+
+def nodes(node):
+    yield node
+    for child in node:
+        for n in nodes(child):
+            yield n
+
+
+def test_compact_tree():
+
+    g = Grammar.from_string(grammar)
+    tree = Parser(g, build_tree=True).parse(input_str)
+    compact = Parser(g, build_tree='compact').parse(input_str)
+
+    assert isinstance(compact, NodeNonTerm)
+    assert isinstance(compact.tree, CompactTree)
+    assert compact.tree_str() == tree.tree_str()
+    assert str(compact) == str(tree)
+    assert len(compact.tree) == len(list(nodes(tree)))
+    assert compact.tree.root == len(compact.tree) - 1
+
+    for node, compact_node in zip(nodes(tree), nodes(compact)):
+        assert type(compact_node).__bases__[1] is type(node)
+        assert compact_node.symbol is node.symbol
+        assert compact_node.start_position == node.start_position
+        assert compact_node.end_position == node.end_position
+        assert compact_node.layout_content == node.layout_content
+        if isinstance(node, NodeTerm):
+            assert compact_node.value == node.value
+            assert compact_node.token.symbol is node.token.symbol
+            assert compact_node.token.value == node.token.value
+        else:
+            assert compact_node.production is node.production
+            assert len(compact_node.children) == len(node.children)
+            assert list(reversed(compact_node)) == \
+                list(reversed(compact_node.children))
+
+    # Views of the same node are equal.
+    statements = [n for n in nodes(compact) if n.symbol.name == 'Statement']
+    assert statements[0] == compact.tree.node(statements[0].index)
+    assert statements[0] != statements[1]
+    assert len(set(statements + list(nodes(compact)))) == len(compact.tree)
+    assert [s.layout_content for s in statements] == ['\n# first\n',
+                                                      '\n ', '\n']
+    assert statements[0].state is None
+
+
+def test_compact_tree_actions():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions=actions, build_tree='compact')
+    tree = parser.parse(input_str)
+    assert parser.call_actions(tree) == Parser(g, actions=actions).parse(
+        input_str)
+
+    # Actions called during tree building get views of the child nodes.
+    statements = []
+
+    def act_statement(_, nodes):
+        assert all(isinstance(n, (NodeTerm, NodeNonTerm)) for n in nodes)
+        statements.append(nodes[0].value)
+
+    parser = Parser(g, actions={'Statement': [act_statement, act_statement]},
+                    build_tree='compact', call_actions_during_tree_build=True)
+    assert parser.parse(input_str).tree_str() == tree.tree_str()
+    assert statements == ['a', ';', 'b']
+
+
+def test_compact_tree_token_values():
+    """
+    Test token values which are not the parts of the input.
+    """
+
+    g = Grammar.from_string(r"""
+    S: A+ EOF;
+    terminals
+    A: /a/;
+    """)
+
+    def recovery(context, error):
+        # Introduce the missing `a` token instead of `b`.
+        from parglare.parser import Token
+        return Token(g.get_terminal('A'), 'introduced', 1), \
+            context.position + 1
+
+    parser = Parser(g, build_tree='compact', error_recovery=recovery)
+    tree = parser.parse('a b a')
+    assert [n.value for n in nodes(tree) if n.symbol.name == 'A'] == \
+        ['a', 'introduced', 'a']
+    assert len(parser.errors) == 1
+
+    expected = Parser(g, build_tree=True, error_recovery=recovery).parse(
+        'a b a')
+    assert tree.tree_str() == expected.tree_str()
+    assert [n.layout_content for n in nodes(tree)] == \
+        [n.layout_content for n in nodes(expected)]
+
+
+def test_compact_tree_unsupported():
+
+    g = Grammar.from_string(grammar)
+    with pytest.raises(ParserInitError, match='only by the LR parser'):
+        GLRParser(g, build_tree='compact')
+
+    parser = Parser(g, build_tree='compact')
+    tree = parser.parse(input_str)
+    with pytest.raises(ParserInitError, match='compact trees'):
+        parser.reparse(tree, input_str, [])
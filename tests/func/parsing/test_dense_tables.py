@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Test integer-indexed action/goto tables used by the parsers.
+"""
+from __future__ import unicode_literals
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser
+from parglare.grammar import AUGSYMBOL, STOP, EMPTY, EOF
+
+
+grammar = r"""
+E: E '+' E {left, 1} | E '*' E {left, 2} | '(' E ')' | number;
+
+terminals
+number: /\d+/;
+"""
+
+
+def test_symbol_ids():
+
+    g = Grammar.from_string(grammar)
+
+    assert (STOP.term_id, EMPTY.term_id, EOF.term_id) == (0, 1, 2)
+    assert AUGSYMBOL.nonterm_id == 0
+
+    term_ids = [t.term_id for t in g.terminals.values()]
+    assert sorted(term_ids) == list(range(len(term_ids)))
+    nonterm_ids = [n.nonterm_id for n in g.nonterminals.values()]
+    assert sorted(nonterm_ids) == list(range(len(nonterm_ids)))
+
+
+def test_dense_tables_match_dicts():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+
+    for state in parser.table.states:
+        for symbol in g.terminals.values():
+            assert state.actions_by_id[symbol.term_id] \
+                is state.actions.get(symbol)
+        for symbol in g.nonterminals.values():
+            if symbol.nonterm_id < len(state.gotos_by_id):
+                assert state.gotos_by_id[symbol.nonterm_id] \
+                    is state.gotos.get(symbol)
+            else:
+                assert symbol not in state.gotos
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_dense_tables_parse(parser_class):
+
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g)
+
+    result = parser.parse('1 + 2 * (3 + 4)')
+    expected = ['1', '+', ['2', '*', ['(', ['3', '+', '4'], ')']]]
+    if parser_class is GLRParser:
+        assert expected in result
+    else:
+        assert result == expected
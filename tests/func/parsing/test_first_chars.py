@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Test first character indexes of terminals used to skip recognizers.
+"""
+from __future__ import unicode_literals
+import os
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParseError
+from parglare.grammar import StringRecognizer, RegExRecognizer
+from parglare.tables import FirstCharIndex
+from parglare.tables.first_chars import first_chars
+
+
+grammar = r"""
+Model: Statement+ EOF;
+Statement: ID '=' Expr ';' | 'print' Expr ';';
+Expr: Expr '+' Expr {left} | INT | FLOAT | STRING | ID;
+
+terminals
+INT: /\d+/;
+FLOAT: /\d+\.\d*|\.\d+/;
+STRING: /"[^"]*"/;
+ID: /[a-zA-Z_]\w*/;
+"""
+
+
+def test_first_chars_of_strings():
+    assert first_chars(StringRecognizer('abc')) == (frozenset('a'), False)
+    assert first_chars(StringRecognizer('čaj')) == (frozenset(), True)
+    chars, non_ascii = first_chars(StringRecognizer('Abc', ignore_case=True))
+    assert chars == frozenset('aA')
+    assert non_ascii
+    assert first_chars(StringRecognizer('')) is None
+
+
+def test_first_chars_of_regexes():
+    def regex_chars(regex, ignore_case=False):
+        return first_chars(RegExRecognizer(regex, ignore_case=ignore_case))
+
+    assert regex_chars(r'\d+') == (frozenset('0123456789'), True)
+    assert regex_chars(r'[a-c]x|y') == (frozenset('abcy'), False)
+    assert regex_chars(r'(ab)?c') == (frozenset('ac'), False)
+    assert regex_chars(r'\bif\b') == (frozenset('i'), False)
+    assert regex_chars(r'x', ignore_case=True) == (frozenset('xX'), True)
+
+    # Regexes which may match on any character or empty string.
+    assert regex_chars(r'.') == (regex_chars(r'.')[0], True)
+    assert len(regex_chars(r'[^a]')[0]) == 128
+    assert regex_chars(r'a*') is None
+    assert regex_chars(r'(?i:a)b') is None
+
+
+def test_first_char_index_structure():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+
+    state = next(s for s in parser.table.states
+                 if s.first_chars is not None and
+                 set(t.name for t in s.actions) ==
+                 {'INT', 'FLOAT', 'STRING', 'ID'})
+    index = state.first_chars
+    assert isinstance(index, FirstCharIndex)
+
+    def names(char):
+        return set(index.symbols[idx].name
+                   for idx in index.candidates(char, 0))
+
+    assert names('1') == {'INT', 'FLOAT'}
+    assert names('.') == {'FLOAT'}
+    assert names('"') == {'STRING'}
+    assert names('a') == {'ID'}
+    assert names('+') == set()
+    assert names('') == set()
+    assert names('č') == {'INT', 'FLOAT'}
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_first_char_index_parse(parser_class):
+
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g)
+
+    input_str = 'a = 1 + .5 + 3.; print "s" + a;'
+    result = parser.parse(input_str)
+    if parser_class is GLRParser:
+        assert len(result) == 1
+        result = result[0]
+    assert result[0][0][2][0][2] == '.5'
+
+    with pytest.raises(ParseError) as e:
+        parser.parse('a = 1 + @;')
+    assert 'Expected: FLOAT or ID or INT or STRING' in str(e.value)
+
+
+def test_first_char_index_with_custom_recognizers():
+    """
+    Test that terminals with custom recognizers are always tried.
+    """
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+    state = next(s for s in parser.table.states
+                 if s.first_chars is not None and
+                 'INT' in set(t.name for t in s.actions))
+    index = FirstCharIndex.from_state(state)
+    assert index.is_valid_for(state)
+
+    def int_recognizer(input, pos):
+        if input[pos:pos + 2] == '#1':
+            return '#1'
+
+    g = Grammar.from_string(grammar, recognizers={'INT': int_recognizer})
+    parser = Parser(g)
+    assert parser.parse('a = #1 + a;')
+    state = next(s for s in parser.table.states
+                 if 'INT' in set(t.name for t in s.actions))
+    assert not index.is_valid_for(state)
+
+
+def test_first_char_index_persistence(tmpdir):
+
+    grammar_file = os.path.join(str(tmpdir), 'first_chars.pg')
+    with open(grammar_file, 'w') as f:
+        f.write(grammar)
+
+    g = Grammar.from_file(grammar_file)
+    parser = Parser(g)
+    assert os.path.exists(os.path.join(str(tmpdir), 'first_chars.pgt'))
+
+    g = Grammar.from_file(grammar_file)
+    loaded_parser = Parser(g, force_load_table=True)
+
+    for state, loaded_state in zip(parser.table.states,
+                                   loaded_parser.table.states):
+        if state.first_chars is None:
+            assert loaded_state.first_chars is None
+            continue
+        assert state.first_chars.chars == loaded_state.first_chars.chars
+        assert state.first_chars.any == loaded_state.first_chars.any
+        assert state.first_chars.non_ascii == \
+            loaded_state.first_chars.non_ascii
+
+    assert loaded_parser.parse('a = 1 + .5; print a;')
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Test sharing of token recognition and layout skipping results between GLR
+heads.
+"""
+from __future__ import unicode_literals
+from parglare import Grammar, GLRParser
+
+
+# After the first number both reductions are done and the resulting heads
+# shift '+' to different states so there are two heads at the same position
+# looking for the next token.
+grammar = r"""
+S: A '+' number | B '+' number+;
+A: number;
+B: number;
+
+terminals
+number: /\d+/;
+"""
+
+
+def number_with_context(context, input, pos):
+    end = pos
+    while input[end:end + 1].isdigit():
+        end += 1
+    return input[pos:end]
+
+
+def test_token_cache():
+
+    g = Grammar.from_string(grammar)
+    parser = GLRParser(g)
+
+    results = parser.parse('1 + 2')
+    assert results == [['1', '+', ['2']], ['1', '+', '2']]
+    assert parser.token_cache_hits > 0
+    assert parser.layout_cache_hits > 0
+
+    # Each recognizer is called at most once per position.
+    calls = []
+
+    def number(input, pos):
+        calls.append(pos)
+        return number_with_context(None, input, pos)
+
+    g = Grammar.from_string(grammar, recognizers={'number': number})
+    parser = GLRParser(g)
+    assert parser.parse('1 + 2') == results
+    assert calls == [0, 4]
+
+
+def test_token_cache_context_recognizers_not_cached():
+    """
+    Test that recognizers accepting context are called for each head as their
+    result may depend on the head state.
+    """
+    calls = []
+
+    def number(context, input, pos):
+        calls.append(pos)
+        return number_with_context(context, input, pos)
+
+    g = Grammar.from_string(grammar, recognizers={'number': number})
+    parser = GLRParser(g)
+    assert parser.parse('1 + 2') == [['1', '+', ['2']], ['1', '+', '2']]
+    assert calls == [0, 4, 4]
+
+
+def test_token_cache_ambiguous_expressions():
+
+    grammar = r"""
+    E: E '+' E | E '*' E | '(' E ')' | number;
+
+    terminals
+    number: /\d+/;
+    """
+    input_str = '1 + 2 * (3 + 4) * 5 + 6'
+
+    g = Grammar.from_string(grammar)
+    results = GLRParser(g).parse(input_str)
+
+    g = Grammar.from_string(grammar,
+                            recognizers={'number': number_with_context})
+    assert GLRParser(g).parse(input_str) == results
+
+
+def test_token_cache_reset():
+
+    g = Grammar.from_string(grammar)
+    parser = GLRParser(g)
+
+    parser.parse('1 + 2')
+    hits = parser.token_cache_hits
+    misses = parser.token_cache_misses
+    parser.parse('1 + 2')
+    assert parser.token_cache_hits == hits
+    assert parser.token_cache_misses == misses
+    assert not hasattr(parser, 'token_cache')
+
+
+def test_token_cache_pruned():
+    """
+    Test that the cached results behind all heads are evicted so the caches
+    don't grow with the input.
+    """
+
+    g = Grammar.from_string(grammar)
+    session = GLRParser(g)._session()
+    sizes = []
+    do_shifts = session._do_shifts
+
+    def shifts():
+        do_shifts()
+        sizes.append(len(session.token_cache) + len(session.layout_cache))
+    session._do_shifts = shifts
+
+    session._parse('1 + ' + ' '.join(['2'] * 200))
+    assert len(sizes) > 200
+    assert max(sizes) < 10
+
+
+def test_layout_cache():
+
+    g = Grammar.from_string(r"""
+    S: A '+' number | B '+' number+;
+    A: number;
+    B: number;
+
+    LAYOUT: LayoutItem | LAYOUT LayoutItem;
+    LayoutItem: WS | Comment | EMPTY;
+
+    terminals
+    number: /\d+/;
+    WS: /\s+/;
+    Comment: /#[^#]*#/;
+    """)
+
+    comments = []
+
+    def comment(_, value):
+        comments.append(value)
+
+    parser = GLRParser(g, layout_actions={'Comment': comment})
+    assert len(parser.parse('1 #a# + #b# 2 #c#')) == 2
+    assert parser.layout_cache_hits > 0
+    assert comments == ['#a#', '#b#', '#c#']
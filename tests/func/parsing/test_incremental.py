@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Test incremental reparsing of edited input.
+"""
+from __future__ import unicode_literals
+import random
+from time import perf_counter
+import pytest  # noqa
+from parglare import Grammar, Parser, ParseError, ParserInitError
+from parglare.incremental import Edits
+from parglare.parser import NodeNonTerm
+
+
+grammar = r"""
+Model: Statement* EOF;
+Statement: ID '=' Expr ';' | 'print' Expr ';';
+Expr: Expr '+' Expr {left} | Expr '*' Expr {left, 2} | '(' Expr ')'
+    | INT | ID;
+
+terminals
+INT: /\d+/;
+ID: /[a-zA-Z_]\w*/;
+"""
+
+input_str = ''.join('x{0} = {0} + (y * {0});\nprint x{0};\n'.format(i)
+                    for i in range(50))
+
+
+def edit(input_str, edits):
+    for start, end, new_text in sorted(edits, reverse=True):
+        input_str = input_str[:start] + new_text + input_str[end:]
+    return input_str
+
+
+def nodes(tree):
+    result = [tree]
+    for child in tree:
+        result.extend(nodes(child))
+    return result
+
+
+def positions(tree):
+    """
+    Returns symbols and positions of the nodes in input order without
+    recursion.
+    """
+    result = []
+    to_visit = [tree]
+    while to_visit:
+        node = to_visit.pop()
+        result.append((node.symbol.name, node.start_position,
+                       node.end_position))
+        to_visit.extend(reversed(list(node)))
+    return result
+
+
+@pytest.fixture
+def parser():
+    return Parser(Grammar.from_string(grammar), build_tree=True)
+
+
+def test_reparse(parser):
+
+    tree = parser.parse(input_str)
+    old_nodes = set(id(n) for n in nodes(tree))
+
+    start = input_str.index('x25 = 25')
+    edits = [(start + 6, start + 8, '3 * 4')]
+    new_input = edit(input_str, edits)
+
+    new_tree = parser.reparse(tree, new_input, edits)
+    assert new_tree.tree_str() == parser.parse(new_input).tree_str()
+
+    # Only nodes around the edit and nodes of the statement list after the
+    # edit are created again. Statements are reused.
+    new_nodes = [n for n in nodes(new_tree) if id(n) not in old_nodes]
+    assert len(new_nodes) < len(old_nodes) / 10
+    statements = [n for n in nodes(new_tree) if n.symbol.name == 'Statement']
+    assert len([n for n in statements if id(n) in old_nodes]) == 99
+    assert parser.reused_nodes > 0
+
+
+@pytest.mark.parametrize('edits', [
+    # Insertion at the start, deletion at the end.
+    [(0, 0, 'a = 1;\n'), (len(input_str) - 1, len(input_str), '')],
+    # Extending a token at the end of a statement.
+    [(input_str.index('x3;') + 2, input_str.index('x3;') + 2, '3')],
+    # Extending a token at the start of a statement.
+    [(input_str.index('x7 = 7'), input_str.index('x7 = 7'), 'x')],
+    # Changing the structure.
+    [(input_str.index('(y * 10)'), input_str.index('(y * 10)') + 1, ''),
+     (input_str.index('(y * 10)') + 7, input_str.index('(y * 10)') + 8,
+      '')],
+    # Layout only.
+    [(input_str.index('\nprint x9'), input_str.index('\nprint x9') + 1,
+      '  \n\n ')],
+])
+def test_reparse_edits(parser, edits):
+
+    tree = parser.parse(input_str)
+    new_input = edit(input_str, edits)
+    expected = parser.parse(new_input)
+
+    new_tree = parser.reparse(tree, new_input, edits)
+    assert new_tree.tree_str() == expected.tree_str()
+    for node, expected_node in zip(nodes(new_tree), nodes(expected)):
+        assert node.layout_content == expected_node.layout_content
+        assert node.state is expected_node.state
+
+
+def test_reparse_sequence(parser):
+    """
+    Test reparsing after many random edits.
+    """
+    rnd = random.Random(1)
+    current = input_str
+    tree = parser.parse(current)
+    for _ in range(50):
+        start = rnd.randrange(len(current))
+        end = min(start + rnd.randrange(3), len(current))
+        new_text = rnd.choice(['', ' ', '1', 'a', '+ 2', ';\nz = 3'])
+        new_input = edit(current, [(start, end, new_text)])
+        try:
+            expected = parser.parse(new_input)
+        except ParseError:
+            with pytest.raises(ParseError):
+                parser.reparse(tree, new_input, [(start, end, new_text)])
+            continue
+        tree = parser.reparse(tree, new_input, [(start, end, new_text)])
+        assert tree.tree_str() == expected.tree_str()
+        current = new_input
+
+
+def test_reparse_right_recursion(monkeypatch):
+    """
+    Test that the work done by reparsing a right-recursive list depends on
+    the edit and not on the whole list.
+    """
+    g = Grammar.from_string(r"""
+    Items: Item Items | Item;
+    Item: ID ';';
+
+    terminals
+    ID: /\w+/;
+    """)
+    parser = Parser(g, build_tree=True)
+    input_str = 'a; ' * 5000
+
+    # Insertion at the start reuses the rest of the list at once. Positions
+    # of its nodes are shifted only when they are accessed.
+    accessed = []
+    children = NodeNonTerm.children
+
+    def counted_children(node):
+        accessed.append(node)
+        return children.fget(node)
+    tree = parser.parse(input_str)
+    monkeypatch.setattr(NodeNonTerm, 'children',
+                        property(counted_children, children.fset))
+    new_input = 'b; ' + input_str
+    tree = parser.reparse(tree, new_input, [(0, 0, 'b; ')])
+    assert parser.reused_nodes == 1
+    assert len(accessed) < 10
+    monkeypatch.undo()
+    assert positions(tree) == positions(parser.parse(new_input))
+
+    # Append at the end reuses each item and rebuilds the list. This must
+    # not be slower than parsing the input again.
+    tree = parser.parse(input_str)
+    new_input = input_str + 'b;'
+    start = perf_counter()
+    expected = parser.parse(new_input)
+    parse_time = perf_counter() - start
+    start = perf_counter()
+    tree = parser.reparse(tree, new_input,
+                          [(len(input_str), len(input_str), 'b;')])
+    reparse_time = perf_counter() - start
+    # The last item is followed by the edit.
+    assert parser.reused_nodes == 4999
+    assert reparse_time < 3 * parse_time
+    assert positions(tree) == positions(expected)
+
+
+def test_edits_positions():
+
+    edits = Edits([(10, 12, 'abc'), (2, 2, 'x')])
+    assert edits.old_position(1) == 1
+    assert edits.old_position(2) is None
+    assert edits.old_position(3) == 2
+    assert edits.old_position(10) == 9
+    assert edits.old_position(11) is None
+    assert edits.old_position(13) is None
+    assert edits.old_position(14) == 12
+    assert not edits.touched(2, 5)
+    assert edits.touched(1, 2)
+    assert not edits.touched(12, 20)
+    assert edits.touched(5, 10)
+
+    with pytest.raises(ValueError):
+        Edits([(1, 5, ''), (4, 6, '')])
+
+
+def test_reparse_unsupported(parser):
+
+    g = Grammar.from_string(grammar)
+    tree = parser.parse('a = 1;')
+    with pytest.raises(ParserInitError):
+        Parser(g).reparse(tree, 'a = 2;', [(4, 5, '2')])
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Test LR parse loop which creates contexts only for actions which need them.
+"""
+from __future__ import unicode_literals
+import pytest
+from parglare import Grammar, Parser, ParseError
+from parglare.actions import no_context
+
+
+grammar = r"""
+E: E '+' E {left, 1} | E '*' E {left, 2} | '(' E ')' | number;
+
+LAYOUT: LayoutItem*;
+LayoutItem: WS | Comment;
+
+terminals
+number: /\d+/;
+WS: /\s+/;
+Comment: /\/\/.*/;
+"""
+
+
+def test_lazy_context_selection():
+
+    g = Grammar.from_string(grammar)
+    assert Parser(g).lazy_context
+    assert not Parser(g, lazy_context=False).lazy_context
+    assert not Parser(g, build_tree=True).lazy_context
+    assert not Parser(g, lazy_context=True, debug=True).lazy_context
+
+    def number(context, value):
+        return int(value)
+
+    assert not Parser(g, actions={'number': number}).lazy_context
+    assert Parser(g, actions={'number': no_context(number)}).lazy_context
+
+    def custom_token_recognition(context, get_tokens):
+        return get_tokens()
+
+    assert not Parser(g, custom_token_recognition=custom_token_recognition)\
+        .lazy_context
+
+    def number_recognizer(input, pos):
+        return None
+
+    g = Grammar.from_string(grammar, recognizers={'number': number_recognizer})
+    assert Parser(g).lazy_context
+
+
+def test_lazy_context_recognizers_with_context():
+    """
+    Test that recognizers given the context see the last token and production
+    as the full parse loop is used for them.
+    """
+    calls = []
+
+    def a(context, input, pos):
+        calls.append((context.token.value if context.token else None,
+                      str(context.production) if context.production
+                      else None))
+        if input[pos:pos + 1] == 'a':
+            return 'a'
+
+    g = Grammar.from_string(r"""
+    S: A EOF;
+    A: A a | a;
+
+    terminals
+    a: ;
+    """, recognizers={'a': a})
+    parser = Parser(g)
+    assert not parser.lazy_context
+    parser.parse('aa')
+    assert calls == [(None, None), ('a', None)]
+
+
+def positions_actions(calls):
+    """
+    Actions recording context attributes in the given list.
+    """
+    def record(context, value):
+        calls.append((context.symbol.name, context.start_position,
+                      context.end_position, context.position,
+                      context.layout_content))
+        return value
+
+    return {'E': record, 'number': record}
+
+
+@pytest.mark.parametrize('input_str', [
+    '1 + 2 * (3 + 4)',
+    ' 1 //comment\n+ 2 * ( 3 + 4 )  ',
+])
+def test_lazy_context_created_contexts(input_str):
+    """
+    Test that contexts created for actions are the same as in the full parse
+    loop.
+    """
+    g = Grammar.from_string(grammar)
+
+    calls = []
+    parser = Parser(g, actions=positions_actions(calls), lazy_context=False)
+    result = parser.parse(input_str)
+    assert not parser.lazy_context
+
+    lazy_calls = []
+    parser = Parser(g, actions=positions_actions(lazy_calls),
+                    lazy_context=True)
+    assert parser.lazy_context
+    assert parser.parse(input_str) == result
+    assert lazy_calls == calls
+
+
+def test_lazy_context_no_context_actions():
+
+    g = Grammar.from_string(grammar)
+
+    @no_context
+    def number(_, value):
+        return int(value)
+
+    @no_context
+    def expression(_, nodes):
+        if len(nodes) == 1:
+            return nodes[0]
+        elif nodes[0] == '(':
+            return nodes[1]
+        elif nodes[1] == '+':
+            return nodes[0] + nodes[2]
+        return nodes[0] * nodes[2]
+
+    parser = Parser(g, actions={'number': number, 'E': expression})
+    assert parser.lazy_context
+    assert parser.parse('1 + 2 * (3 + 4) // comment') == 15
+
+
+@pytest.mark.parametrize('lazy_context', [False, True])
+def test_lazy_context_errors(lazy_context):
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, lazy_context=lazy_context)
+
+    with pytest.raises(ParseError) as e:
+        parser.parse('1 + 2\n * (3 + )')
+    assert e.value.location.line == 2
+    assert e.value.location.column == 8
+    assert 'Expected: ( or number' in str(e.value)
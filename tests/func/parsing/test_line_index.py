@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Test conversion of positions to lines and columns by the line index.
+"""
+from __future__ import unicode_literals
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, pos_to_line_col
+from parglare.common import LineIndex, Location
+from parglare.parser import Context
+
+
+def old_pos_to_line_col(input_str, position):
+    line = 1
+    old_pos = 0
+    try:
+        cur_pos = input_str.index("\n")
+        while cur_pos < position:
+            line += 1
+            old_pos = cur_pos + 1
+            cur_pos = input_str.index("\n", cur_pos + 1)
+    except ValueError:
+        pass
+    return line, position - old_pos
+
+
+@pytest.mark.parametrize('input_str', ['', 'a', '\n', 'ab\n\ncd\n',
+                                       '\nfirst\r\nsecond\n\nlast'])
+def test_line_index(input_str):
+
+    line_index = LineIndex(input_str)
+    for position in range(len(input_str) + 1):
+        expected = old_pos_to_line_col(input_str, position)
+        assert line_index.line_col(position) == expected
+        assert pos_to_line_col(input_str, position) == expected
+
+    lines = input_str.split('\n')
+    assert len(line_index) == len(lines)
+    for line in range(1, len(lines) + 1):
+        position = line_index.line_start(line)
+        assert line_index.line_col(position) == (line, 0)
+        assert input_str[position:].split('\n')[0] == lines[line - 1]
+    with pytest.raises(IndexError):
+        line_index.line_start(len(lines) + 1)
+    with pytest.raises(IndexError):
+        line_index.line_start(0)
+
+    assert line_index.line_col(None) == (None, None)
+
+
+def test_line_index_non_textual():
+
+    line_index = LineIndex([1, 2, 3])
+    assert line_index.line_col(2) == (1, 2)
+    assert line_index.line_start(1) == 0
+    assert len(line_index) == 1
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_line_index_errors(parser_class):
+    """
+    Test that locations of errors found by error recovery share the line
+    index of the parse.
+    """
+
+    g = Grammar.from_string(r"""
+    S: A+ EOF;
+    terminals
+    A: 'a';
+    """)
+    input_str = 'a\na b\n  a\n\n b a b\n'
+    context = Context()
+    parser = parser_class(g, error_recovery=True)
+    parser.parse(input_str, context=context)
+
+    errors = context.parser.errors
+    assert [(e.location.line, e.location.column) for e in errors] == \
+        [(2, 2), (5, 1), (5, 5)]
+    assert all(e.location.line_index is context.line_index for e in errors)
+    assert str(errors[0].location).startswith('2:2:')
+
+    # Locations created without a context index the input themselves.
+    location = Location(Context(input_str=input_str, start_position=4,
+                                position=4))
+    assert (location.line, location.column) == (2, 2)
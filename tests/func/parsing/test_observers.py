@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Test observers of parsing events.
+"""
+from __future__ import unicode_literals
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParseError, SHIFT, REDUCE
+from parglare.observers import ParseObserver
+
+
+grammar = r"""
+S: E EOF;
+E: E '+' E {left} | number;
+
+terminals
+number: /\d+/;
+"""
+
+
+class Recorder(ParseObserver):
+
+    def __init__(self):
+        self.events = []
+
+    def on_start(self, context):
+        self.events.append(('start', context.input_str))
+
+    def on_tokens(self, context, tokens):
+        self.events.append(('tokens', [t.symbol.name for t in tokens]))
+
+    def on_shift(self, context, result):
+        self.events.append(('shift', result))
+
+    def on_reduce(self, context, subresults, result):
+        self.events.append(('reduce', context.production.prod_id, result))
+
+    def on_error(self, context, error):
+        self.events.append(('error', context.position))
+
+    def on_end(self, context):
+        self.events.append(('end', context.input_str))
+
+
+def test_observers():
+
+    g = Grammar.from_string(grammar)
+    recorder = Recorder()
+    parser = Parser(g, observers=[recorder])
+    assert not parser.lazy_context
+
+    assert parser.parse('1 + 2') == [['1', '+', '2'], None]
+    assert recorder.events == [
+        ('start', '1 + 2'),
+        ('tokens', ['number']),
+        ('shift', '1'),
+        ('tokens', ['+']),
+        ('reduce', 3, '1'),
+        ('shift', '+'),
+        ('tokens', ['number']),
+        ('shift', '2'),
+        ('tokens', ['EOF']),
+        ('reduce', 3, '2'),
+        ('reduce', 2, ['1', '+', '2']),
+        ('shift', None),
+        ('tokens', ['STOP']),
+        ('reduce', 1, [['1', '+', '2'], None]),
+        ('end', '1 + 2'),
+    ]
+
+    recorder.events = []
+    with pytest.raises(ParseError):
+        parser.parse('1 +')
+    assert recorder.events[-2:] == [('error', 3), ('end', '1 +')]
+
+
+def test_observers_hooks_installed():
+    """
+    Test that only the observed events are hooked into the parse session.
+    """
+
+    class ShiftCounter(ParseObserver):
+        shifts = 0
+
+        def on_shift(self, context, result):
+            self.shifts += 1
+
+    g = Grammar.from_string(grammar)
+    counter = ShiftCounter()
+    parser = Parser(g, observers=[counter])
+    session = parser._session()
+    assert '_call_shift_action' in session.__dict__
+    assert '_next_tokens' not in session.__dict__
+    assert session._reducers is parser._reducers
+    parser.parse('1 + 2 + 3')
+    assert counter.shifts == 6
+
+    parser = Parser(g)
+    assert parser.observers == []
+    assert '_call_shift_action' not in parser._session().__dict__
+
+
+def test_observers_glr():
+
+    class GSSRecorder(ParseObserver):
+
+        def __init__(self):
+            self.events = []
+
+        def on_heads(self, action, heads):
+            self.events.append((action, len(heads)))
+
+        def on_link(self, head, old_head, root_head, created):
+            self.events.append(('link', created))
+
+        def on_accept(self, head):
+            self.events.append('accept')
+
+        def on_kill(self, head):
+            self.events.append('kill')
+
+        def on_error(self, context, error):
+            self.events.append('error')
+
+    g = Grammar.from_string(r"""
+    S: E EOF;
+    E: E '+' E | number;
+    terminals
+    number: /\d+/;
+    """)
+    recorder = GSSRecorder()
+    parser = GLRParser(g, observers=[recorder])
+    assert len(parser.parse('1 + 2 + 3')) == 2
+    events = recorder.events
+    assert events[0] == (REDUCE, 1)
+    assert (SHIFT, 1) in events
+    assert ('link', True) in events
+    # Two derivations of `E` merged in the same head.
+    assert ('link', False) in events
+    assert events.count('accept') == 1
+    assert 'kill' not in events
+
+    recorder.events = []
+    with pytest.raises(ParseError):
+        parser.parse('1 + + 3')
+    assert 'kill' in recorder.events
+    assert recorder.events[-1] == 'error'
+
+    # Notifiers of the graph-structured stack changes are bound only for the
+    # observed events.
+    session = parser._session()
+    assert '_on_link' in session.__dict__
+    assert '_on_drop' not in session.__dict__
+    assert '_on_link' not in GLRParser(g)._session().__dict__
+
+
+def test_observers_disambiguation():
+
+    class Recorder(ParseObserver):
+
+        def __init__(self):
+            self.events = []
+
+        def on_lexical_disambiguation(self, context, tokens, result):
+            self.events.append(([t.symbol.name for t in tokens],
+                                [t.symbol.name for t in result]))
+
+        def on_dynamic_filter(self, context, action, subresults, accepted):
+            self.events.append((action, accepted))
+
+    g = Grammar.from_string(r"""
+    S: A+ EOF;
+    A: id | keyword {dynamic};
+
+    terminals
+    id: /\w+/;
+    keyword: 'if' {prefer};
+    """)
+
+    def dynamic_filter(context, action, subresults):
+        return True
+
+    recorder = Recorder()
+    parser = Parser(g, observers=[recorder], dynamic_filter=dynamic_filter)
+    assert parser.parse('if x') == [['if', 'x'], None]
+    assert recorder.events[0] == (None, True)
+    # STOP is preferred over EOF at the end of the input.
+    assert (['STOP', 'EOF'], ['STOP']) in recorder.events
+    assert (REDUCE, True) in recorder.events
+
+
+def test_debug_observers(capsys, tmpdir):
+
+    g = Grammar.from_string(grammar)
+    Parser(g, debug=True).parse('1 + 2')
+    out = capsys.readouterr().out
+    assert "SHIFT \"1\" to state" in out
+    assert "REDUCE by prod '2: E = E + E'" in out
+
+    with pytest.raises(ParseError):
+        GLRParser(g, debug=True).parse('1 + + 2')
+    out = capsys.readouterr().out
+    assert "Killing head" in out
+    assert "Tokens expected: [" in out
+
+    with tmpdir.as_cwd():
+        parser = GLRParser(g, debug=True, debug_trace=True)
+        parser.parse('1 + 2', file_name='input')
+        trace = tmpdir.join('input_trace.dot').read()
+    assert trace.startswith('\n    digraph parglare_trace {')
+    assert '-> success' in trace
+    assert 'R:2: E = E + E' in trace
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Test parallel parsing of many files by worker processes.
+"""
+from __future__ import unicode_literals
+import os
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParseError, ParserInitError
+from parglare.actions import pass_single
+from parglare.batch import parser_blob, parser_from_blob
+
+
+grammar = r"""
+Sum: Sum '+' number | number;
+
+terminals
+number: /\d+/;
+"""
+
+
+def act_sum(_, nodes):
+    return nodes[0] + nodes[2]
+
+
+def act_number(_, value):
+    return int(value)
+
+
+actions = {
+    'Sum': [act_sum, lambda _, nodes: nodes[0]],
+    'number': act_number,
+}
+
+module_actions = {
+    'Sum': [act_sum, pass_single],
+    'number': act_number,
+}
+
+
+def write_inputs(tmpdir, count):
+    file_names = []
+    for idx in range(count):
+        file_name = os.path.join(str(tmpdir), 'input{}.txt'.format(idx))
+        with open(file_name, 'w') as f:
+            # Every 7th file has an error.
+            f.write(' + '.join(str(n) for n in range(idx + 1))
+                    + (' +' if idx % 7 == 6 else ''))
+        file_names.append(file_name)
+    return file_names
+
+
+def check_results(results, file_names):
+    assert sorted(r[0] for r in results) == sorted(file_names)
+    for file_name, result, error in results:
+        idx = file_names.index(file_name)
+        if idx % 7 == 6:
+            assert result is None
+            assert isinstance(error, ParseError)
+            assert error.location.file_name == file_name
+            assert [s.name for s in error.symbols_expected] == ['number']
+            assert 'Expected: number' in str(error)
+        else:
+            assert error is None
+            assert result == idx * (idx + 1) // 2
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_parse_files(tmpdir, ordered):
+
+    file_names = write_inputs(tmpdir, 40)
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions=module_actions)
+
+    results = list(parser.parse_files(file_names, workers=2, ordered=ordered,
+                                      chunk_size=3))
+    check_results(results, file_names)
+    if ordered:
+        assert [r[0] for r in results] == file_names
+
+
+def test_parse_files_chunks(tmpdir):
+    """
+    Test that chunks are limited by the number of files and their size.
+    """
+    from parglare.batch import _chunks
+
+    file_names = write_inputs(tmpdir, 10)
+    sizes = [os.path.getsize(f) for f in file_names]
+
+    chunks = list(_chunks(file_names, 4, 10**6))
+    assert [len(c) for c in chunks] == [4, 4, 2]
+
+    chunks = list(_chunks(file_names, 100, sum(sizes[-3:])))
+    assert sum(chunks, []) == file_names
+    assert all(sum(sizes[file_names.index(f)] for f in c) <= sum(sizes[-3:])
+               or len(c) == 1 for c in chunks)
+    assert len(chunks[-1]) == 3
+
+    # A file larger than the limit is sent alone.
+    assert list(_chunks(file_names[:3], 100, 1)) == [[f]
+                                                     for f in file_names[:3]]
+
+
+def test_parse_files_grammar_file(tmpdir):
+    """
+    Test that actions of the grammar file are loaded by workers.
+    """
+    grammar_file = os.path.join(str(tmpdir), 'sum.pg')
+    with open(grammar_file, 'w') as f:
+        f.write(grammar)
+    with open(os.path.join(str(tmpdir), 'sum_actions.py'), 'w') as f:
+        f.write('from parglare import get_collector\n'
+                'action = get_collector()\n'
+                '@action\n'
+                'def Sum(_, nodes):\n'
+                '    return int(nodes[0]) + int(nodes[-1])\n')
+
+    file_names = write_inputs(tmpdir, 20)
+    g = Grammar.from_file(grammar_file)
+    parser = Parser(g)
+    check_results(list(parser.parse_files(file_names, workers=2)),
+                  file_names)
+
+
+def test_parse_files_glr(tmpdir):
+
+    file_names = write_inputs(tmpdir, 10)
+    g = Grammar.from_string('Expr: Sum EOF;' + grammar)
+    parser = GLRParser(g, actions=dict(module_actions, Expr=pass_single))
+
+    for file_name, result, error in parser.parse_files(file_names,
+                                                       workers=2):
+        idx = file_names.index(file_name)
+        if idx % 7 == 6:
+            assert isinstance(error, ParseError)
+        else:
+            assert result == [idx * (idx + 1) // 2]
+
+
+def test_parser_blob():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions=module_actions, prefer_shifts=False)
+    new_parser = parser_from_blob(parser_blob(parser))
+
+    assert type(new_parser) is Parser
+    assert len(new_parser.table.states) == len(parser.table.states)
+    assert new_parser.parse('1 + 2 + 3') == 6
+
+    with pytest.raises(ParserInitError, match='module level'):
+        parser_blob(Parser(g, actions=actions))
+
+    g, _ = Grammar.from_struct({'S': [['a']]}, {'a': ('string', 'a')}, 'S')
+    with pytest.raises(ParserInitError, match='from_file'):
+        parser_blob(Parser(g))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Test parsing of input read from file-like objects.
+"""
+from __future__ import unicode_literals
+import io
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParseError, \
+    ParserInitError
+
+
+grammar = r"""
+Model: Statement* EOF;
+Statement: ID '=' Expr ';';
+Expr: Expr '+' Expr {left} | INT | STRING | ID;
+
+terminals
+INT: /\d+/;
+STRING: /"[^"]*"/;
+ID: /[a-zA-Z_]\w*/;
+"""
+
+input_str = '''
+a = 1 + 2;
+bb = "a long string which doesn't fit in a chunk" + a;
+ccc = 33 + "x";
+'''
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 16, None])
+def test_parse_stream(chunk_size):
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+    result = parser.parse(input_str)
+
+    assert parser.parse_stream(io.StringIO(input_str),
+                               chunk_size=chunk_size) == result
+    assert parser.parse_stream(io.BytesIO(input_str.encode('utf-8')),
+                               chunk_size=chunk_size) == result
+
+
+def test_parse_stream_positions():
+
+    positions = []
+
+    def statement(context, nodes):
+        positions.append((context.start_position, context.end_position))
+        return nodes[0]
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions={'Statement': statement})
+    assert parser.parse_stream(io.StringIO(input_str),
+                               chunk_size=4) == [['a', 'bb', 'ccc'], None]
+
+    expected = []
+    start = 0
+    for name in ['a', 'bb', 'ccc']:
+        start = input_str.index(name + ' =', start)
+        end = input_str.index(';', start) + 1
+        expected.append((start, end))
+    assert positions == expected
+
+
+def test_parse_stream_window_is_bounded():
+
+    window_sizes = []
+    windows = []
+
+    def statement(context, nodes):
+        window_sizes.append(len(context.input_str))
+        if not windows or windows[-1] is not context.input_str:
+            windows.append(context.input_str)
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions={'Statement': statement})
+    parser.parse_stream(io.StringIO('a = 1 + b;\n' * 10000), chunk_size=64)
+    assert len(window_sizes) == 10000
+    assert max(window_sizes) < 256
+    # Consumed input is not discarded after each token.
+    assert len(windows) < 5000
+
+
+def test_parse_stream_layout():
+
+    g = Grammar.from_string(r"""
+    Model: INT+ EOF;
+
+    LAYOUT: LayoutItem | LAYOUT LayoutItem;
+    LayoutItem: WS | Comment | EMPTY;
+
+    terminals
+    INT: /\d+/;
+    WS: /\s+/;
+    Comment: /\/\*(.|\n)*?\*\//;
+    """)
+    comments = []
+
+    def comment(_, value):
+        comments.append(value)
+
+    parser = Parser(g, layout_actions={'Comment': comment})
+    input_str = '1 /* a long comment\n spanning lines */ 22 /**/ 333 /* c */'
+    assert parser.parse_stream(io.StringIO(input_str), chunk_size=3) == \
+        [['1', '22', '333'], None]
+    assert comments == ['/* a long comment\n spanning lines */', '/**/',
+                        '/* c */']
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 16])
+def test_parse_stream_error(chunk_size):
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+    error_input = input_str + 'dddd = 4 +\n + 5;'
+
+    with pytest.raises(ParseError) as e:
+        parser.parse(error_input)
+    expected = e.value
+
+    stream = io.StringIO(error_input)
+    stream.name = 'input.txt'
+    with pytest.raises(ParseError) as e:
+        parser.parse_stream(stream, chunk_size=chunk_size)
+    error = e.value
+    assert error.location.file_name == 'input.txt'
+    assert error.location.start_position == expected.location.start_position
+    assert error.location.line == expected.location.line == 6
+    assert error.location.column == expected.location.column == 1
+    assert error.symbols_expected == expected.symbols_expected
+    assert parser.errors == [error]
+
+
+def test_parse_stream_unsupported_options():
+
+    g = Grammar.from_string(grammar)
+    for kwargs in [{'build_tree': True}, {'error_recovery': True},
+                   {'debug': True}]:
+        parser = Parser(g, **kwargs)
+        with pytest.raises(ParserInitError):
+            parser.parse_stream(io.StringIO(input_str))
+
+    parser = GLRParser(g)
+    with pytest.raises(ParserInitError):
+        parser.parse_stream(io.StringIO(input_str))
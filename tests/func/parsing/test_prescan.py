@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Test prescanning of regex terminals over the whole input.
+"""
+from __future__ import unicode_literals
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParseError
+from parglare.grammar import RegExRecognizer
+from parglare.scanner import Prescan
+
+
+grammar = r"""
+Model: Statement+ EOF;
+Statement: ID '=' Expr ';';
+Expr: Expr '+' Expr {left} | Expr '*' Expr {left} | FLOAT | INT | ID;
+
+terminals
+INT: /\d+/;
+FLOAT: /\d+\.\d*|\.\d+/;
+ID: /[a-zA-Z_]\w*/;
+"""
+
+
+@pytest.mark.parametrize('regex', [
+    r'\d+', r'\w+', r'a*', r'(?<=a)b+', r'^\w', r'\b\w+\b$', r'x|xy',
+    r'(?<=a)|b+',
+])
+def test_prescan_match(regex):
+    """
+    Test that prescan gives the same matches as the regex at each position.
+    """
+    input_str = 'a12 abb xyb\nbbaab 42 \nxy'
+    recognizer = RegExRecognizer(regex)
+    prescan = Prescan(input_str)
+    for position in range(len(input_str) + 1):
+        match = recognizer(input_str, position)
+        length = prescan.match(recognizer, position)
+        if match:
+            assert length == len(match)
+        else:
+            assert not length
+
+
+def test_prescan_match_after_empty_match():
+    """
+    Test that a non-empty match found after an empty match at the same
+    position covers the positions inside it.
+    """
+    recognizer = RegExRecognizer(r'(?<=a)|b+')
+    prescan = Prescan('abbb')
+    assert prescan.match(recognizer, 1) == 0
+    assert prescan.match(recognizer, 2) == 2
+    assert prescan.match(recognizer, 3) == 1
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_prescan_parse(parser_class):
+
+    g = Grammar.from_string(grammar)
+    input_str = 'a = 1 + 2.5 * b; bc = .5 * 33 + a1;'
+
+    parser = parser_class(g)
+    prescan_parser = parser_class(g, prescan=True)
+    assert prescan_parser.parse(input_str) == parser.parse(input_str)
+    assert prescan_parser.prescanned is None
+
+    with pytest.raises(ParseError) as e:
+        prescan_parser.parse('a = 1 + ;')
+    assert 'Expected: FLOAT or ID or INT' in str(e.value)
+
+
+def test_prescan_error_recovery():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, prescan=True, error_recovery=True)
+    result = parser.parse('a = 1 + 2 ) * b; c = 3;')
+    assert len(parser.errors) == 1
+    assert result
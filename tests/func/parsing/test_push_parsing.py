@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Test push parsing where the input is fed in chunks as it arrives.
+"""
+from __future__ import unicode_literals
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParseError, ParserInitError
+
+
+grammar = r"""
+Model: Statement* EOF;
+Statement: ID '=' Expr ';';
+Expr: Expr '+' Expr {left} | INT | STRING | ID;
+
+terminals
+INT: /\d+/;
+STRING: /"[^"]*"/;
+ID: /[a-zA-Z_]\w*/;
+"""
+
+input_str = '''
+a = 1 + 2;
+bb = "a string" + a;
+ccc = 33 + "x";
+'''
+
+
+def chunks(input_str, size):
+    return [input_str[i:i + size] for i in range(0, len(input_str), size)]
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+@pytest.mark.parametrize('size', [1, 3, 1000])
+def test_push_parsing(parser_class, size):
+
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g)
+    result = parser.parse(input_str)
+
+    session = parser.start()
+    for chunk in chunks(input_str, size):
+        session.feed(chunk)
+    assert session.finish() == result
+
+    # UTF-8 bytes with characters split between chunks.
+    expected = parser.parse('a = "čćž";')
+    session = parser.start()
+    for chunk in chunks('a = "čćž";'.encode('utf-8'), 1):
+        session.feed(chunk)
+    assert session.finish() == expected
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_push_parsing_is_incremental(parser_class):
+    """
+    Test that actions are called while the input arrives and tokens which
+    may be extended are not recognized until more input is fed.
+    """
+    called = []
+
+    def statement(_, nodes):
+        called.append(nodes[0])
+        return nodes[0]
+
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g, actions={'Statement': statement})
+    session = parser.start()
+
+    session.feed('a = 1;\nbb = 2')
+    assert called == ['a']
+    session.feed('2;\nccc ')
+    assert called == ['a', 'bb']
+    # Statement is reduced when the token after it is known.
+    session.feed('= 3;')
+    assert called == ['a', 'bb']
+    result = session.finish()
+    assert called == ['a', 'bb', 'ccc']
+    if parser_class is GLRParser:
+        result = result[0]
+    assert result == [['a', 'bb', 'ccc'], None]
+
+
+def test_push_parsing_window_is_bounded():
+
+    window_sizes = []
+
+    def statement(context, nodes):
+        window_sizes.append(len(context.input_str))
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions={'Statement': statement})
+    session = parser.start()
+    for i in range(1000):
+        session.feed('a = 1 + b;\n')
+    session.finish()
+    assert len(window_sizes) == 1000
+    assert max(window_sizes) < 20
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_push_parsing_error(parser_class):
+
+    g = Grammar.from_string(grammar)
+    parser = parser_class(g)
+    session = parser.start(file_name='input.txt')
+    session.feed('a = 1;\nb = 2 +\n')
+    with pytest.raises(ParseError) as e:
+        session.feed(' + 3;')
+    assert e.value.location.file_name == 'input.txt'
+    assert e.value.location.line == 3
+    assert e.value.location.column == 1
+
+    # Error at the end of the input is found when the input is finished.
+    session = parser.start()
+    session.feed('a = 1 +')
+    with pytest.raises(ParseError) as e:
+        session.finish()
+    assert 'Expected: ID or INT or STRING' in str(e.value)
+
+    with pytest.raises(ParserInitError):
+        session.feed('1;')
+
+
+def test_push_parsing_unsupported_options():
+
+    g = Grammar.from_string(grammar)
+    with pytest.raises(ParserInitError):
+        Parser(g, build_tree=True).start()
+    with pytest.raises(ParserInitError):
+        GLRParser(g, error_recovery=True).start()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Test reduce actions compiled per production at parser construction.
+"""
+from __future__ import unicode_literals
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser
+from parglare.actions import obj
+from parglare.parser import action_reducer
+
+
+grammar = r"""
+Model: statements=Statement* EOF;
+Statement: name=ID '=' value=Value flag?='!'? ';';
+Value: INT | ID;
+
+terminals
+ID: /[a-z]+/;
+INT: /\d+/;
+"""
+
+input_str = 'a = 1; b = c !;'
+
+
+def check_model(model):
+    assert [s.name for s in model.statements] == ['a', 'b']
+    assert [s.value for s in model.statements] == ['1', 'c']
+    assert [s.flag for s in model.statements] == [False, True]
+    assert model.statements[1]._pg_start_position == 7
+    assert model.statements[1]._pg_end_position == 15
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_named_matches(parser_class):
+
+    g = Grammar.from_string(grammar)
+    model = parser_class(g).parse(input_str)
+    if parser_class is GLRParser:
+        model = model[0]
+    check_model(model)
+
+    parser = parser_class(g, build_tree=True)
+    tree = parser.parse(input_str)
+    if parser_class is GLRParser:
+        tree = tree[0]
+    check_model(parser.call_actions(tree))
+
+
+def test_action_reducers():
+
+    g = Grammar.from_string(grammar)
+    statement = next(p for p in g.productions if p.symbol.name == 'Statement')
+    value = next(p for p in g.productions if p.symbol.name == 'Value')
+
+    assert statement.symbol.action is obj
+    assert action_reducer(statement, g) is not obj
+    assert action_reducer(value, g) is None
+
+    def act_statement(_, nodes, name, value, flag):
+        return name, value, flag
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions={'Statement': act_statement,
+                                'Value': [lambda _, n: int(n[0]),
+                                          lambda _, n: n[0].upper()]})
+    # Actions without named matches are called directly.
+    for value in [p for p in g.productions if p.symbol.name == 'Value']:
+        assert parser._action_reducers[value.prod_id] is \
+            g.get_nonterminal('Value').action[value.prod_symbol_id]
+
+    model = parser.parse(input_str)
+    assert model.statements == [('a', 1, False), ('b', 'C', True)]
+
+
+def test_call_actions_during_tree_build():
+
+    calls = []
+
+    def act_value(_, nodes):
+        calls.append(nodes[0].value)
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, build_tree=True, actions={'Value': act_value})
+    parser.parse(input_str)
+    assert calls == []
+
+    # Reducers are compiled again when the flag is changed.
+    parser.call_actions_during_tree_build = True
+    tree = parser.parse(input_str)
+    assert calls == ['1', 'c']
+    assert tree.symbol.name == 'Model'
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Test statistics collected by parsers with `collect_stats=True`.
+"""
+from __future__ import unicode_literals
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParserInitError
+from parglare.stats import ParseStats
+
+
+grammar = r"""
+E: E '+' E {left} | E '*' E {left, 2} | '(' E ')' | number;
+
+terminals
+number: /\d+/;
+"""
+
+input_str = '2 * (3 + 4) + 5'
+
+
+@pytest.mark.parametrize('build_tree', [False, True])
+def test_stats(build_tree):
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, build_tree=build_tree, collect_stats=True)
+    parser.parse(input_str)
+    stats = parser.stats
+
+    assert isinstance(stats, ParseStats)
+    assert stats.shifts == 9
+    productions = g.productions
+    assert stats.reductions[productions[1]] == 2
+    assert stats.reductions[productions[2]] == 1
+    assert stats.reductions[productions[3]] == 1
+    assert stats.reductions[productions[4]] == 4
+    assert stats.recognizer_hits['number'] == 4
+    assert stats.recognizer_calls['number'] >= 4
+    assert stats.hit_rate('number') == \
+        4 / stats.recognizer_calls['number']
+    assert stats.hit_rate('EMPTY') is None
+    # States on the stack after shifting `4`, including the start state.
+    assert stats.max_stack_depth == 7
+    assert stats.recognition_time > 0
+    assert stats.action_time > 0
+    assert stats.layout_time > 0
+    assert stats.gss_nodes == 0
+    assert 'Shifts: 9' in str(stats)
+
+    # Each parse has its own stats.
+    parser.parse('1')
+    assert parser.stats is not stats
+    assert parser.stats.shifts == 1
+
+
+def test_stats_glr():
+
+    g = Grammar.from_string(r"""
+    S: E EOF;
+    E: E '+' E | E '*' E | number;
+    terminals
+    number: /\d+/;
+    """)
+    parser = GLRParser(g, collect_stats=True)
+    results = parser.parse('1 + 2 * 3 + 4')
+    stats = parser.stats
+
+    assert len(results) == 5
+    assert stats.max_active_heads > 1
+    assert stats.gss_nodes > stats.shifts
+    assert stats.max_stack_depth == 0
+    # Heads share the results of the recognizers.
+    assert stats.recognizer_hits['number'] == 4
+    assert sum(stats.recognizer_calls.values()) == \
+        parser.token_cache_misses
+    assert 'GSS nodes' in str(stats)
+
+
+def test_stats_disabled():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+    parser.parse(input_str)
+    assert parser.stats is None
+    assert '_token_recognition' not in parser._session().__dict__
+
+    with pytest.raises(ParserInitError, match='collect_stats'):
+        Parser(g, collect_stats=True, checkpoints=['E'])
+
+    with pytest.raises(ParserInitError, match='collect_stats'):
+        Parser(g, collect_stats=True).start()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Test indexed matching of string and keyword terminals.
+"""
+from __future__ import unicode_literals
+import pytest  # noqa
+from parglare import Grammar, Parser, GLRParser, ParseError
+from parglare.tables import StringIndex
+
+
+grammar = r"""
+Model: Statement+ EOF;
+Statement: 'if' Expr 'then' Statement 'end'
+         | 'if' Expr 'then' Statement 'else' Statement 'end'
+         | ID '=' Expr ';'
+         | ID '==' Expr ';'
+         | ID '+=' Expr ';';
+Expr: Expr '+' Expr {left} | Expr '==' Expr {left} | INT | ID;
+
+terminals
+KEYWORD: /\w+/;
+INT: /\d+/;
+ID: /[a-zA-Z_]\w*/;
+"""
+
+
+def test_string_index_structure():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+
+    for state in parser.table.states:
+        string_index = state.string_index
+        if string_index is None:
+            continue
+        assert isinstance(string_index, StringIndex)
+        assert string_index.lengths == sorted(string_index.lengths,
+                                              reverse=True)
+        for idx, symbol in enumerate(string_index.symbols):
+            if symbol.name in ['if', 'then', 'else', 'end']:
+                assert idx in string_index.keywords
+            elif symbol.name in ['INT', 'ID', 'EOF']:
+                assert idx in string_index.others
+            else:
+                assert idx not in string_index.others
+
+
+def test_string_index_match():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g)
+
+    # Find the state after ID where assignment operators are expected.
+    state = next(s for s in parser.table.states
+                 if s.string_index is not None and
+                 set(t.name for t in s.string_index.symbols)
+                 == {'=', '==', '+='})
+    string_index = state.string_index
+    assert string_index.lengths == [2, 1]
+
+    names = {idx: s.name for idx, s in enumerate(string_index.symbols)}
+    assert {names[idx]: value
+            for idx, value in string_index.match('a == 3', 2).items()} \
+        == {'=': '=', '==': '=='}
+    assert {names[idx]: value
+            for idx, value in string_index.match('a = 3', 2).items()} \
+        == {'=': '='}
+    assert string_index.match('a', 1) == {}
+
+
+def test_string_index_keywords():
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, build_tree=True)
+
+    tree = parser.parse('if a == 1 then if b then b == 2; else c = b; end end')
+    assert tree.tree_str().count('if[') == 2
+
+    # Keywords are matched on word boundaries.
+    tree = parser.parse('ifa = 1; a = endb;')
+    assert 'ifa' in tree.tree_str()
+
+    with pytest.raises(ParseError):
+        parser.parse('if a then ifb = 1; endb')
+
+
+def test_string_index_ignore_case():
+
+    g = Grammar.from_string(grammar, ignore_case=True)
+    parser = Parser(g, build_tree=True)
+
+    tree = parser.parse('IF a == 1 Then b = 2; END')
+    assert tree.children[0].children[0].children[0].value == 'IF'
+
+    # Case folding of regexes and `str.lower` differ for some characters.
+    # Non-ascii input must be matched the same as without the index.
+    g = Grammar.from_string(r"""
+    S: Word+ EOF;
+    Word: 'skip' | 'ok' | 'kelvin' | OTHER;
+
+    terminals
+    KEYWORD: /\w+/;
+    OTHER: /\w+/;
+    """, ignore_case=True)
+    input_str = 'ſkip Kelvin ok'
+    result = Parser(g).parse(input_str)
+
+    parser = Parser(g)
+    for state in parser.table.states:
+        state.string_index = None
+    assert result == parser.parse(input_str)
+
+
+def test_string_index_priority():
+
+    grammar = r"""
+    S: M EOF;
+    M: First | Second | Third;
+
+    terminals
+    First: '14.75';
+    Second: /\d+\.\d+/;
+    Third: '14.7' {15};
+    """
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, build_tree=True)
+
+    with pytest.raises(ParseError):
+        # Third has the highest priority and wins.
+        parser.parse('14.75')
+    tree = parser.parse('14.7')
+    assert tree.children[0].children[0].symbol.name == 'Third'
+
+
+def test_string_index_glr():
+
+    g = Grammar.from_string(grammar)
+    input_str = 'if a == 1 then b = 2; end x == 3;'
+    results = GLRParser(g, build_tree=True).parse(input_str)
+
+    parser = GLRParser(g, build_tree=True)
+    for state in parser.table.states:
+        state.string_index = None
+    expected = parser.parse(input_str)
+
+    assert [r.tree_str() for r in results] == \
+        [r.tree_str() for r in expected]
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Test sharing of a single parser between threads.
+"""
+from __future__ import unicode_literals
+import sys
+import pytest  # noqa
+from concurrent.futures import ThreadPoolExecutor
+from parglare import Grammar, Parser, GLRParser
+from parglare.parser import Context
+
+
+grammar = r"""
+Program: Statement* EOF;
+Statement: ID '=' E ';';
+E: E '+' E {left} | E '*' E {left, 2} | '(' E ')' | number | ID;
+
+LAYOUT: LayoutItem | LAYOUT LayoutItem;
+LayoutItem: WS | Comment | EMPTY;
+
+terminals
+ID: /[a-z]+/;
+number: /\d+/;
+WS: /\s+/;
+Comment: /#[^\n]*/;
+"""
+
+actions = {
+    'Program': lambda _, nodes: nodes[0],
+    'Statement': lambda _, nodes: (nodes[0], nodes[2]),
+    'E': [lambda _, nodes: nodes[0] + nodes[2],
+          lambda _, nodes: nodes[0] * nodes[2],
+          lambda _, nodes: nodes[1],
+          lambda _, nodes: nodes[0],
+          lambda _, nodes: 1],
+    'number': lambda _, value: int(value),
+}
+
+ambiguous_grammar = r"""
+S: E EOF;
+E: E '+' E | E '*' E | number;
+
+terminals
+number: /\d+/;
+"""
+
+
+def inputs(count):
+    for idx in range(count):
+        yield '\n'.join('# statement {}\n{} = {} + {} * ({} + x);'.format(
+            line, 'abc'[line % 3], idx, line, line * idx)
+            for line in range(idx % 7 + 1))
+
+
+@pytest.fixture
+def switch_often():
+    """
+    Switches threads as often as possible to interleave the parses.
+    """
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def run_in_threads(parse, input_strs):
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        return list(executor.map(parse, input_strs))
+
+
+@pytest.mark.parametrize('lazy_context', [True, False])
+def test_shared_parser(switch_often, lazy_context):
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions=actions, lazy_context=lazy_context)
+    input_strs = list(inputs(200))
+    expected = [parser.parse(input_str) for input_str in input_strs]
+    attrs = set(vars(parser))
+
+    assert run_in_threads(parser.parse, input_strs) == expected
+
+    # Parse state is not kept in the shared parser.
+    assert set(vars(parser)) == attrs
+
+
+def test_shared_parser_tree_and_actions(switch_often):
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions=actions, build_tree=True)
+    input_strs = list(inputs(200))
+
+    def parse(input_str):
+        return parser.call_actions(parser.parse(input_str))
+
+    expected = [parse(input_str) for input_str in input_strs]
+    assert run_in_threads(parse, input_strs) == expected
+
+
+def test_shared_parser_errors(switch_often):
+    """
+    Test that errors found by error recovery are available per parse from
+    the parser of the context.
+    """
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions=actions, error_recovery=True)
+    input_strs = [input_str.replace('+', '+ +', idx % 3)
+                  for idx, input_str in enumerate(inputs(200))]
+
+    def parse(input_str):
+        context = Context()
+        parser.parse(input_str, context=context)
+        return [e.location.start_position for e in context.parser.errors]
+
+    expected = [parse(input_str) for input_str in input_strs]
+    assert any(expected) and not all(expected)
+    assert run_in_threads(parse, input_strs) == expected
+
+
+def test_shared_glr_parser(switch_often):
+
+    g = Grammar.from_string(ambiguous_grammar)
+    parser = GLRParser(g)
+    input_strs = [' + '.join(['1 * 2'] * (idx % 3 + 1))
+                  for idx in range(100)]
+    expected = [parser.parse(input_str) for input_str in input_strs]
+    attrs = set(vars(parser))
+
+    results = run_in_threads(parser.parse, input_strs)
+    assert results == expected
+    assert [len(r) for r in results[:3]] == [1, 5, 42]
+    assert set(vars(parser)) == attrs
+
+
+def test_parsers_dont_change_global_state():
+    """
+    Test that the actions of the special EOF terminal, shared by all
+    grammars, and the debug colors given to one parser don't affect other
+    parsers.
+    """
+    from parglare import termui
+
+    g = Grammar.from_string(r"""
+    S: number EOF;
+
+    terminals
+    number: /\d+/;
+    """)
+    parser = Parser(g, actions={'EOF': lambda _, value: 'end'})
+    assert parser.parse('1') == ['1', 'end']
+    assert Parser(g).parse('1') == ['1', None]
+    assert parser.parse('1') == ['1', 'end']
+
+    Parser(g, debug_colors=True)
+    assert not termui.colors
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Test bypassing of unit production chains.
+"""
+from __future__ import unicode_literals
+import pytest  # noqa
+from parglare import Grammar, Parser, ParseError
+from parglare.actions import pass_single
+
+
+grammar = r"""
+E: E '+' T | E '-' T | T;
+T: T '*' F | T '/' F | F;
+F: '(' E ')' | P;
+P: number;
+
+terminals
+number: /\d+/;
+"""
+
+actions = {
+    'E': [lambda _, nodes: nodes[0] + nodes[2],
+          lambda _, nodes: nodes[0] - nodes[2],
+          pass_single],
+    'T': [lambda _, nodes: nodes[0] * nodes[2],
+          lambda _, nodes: nodes[0] // nodes[2],
+          pass_single],
+    'F': [lambda _, nodes: nodes[1], pass_single],
+    'number': lambda _, value: int(value),
+}
+
+input_str = '2 * (3 + 4) - 10 / 5 + 1'
+
+
+@pytest.mark.parametrize('lazy_context', [True, False])
+def test_unit_chains(lazy_context):
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions=actions, lazy_context=lazy_context,
+                    bypass_unit_chains=True)
+    assert parser.parse(input_str) == 13
+    assert parser.parse('5') == 5
+
+    # Productions `E: T`, `T: F`, `F: P` and `P: number` pass the single
+    # subresult up. Chains start after the gotos on nonterminals.
+    chain_states = set()
+    for state in parser.table.states:
+        chains = parser._unit_gotos[state.state_id]
+        if chains is None:
+            continue
+        for nonterm_id, by_term in enumerate(chains):
+            if by_term:
+                goto_state = state.gotos_by_id[nonterm_id]
+                assert goto_state.symbol.name in ('T', 'F', 'P')
+                chain_states.update(s.symbol.name for s in by_term.values())
+    assert chain_states == {'E', 'T', 'F'}
+
+    # Errors are reported in the same states.
+    for invalid in ['2 * (3 + 4', '2 * (3 + 4 5)', '2 + * 3']:
+        errors = []
+        for bypass in [False, True]:
+            with pytest.raises(ParseError) as e:
+                Parser(g, actions=actions, lazy_context=lazy_context,
+                       bypass_unit_chains=bypass).parse(invalid)
+            errors.append((e.value.location.start_position,
+                           e.value.symbols_expected,
+                           e.value.symbols_before))
+        assert errors[0] == errors[1]
+
+
+def test_unit_chains_actions():
+    """
+    Test that unit productions with actions are not bypassed.
+    """
+
+    g = Grammar.from_string(grammar)
+    calls = []
+
+    def act_f(_, nodes):
+        calls.append(nodes[0])
+        return nodes[0]
+
+    parser = Parser(g, actions=dict(actions, F=[actions['F'][0], act_f]),
+                    bypass_unit_chains=True)
+    assert parser.parse(input_str) == 13
+    assert calls == [2, 3, 4, 10, 5, 1]
+
+    # Chains after the gotos on `P` are broken by the action of `F: P`.
+    for state in parser.table.states:
+        for nonterm_id, by_term in enumerate(
+                parser._unit_gotos[state.state_id] or []):
+            if by_term:
+                assert state.gotos_by_id[nonterm_id].symbol.name != 'P'
+
+
+def test_unit_chains_disabled():
+
+    g = Grammar.from_string(grammar)
+    assert Parser(g, actions=actions)._unit_gotos is None
+    assert Parser(g, actions=actions, bypass_unit_chains=True,
+                  debug=True)._unit_gotos is None
+
+    # Unit productions build tree nodes.
+    parser = Parser(g, actions=actions, build_tree=True,
+                    bypass_unit_chains=True)
+    assert all(chains is None for chains in parser._unit_gotos)
+    assert parser.call_actions(parser.parse(input_str)) == 13
+
+
+def test_unit_chains_checkpoints():
+    """
+    Test that reductions to checkpoint symbols are not bypassed.
+    """
+
+    g = Grammar.from_string(grammar)
+    parser = Parser(g, actions=actions, checkpoints=['T'],
+                    bypass_unit_chains=True)
+    assert parser.parse(input_str) == 13
+    assert parser.last_checkpoint is not None
+    assert parser.parse(input_str + ' + 2',
+                        resume_from=parser.last_checkpoint) == 15
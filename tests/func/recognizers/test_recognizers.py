@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 import pytest  # noqa
-from parglare import Grammar, Parser, ParseError, ParserInitError, \
-    GrammarError, DisambiguationError
+from parglare import Grammar, Parser, GLRParser, ParseError, \
+    ParserInitError, GrammarError, DisambiguationError
 from parglare.actions import pass_single, pass_nochange, collect
+from parglare.parser import NodeTerm
 
 
 def test_parse_list_of_integers():
@@ -151,3 +152,58 @@ def test_terminals_with_emtpy_bodies_require_recognizers():
 
     g = Grammar.from_string(grammar, recognizers=recognizers)
     assert g
+
+
+@pytest.mark.parametrize('parser_class', [Parser, GLRParser])
+def test_recognizer_returning_length(parser_class):
+    """
+    Test that recognizers may return the length of the match. Token value is
+    then sliced from the input lazily.
+    """
+    grammar = """
+    S: Item+ EOF;
+    Item: ascending | INT;
+
+    terminals
+    ascending: ;
+    INT: /\\d/;
+    """
+
+    def ascending(input, pos):
+        last = pos + 1
+        while last < len(input) and input[last] > input[last - 1]:
+            last += 1
+        if last - pos >= 2:
+            return last - pos
+
+    g = Grammar.from_string(grammar, recognizers={'ascending': ascending})
+    parser = parser_class(g, build_tree=True)
+    tree = parser.parse('1259437')
+    if parser_class is GLRParser:
+        tree = tree[0]
+
+    def terminals(node):
+        if isinstance(node, NodeTerm):
+            if node.symbol.name != 'EOF':
+                yield node
+        else:
+            for child in node.children:
+                for n in terminals(child):
+                    yield n
+
+    items = list(terminals(tree))
+    assert [n.token.length for n in items] == [4, 1, 2]
+    assert all(n.token._value is None for n in items)
+    assert [n.value for n in items] == ['1259', '4', '37']
+
+    g = Grammar.from_string("""
+    S: ascending+ EOF;
+
+    terminals
+    ascending: ;
+    """, recognizers={'ascending': ascending})
+    parser = parser_class(g, ws=None)
+    result = parser.parse([1, 2, 5, 3, 7])
+    if parser_class is GLRParser:
+        result = result[0]
+    assert result == [[[1, 2, 5], [3, 7]], None]